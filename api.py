@@ -1,19 +1,54 @@
 import os
 import threading
 import time
-from flask import Flask, request, jsonify
-import importlib.util
+from flask import Flask, request, jsonify, Response, g, stream_with_context
 from flask_cors import CORS
 
-PREDICT_SCRIPT_PATH = os.path.join("backend", "predict_disease_dl.py")
-spec = importlib.util.spec_from_file_location("predict_module", PREDICT_SCRIPT_PATH)
-predict_module = importlib.util.module_from_spec(spec)
-spec.loader.exec_module(predict_module)
+from backend.admission import PREDICT_ADMISSION, Overloaded
+from backend.bulk_predict import NDJSON, iter_results
+from backend import deadline
+from backend.metrics import CONTENT_TYPE, render_metrics
+from backend.profiler import PROFILED_ENVIRON_KEY, check_admin_token, profile_for, route_profiler, ProfilerBusy
+from backend.symptom_suggest import suggest_symptoms
+from backend.text_predict import predict_text as predict_text_response
+# Import thẳng (không exec lại file qua importlib) -> dùng chung model/cache với backend.main khi chạy backend.asgi
+from backend import predict_disease_dl as predict_module
 
 app = Flask(__name__)
 CORS(app, resources={r"/*": {"origins": ["https://tantrieunguyen.github.io"]}})
 app.config['JSON_AS_ASCII'] = False
 
+@app.before_request
+def _route_profiler_enter():
+    # Chạy trong backend.asgi: middleware FastAPI đã hook request này
+    if request.environ.get(PROFILED_ENVIRON_KEY):
+        return
+    g.profiled = route_profiler.enter(request.path, threading.get_ident())
+
+@app.teardown_request
+def _route_profiler_exit(exc):
+    if g.pop("profiled", False):
+        route_profiler.exit(request.path, threading.get_ident())
+
+@app.before_request
+def _request_deadline_start():
+    # Chạy trong backend.asgi: middleware FastAPI đã đặt deadline cho request này
+    if deadline.current() is None:
+        g.deadline_token = deadline.start(deadline.budget_for(request.path, request.headers.get(deadline.DEADLINE_HEADER)))
+
+@app.after_request
+def _request_deadline_header(response):
+    current = deadline.current()
+    if "deadline_token" in g and current is not None and current.skipped:
+        response.headers[deadline.SKIPPED_HEADER] = ",".join(current.skipped)
+    return response
+
+@app.teardown_request
+def _request_deadline_end(exc):
+    token = g.pop("deadline_token", None)
+    if token is not None:
+        deadline.reset(token)
+
 @app.route("/predict", methods=["POST"])
 def predict():
     try:
@@ -24,7 +59,8 @@ def predict():
         if not symptoms or not isinstance(symptoms, list):
             return jsonify({"error": "Thiếu dữ liệu 'symptoms' dạng list"}), 400
 
-        result = predict_module.predict_disease(symptoms)
+        with PREDICT_ADMISSION.admit():
+            result = predict_module.predict_disease(symptoms, explain=bool(data.get("explain")))
         probs = result.pop("all_probabilities", {})
         if isinstance(probs, dict):
             sorted_probs = sorted(probs.items(), key=lambda x: x[1], reverse=True)
@@ -33,13 +69,122 @@ def predict():
             ]
 
         return jsonify(result)
+    except Overloaded as e:
+        return jsonify({"error": str(e)}), 503, {"Retry-After": str(e.retry_after)}
     except Exception as e:
         return jsonify({"error": str(e)}), 500
 
+@app.route("/predict/text", methods=["POST"])
+def predict_text():
+    """Chẩn đoán từ câu mô tả tự do (tiếng Việt): trích triệu chứng -> model (hợp đồng: backend.text_predict)."""
+    status, body, headers = predict_text_response(request.get_json(silent=True))
+    return jsonify(body), status, headers
+
+@app.route("/predict/text/bulk", methods=["POST"])
+def predict_text_bulk():
+    """
+    Body NDJSON: mỗi dòng {"id": ..., "text": "..."}. Trả về NDJSON cùng thứ tự, stream theo lô
+    (BULK_BATCH_SIZE dòng/lần suy luận) -> không giữ cả file trong bộ nhớ.
+    """
+    chunks = iter(lambda: request.stream.read(64 * 1024), b"")
+    return Response(stream_with_context(iter_results(chunks)), mimetype=NDJSON)
+
+@app.route("/predict/retrieval", methods=["POST"])
+def predict_retrieval():
+    """Ứng viên theo độ trùng triệu chứng (rescore=true: model chấm lại trong tập ứng viên)."""
+    try:
+        data = request.json or {}
+        symptoms = data.get("symptoms")
+        top_k = int(data.get("top_k", 5))
+        method = data.get("method", "bm25")
+
+        if not symptoms or not isinstance(symptoms, list):
+            return jsonify({"error": "Thiếu dữ liệu 'symptoms' dạng list"}), 400
+        if method not in ("bm25", "jaccard"):
+            return jsonify({"error": "method phải là 'bm25' hoặc 'jaccard'"}), 400
+
+        if data.get("rescore"):
+            candidates = predict_module.rescore_candidates(symptoms, top_k=top_k, method=method)
+        else:
+            candidates = predict_module.get_retrieval_index().search(symptoms, top_k=top_k, method=method)
+        return jsonify({"symptoms": symptoms, "method": method, "candidates": candidates})
+    except Exception as e:
+        return jsonify({"error": str(e)}), 500
+
+@app.route("/symptoms/suggest")
+def symptoms_suggest():
+    """Gợi ý triệu chứng khi gõ (không dấu, sai chính tả nhẹ) kèm cột model chuẩn (canonical)."""
+    q = request.args.get("q", "")
+    try:
+        limit = max(1, min(int(request.args.get("limit", 10)), 50))
+    except ValueError:
+        return jsonify({"error": "limit phải là số nguyên"}), 400
+    return jsonify({"q": q, "suggestions": suggest_symptoms(q, limit=limit)})
+
 @app.route("/ping")
 def ping():
     return {"msg": "pong"}
 
+@app.route("/metrics")
+def metrics():
+    return Response(render_metrics(), content_type=CONTENT_TYPE)
+
+@app.route("/cache/stats")
+def cache_stats():
+    stats = predict_module.predict_cache_stats()
+    stats["admission"] = PREDICT_ADMISSION.stats()
+    return jsonify(stats)
+
+# ===== Admin: profiler lấy mẫu (header X-Admin-Token = ADMIN_TOKEN) =====
+def _is_admin() -> bool:
+    return check_admin_token(request.headers.get("X-Admin-Token") or request.headers.get("Authorization"))
+
+def _profile_response(result, fmt: str):
+    if fmt == "collapsed":
+        return Response(result["collapsed"], mimetype="text/plain",
+                        headers={"Content-Disposition": "attachment; filename=profile.collapsed"})
+    return jsonify(result)
+
+@app.route("/admin/profile", methods=["POST"])
+def admin_profile():
+    """Lấy mẫu toàn bộ worker trong N giây: ?seconds=10&interval_ms=5&allocations=1&format=json|collapsed"""
+    if not _is_admin():
+        return jsonify({"error": "Forbidden"}), 403
+    try:
+        result = profile_for(
+            float(request.args.get("seconds", 10)),
+            interval=float(request.args.get("interval_ms", 5)) / 1000.0,
+            allocations=request.args.get("allocations", "1") != "0",
+        )
+    except ProfilerBusy as e:
+        return jsonify({"error": str(e)}), 409
+    return _profile_response(result, request.args.get("format", "json"))
+
+@app.route("/admin/profile/route", methods=["POST", "GET", "DELETE"])
+def admin_profile_route():
+    """POST {route, requests}: profile K request kế tiếp; GET: trạng thái/kết quả; DELETE: hủy."""
+    if not _is_admin():
+        return jsonify({"error": "Forbidden"}), 403
+    if request.method == "POST":
+        body = request.get_json(silent=True) or {}
+        if not body.get("route"):
+            return jsonify({"error": "Thiếu 'route'"}), 400
+        try:
+            route_profiler.arm(
+                body["route"], int(body.get("requests", 10)),
+                interval=float(body.get("interval_ms", 5)) / 1000.0,
+                allocations=bool(body.get("allocations", True)),
+            )
+        except ProfilerBusy as e:
+            return jsonify({"error": str(e)}), 409
+        return jsonify(route_profiler.status())
+    if request.method == "DELETE":
+        result = route_profiler.cancel()
+        return jsonify(result or route_profiler.status())
+    if route_profiler.last_result is None:
+        return jsonify(route_profiler.status())
+    return _profile_response(route_profiler.last_result, request.args.get("format", "json"))
+
 # 🔹 Thêm thread đếm số vô hạn
 def keep_alive_counter():
     i = 1
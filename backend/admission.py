@@ -0,0 +1,157 @@
+import contextvars
+import math
+import os
+import threading
+import time
+from contextlib import contextmanager
+from typing import Any, Dict, Iterator, Optional
+
+from backend.metrics import REGISTRY
+
+# Giới hạn số request dự đoán chạy đồng thời (tự co giãn trong [MIN, MAX] theo độ trễ)
+ADMISSION_MIN_INFLIGHT = int(os.getenv("ADMISSION_MIN_INFLIGHT", "1"))
+ADMISSION_MAX_INFLIGHT = int(os.getenv("ADMISSION_MAX_INFLIGHT", str(max(4, 2 * (os.cpu_count() or 1)))))
+# Hàng đợi: tối đa bao nhiêu request chờ và chờ tối đa bao lâu (giây) trước khi trả 503
+ADMISSION_QUEUE = int(os.getenv("ADMISSION_QUEUE", "32"))
+ADMISSION_QUEUE_TIMEOUT = float(os.getenv("ADMISSION_QUEUE_TIMEOUT", "2.0"))
+# Độ trễ xử lý mục tiêu (giây): vượt -> giảm giới hạn, dưới -> tăng dần
+ADMISSION_TARGET_LATENCY = float(os.getenv("ADMISSION_TARGET_LATENCY", "1.0"))
+# Tỉ lệ in-flight / giới hạn từ đó request chạy chế độ giảm tải (bỏ enrichment tùy chọn)
+ADMISSION_DEGRADE_RATIO = float(os.getenv("ADMISSION_DEGRADE_RATIO", "0.8"))
+
+# AIMD: cộng 1/limit mỗi request nhanh, nhân BACKOFF khi chậm (tối đa 1 lần mỗi cửa sổ target)
+BACKOFF = 0.9
+
+ADMISSION_TOTAL = REGISTRY.counter(
+    "jaremis_admission_total", "Kết quả kiểm soát tải theo controller", ("controller", "outcome"))
+
+# Request hiện tại đang ở chế độ giảm tải: bỏ API mức độ nghiêm trọng ngoài, WHO...
+_DEGRADED: contextvars.ContextVar[bool] = contextvars.ContextVar("jaremis_degraded", default=False)
+
+
+def is_degraded() -> bool:
+    return _DEGRADED.get()
+
+
+@contextmanager
+def degraded(flag: bool = True) -> Iterator[None]:
+    """Bật/tắt chế độ giảm tải cho đoạn code bên trong (vd. batch nội bộ, benchmark)."""
+    token = _DEGRADED.set(flag)
+    try:
+        yield
+    finally:
+        _DEGRADED.reset(token)
+
+
+class Overloaded(RuntimeError):
+    """Hết chỗ (hàng đợi đầy hoặc chờ quá hạn) -> trả 503 kèm Retry-After."""
+
+    def __init__(self, reason: str, retry_after: int):
+        super().__init__(f"Máy chủ đang quá tải ({reason}), thử lại sau {retry_after}s")
+        self.reason = reason
+        self.retry_after = retry_after
+
+
+class AdmissionController:
+    """
+    Giới hạn số request chạy đồng thời + hàng đợi có giới hạn, an toàn đa luồng
+    (Flask và endpoint đồng bộ của FastAPI đều chạy trong luồng).
+    - limit co giãn kiểu AIMD theo thời gian xử lý (không tính thời gian chờ)
+    - gần bão hòa (phải xếp hàng hoặc in-flight >= degrade_ratio * limit) -> request chạy giảm tải
+    - hàng đợi đầy / chờ quá queue_timeout -> Overloaded
+    """
+
+    def __init__(self, name: str, min_limit: int = ADMISSION_MIN_INFLIGHT, max_limit: int = ADMISSION_MAX_INFLIGHT,
+                 initial: Optional[int] = None, max_queue: int = ADMISSION_QUEUE,
+                 queue_timeout: float = ADMISSION_QUEUE_TIMEOUT, target_latency: float = ADMISSION_TARGET_LATENCY,
+                 degrade_ratio: float = ADMISSION_DEGRADE_RATIO):
+        self.name = name
+        self.min_limit = max(1, int(min_limit))
+        self.max_limit = max(self.min_limit, int(max_limit))
+        self.limit = float(min(self.max_limit, max(self.min_limit, initial or self.max_limit)))
+        self.max_queue = max(0, int(max_queue))
+        self.queue_timeout = queue_timeout
+        self.target_latency = target_latency
+        self.degrade_ratio = degrade_ratio
+        self.in_flight = 0
+        self.queued = 0
+        self._cond = threading.Condition()
+        self._last_decrease = 0.0
+        # EWMA thời gian xử lý -> ước lượng Retry-After
+        self._latency = target_latency / 2
+
+    def _retry_after(self) -> int:
+        backlog = self.queued + self.in_flight
+        return max(1, math.ceil(backlog * self._latency / max(1.0, self.limit)))
+
+    def _acquire(self) -> bool:
+        """Chờ tới lượt; trả về True nếu request nên chạy giảm tải."""
+        with self._cond:
+            waited = False
+            if self.in_flight >= int(self.limit) or self.queued:
+                if self.queued >= self.max_queue:
+                    ADMISSION_TOTAL.inc(self.name, "rejected")
+                    raise Overloaded("hàng đợi đầy", self._retry_after())
+                waited = True
+                self.queued += 1
+                deadline = time.monotonic() + self.queue_timeout
+                try:
+                    while self.in_flight >= int(self.limit):
+                        remaining = deadline - time.monotonic()
+                        if remaining <= 0:
+                            ADMISSION_TOTAL.inc(self.name, "timeout")
+                            raise Overloaded("chờ quá lâu", self._retry_after())
+                        self._cond.wait(remaining)
+                finally:
+                    self.queued -= 1
+            self.in_flight += 1
+            degrade = waited or self.queued > 0 or self.in_flight >= self.degrade_ratio * self.limit
+            ADMISSION_TOTAL.inc(self.name, "degraded" if degrade else "admitted")
+            return degrade
+
+    def _release(self, latency: float) -> None:
+        now = time.monotonic()
+        with self._cond:
+            was_saturated = self.in_flight >= int(self.limit)
+            self.in_flight -= 1
+            self._latency += 0.2 * (latency - self._latency)
+            if latency > self.target_latency:
+                if now - self._last_decrease >= self.target_latency:
+                    self.limit = max(float(self.min_limit), self.limit * BACKOFF)
+                    self._last_decrease = now
+            elif was_saturated:
+                # Chỉ tăng khi giới hạn thực sự bị dùng hết (tránh limit phình khi tải thấp)
+                self.limit = min(float(self.max_limit), self.limit + 1.0 / self.limit)
+            self._cond.notify(max(1, int(self.limit) - self.in_flight))
+
+    @contextmanager
+    def admit(self) -> Iterator[bool]:
+        """with controller.admit() as degraded: ... (ném Overloaded nếu phải loại bỏ request)."""
+        degrade = self._acquire()
+        token = _DEGRADED.set(degrade or _DEGRADED.get())
+        start = time.perf_counter()
+        try:
+            yield degrade
+        finally:
+            _DEGRADED.reset(token)
+            self._release(time.perf_counter() - start)
+
+    def stats(self) -> Dict[str, Any]:
+        with self._cond:
+            return {
+                "limit": round(self.limit, 2),
+                "in_flight": self.in_flight,
+                "queued": self.queued,
+                "max_queue": self.max_queue,
+                "latency_ewma_s": round(self._latency, 4),
+                "target_latency_s": self.target_latency,
+            }
+
+
+# Dùng chung cho /predict (api.py) và /predict/disease (main.py): cùng 1 model trong process
+PREDICT_ADMISSION = AdmissionController("predict")
+
+REGISTRY.gauge(
+    "jaremis_admission", "Trạng thái kiểm soát tải (limit, in_flight, queued)", ("controller", "stat"),
+    lambda: {("predict", k): float(v) for k, v in PREDICT_ADMISSION.stats().items()},
+)
@@ -1,32 +1,117 @@
 # File: backend/analyzer.py
 
-from typing import List
+from typing import Dict, List, Optional, Tuple
 import json
 import os
+import re
+import threading
+
+from backend.text_norm import fold, fold_many, normalize_many, normalize_text
 
 # Đường dẫn đến file JSON chứa từ khóa triệu chứng
 SYMPTOM_MAPPING_PATH = os.path.join(os.path.dirname(__file__), "data", "symptom_keywords.json")
 
+# Ranh giới từ: mọi ký tự không phải chữ/số (dấu câu, khoảng trắng)
+_NON_WORD = re.compile(r"[^\w]+")
+
 def load_symptom_keywords() -> dict:
     """Tải từ khóa triệu chứng từ file JSON"""
     with open(SYMPTOM_MAPPING_PATH, "r", encoding="utf-8") as f:
         return json.load(f)
 
+def _words(text: str) -> List[str]:
+    return _NON_WORD.sub(" ", text).split()
+
+class KeywordIndex:
+    """
+    Từ khóa đã chuẩn hóa (giữ dấu và không dấu) -> (thứ tự trong file, từ khóa, feature).
+    Khớp theo cụm từ trọn vẹn (n-gram của câu), không theo chuỗi con: "ho" không khớp "cho", "khó".
+    """
+
+    def __init__(self, keywords: Dict[str, str]):
+        items = [(k, v) for k, v in keywords.items() if isinstance(k, str)]
+        names = [k for k, _ in items]
+        self.exact: Dict[str, Tuple[int, str, str]] = {}
+        self.folded: Dict[str, Tuple[int, str, str]] = {}
+        self.max_words = 1
+        for order, ((keyword, feature), key, fkey) in enumerate(zip(items, normalize_many(names), fold_many(names))):
+            key, fkey = " ".join(_words(key)), " ".join(_words(fkey))
+            if not key:
+                continue
+            self.exact.setdefault(key, (order, keyword, feature))
+            self.folded.setdefault(fkey, (order, keyword, feature))
+            self.max_words = max(self.max_words, key.count(" ") + 1)
+
+    def _scan(self, words: List[str], table: Dict[str, Tuple[int, str, str]], longest: bool) -> Dict[int, Tuple[str, str]]:
+        found: Dict[int, Tuple[str, str]] = {}
+        i = 0
+        while i < len(words):
+            step = 1
+            for n in (range(min(self.max_words, len(words) - i), 0, -1) if longest
+                      else range(1, min(self.max_words, len(words) - i) + 1)):
+                hit = table.get(" ".join(words[i:i + n]))
+                if hit is not None:
+                    if longest:
+                        found[i] = (hit[1], hit[2])
+                        step = n
+                        break
+                    found[hit[0]] = (hit[1], hit[2])
+            i += step
+        return found
+
+    def match(self, text: str, longest: bool = False) -> List[Tuple[str, str]]:
+        """
+        [(từ khóa, feature)], mỗi feature 1 lần.
+        longest=False: mọi cụm khớp, theo thứ tự từ khóa trong file.
+        longest=True: cụm dài nhất không chồng lấn ("sốt cao" thay vì cả "sốt" và "sốt cao"), theo thứ tự trong câu.
+        """
+        normalized = normalize_text(text or "")
+        folded = fold(normalized)
+        # Câu gõ không dấu ("toi bi ho va sot"): khớp theo từ khóa bỏ dấu.
+        # Câu có dấu thì khớp giữ dấu, tránh "họ" -> "ho", "mặt" -> "mắt"
+        table = self.folded if folded == normalized else self.exact
+        found = self._scan(_words(normalized), table, longest)
+        matches: List[Tuple[str, str]] = []
+        seen = set()
+        for order in sorted(found):
+            keyword, feature_name = found[order]
+            if feature_name not in seen:
+                seen.add(feature_name)
+                matches.append((keyword, feature_name))
+        return matches
+
+_index: Optional[KeywordIndex] = None
+_index_stamp: Optional[Tuple[int, int]] = None
+_index_lock = threading.Lock()
+
+def get_keyword_index() -> KeywordIndex:
+    """KeywordIndex dùng chung, dựng lại khi file từ khóa đổi (kích thước/mtime)."""
+    global _index, _index_stamp
+    st = os.stat(SYMPTOM_MAPPING_PATH)
+    stamp = (st.st_size, st.st_mtime_ns)
+    if _index is None or stamp != _index_stamp:
+        with _index_lock:
+            if _index is None or stamp != _index_stamp:
+                _index = KeywordIndex(load_symptom_keywords())
+                _index_stamp = stamp
+    return _index
+
+def extract_symptom_matches(user_input: str) -> List[Tuple[str, str]]:
+    """
+    Như extract_symptoms nhưng giữ cả từ khóa tiếng Việt đã khớp: [(từ khóa, feature)].
+    Từ khóa dùng cho model nội bộ (triệu chứng tiếng Việt), feature cho EndlessMedical/ICD-10.
+    Chuẩn hóa chung với predict_disease_dl (backend.text_norm), khớp theo ranh giới từ.
+    Ví dụ: "Tôi bị ho và sốt" => [("ho", "Cough"), ("sốt", "Fever")]
+    """
+    return get_keyword_index().match(user_input)
+
+
 def extract_symptoms(user_input: str) -> List[str]:
     """
     Phân tích câu đầu vào để tách ra danh sách triệu chứng.
     Ví dụ: "Tôi bị ho và sốt" => ["Cough", "Fever"]
     """
-    symptom_keywords = load_symptom_keywords()
-    normalized_input = user_input.lower()
-    detected_symptoms = []
-
-    for keyword, feature_name in symptom_keywords.items():
-        if keyword.lower() in normalized_input:
-            if feature_name not in detected_symptoms:
-                detected_symptoms.append(feature_name)
-
-    return detected_symptoms
+    return [feature_name for _, feature_name in extract_symptom_matches(user_input)]
 
 # Kiểm tra nhanh (chạy thử từ terminal)
 # Đã bỏ import ngược để tránh vòng lặp import
@@ -0,0 +1,93 @@
+"""
+App ASGI hợp nhất: 1 process phục vụ mọi route của backend/main.py (FastAPI),
+api.py, backend/gemini.py và backend/trans.py (Flask) -> dùng chung 1 bản
+model TensorFlow, bộ chuẩn hoá, cache dự đoán, retrieval index và response cache.
+
+Chạy: uvicorn backend.asgi:app --host 0.0.0.0 --port $PORT
+Route FastAPI được ưu tiên; path còn lại chuyển sang app Flask đầu tiên khớp URL.
+"""
+import logging
+import os
+import warnings
+from typing import Any, Callable, Dict, Iterable, List, Optional, Tuple
+
+from werkzeug.exceptions import MethodNotAllowed, NotFound
+
+try:
+    from a2wsgi import WSGIMiddleware
+except ImportError:
+    with warnings.catch_warnings():
+        warnings.simplefilter("ignore")  # StarletteDeprecationWarning: khuyên dùng a2wsgi
+        from starlette.middleware.wsgi import WSGIMiddleware
+
+from backend.main import app
+from backend.profiler import PROFILED_ENVIRON_KEY
+
+log = logging.getLogger("jaremis.asgi")
+
+# Các app Flask được gắn vào, theo thứ tự ưu tiên khi trùng path
+FLASK_APPS = [m.strip() for m in os.getenv("JAREMIS_FLASK_APPS", "api,backend.gemini,backend.trans").split(",")
+              if m.strip()]
+
+
+def _load_flask_apps(modules: List[str]) -> List[Tuple[str, Any]]:
+    """Import từng module Flask; module thiếu dependency/cấu hình (vd. GOOGLE_API_KEY) bị bỏ qua."""
+    apps: List[Tuple[str, Any]] = []
+    for name in modules:
+        try:
+            module = __import__(name, fromlist=["app"])
+        except (ImportError, RuntimeError) as e:
+            log.warning("Bỏ qua %s: %s", name, e)
+            continue
+        apps.append((name, module.app))
+    return apps
+
+
+class FlaskDispatcher:
+    """
+    WSGI app chọn app Flask theo url_map (giữ nguyên path gốc, không cần prefix).
+    Path khớp nhưng sai method ở mọi app -> vẫn giao cho app đầu tiên khớp path để trả 405.
+    """
+
+    def __init__(self, apps: List[Tuple[str, Any]]):
+        self.apps = apps
+
+    def resolve(self, path: str, method: str) -> Optional[Tuple[str, Any]]:
+        fallback = None
+        for name, flask_app in self.apps:
+            adapter = flask_app.url_map.bind("localhost")
+            try:
+                adapter.match(path, method=method)
+                return name, flask_app
+            except MethodNotAllowed:
+                fallback = fallback or (name, flask_app)
+            except NotFound:
+                continue
+        return fallback
+
+    def __call__(self, environ: Dict[str, Any], start_response: Callable) -> Iterable[bytes]:
+        environ[PROFILED_ENVIRON_KEY] = True
+        hit = self.resolve(environ.get("PATH_INFO") or "/", environ.get("REQUEST_METHOD", "GET"))
+        if hit is None:
+            start_response("404 Not Found", [("Content-Type", "application/json")])
+            return [b'{"detail":"Not Found"}']
+        return hit[1](environ, start_response)
+
+
+flask_apps = _load_flask_apps(FLASK_APPS)
+dispatcher = FlaskDispatcher(flask_apps)
+
+
+@app.get("/apps")
+def mounted_apps():
+    """Các app Flask đang được gắn vào process (module thiếu dependency sẽ không có mặt)."""
+    return {"fastapi": "backend.main", "flask": [name for name, _ in flask_apps]}
+
+
+# Mount "/" đăng ký sau cùng -> route FastAPI khớp trước, còn lại rơi xuống Flask
+app.mount("/", WSGIMiddleware(dispatcher))
+
+
+if __name__ == "__main__":
+    import uvicorn
+    uvicorn.run(app, host="0.0.0.0", port=int(os.environ.get("PORT", 5000)))
@@ -0,0 +1,282 @@
+import atexit
+import json
+import os
+import sqlite3
+import threading
+import time
+from collections import deque
+from typing import Any, Dict, List, Optional
+
+from backend.metrics import REGISTRY
+
+# Nhật ký dự đoán: sqlite (WAL) | jsonl (xoay vòng theo dung lượng) | off
+AUDIT_LOG = (os.getenv("AUDIT_LOG") or "sqlite").strip().lower()
+AUDIT_LOG_PATH = os.getenv("AUDIT_LOG_PATH") or (
+    "backend/logs/predictions.db" if AUDIT_LOG == "sqlite" else "backend/logs/predictions.jsonl")
+AUDIT_BUFFER = int(os.getenv("AUDIT_BUFFER", "10000"))
+AUDIT_BATCH = int(os.getenv("AUDIT_BATCH", "256"))
+AUDIT_FLUSH_INTERVAL = float(os.getenv("AUDIT_FLUSH_INTERVAL", "1.0"))
+# Buffer đầy: drop_oldest (giữ bản ghi mới) | drop_newest (bỏ bản ghi đang tới)
+AUDIT_DROP_POLICY = (os.getenv("AUDIT_DROP_POLICY") or "drop_oldest").strip().lower()
+AUDIT_JSONL_MAX_BYTES = int(os.getenv("AUDIT_JSONL_MAX_BYTES", str(64 * 1024 * 1024)))
+AUDIT_JSONL_BACKUPS = int(os.getenv("AUDIT_JSONL_BACKUPS", "5"))
+
+AUDIT_RECORDS = REGISTRY.counter(
+    "jaremis_audit_records_total", "Bản ghi nhật ký dự đoán theo kết quả", ("outcome",))
+
+
+class SQLiteSink:
+    """Ghi lô bản ghi vào SQLite chế độ WAL (đọc đồng thời khi đang ghi, commit 1 lần mỗi lô)."""
+
+    SCHEMA = """
+    CREATE TABLE IF NOT EXISTS predictions (
+        id INTEGER PRIMARY KEY AUTOINCREMENT,
+        ts REAL NOT NULL,
+        symptoms TEXT NOT NULL,
+        normalized TEXT NOT NULL,
+        symptom_key TEXT NOT NULL,
+        disease TEXT,
+        confidence REAL,
+        top_k TEXT,
+        model_version TEXT,
+        engine TEXT,
+        latency_ms REAL,
+        degraded INTEGER DEFAULT 0
+    );
+    CREATE INDEX IF NOT EXISTS idx_predictions_ts ON predictions(ts);
+    CREATE INDEX IF NOT EXISTS idx_predictions_symptom_key ON predictions(symptom_key);
+    """
+    COLUMNS = ("ts", "symptoms", "normalized", "symptom_key", "disease", "confidence", "top_k",
+               "model_version", "engine", "latency_ms", "degraded")
+
+    def __init__(self, path: str = AUDIT_LOG_PATH):
+        self.path = path
+        os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+        # Chỉ luồng writer dùng kết nối này
+        self._conn = sqlite3.connect(path, check_same_thread=False)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute("PRAGMA synchronous=NORMAL")
+        self._conn.executescript(self.SCHEMA)
+
+    def write(self, records: List[Dict[str, Any]]) -> None:
+        rows = [(
+            r["ts"],
+            json.dumps(r["symptoms"], ensure_ascii=False),
+            json.dumps(r["normalized"], ensure_ascii=False),
+            "|".join(sorted(r["normalized"])),
+            r.get("disease"),
+            r.get("confidence"),
+            json.dumps(r.get("top_k") or [], ensure_ascii=False),
+            r.get("model_version"),
+            r.get("engine"),
+            r.get("latency_ms"),
+            int(bool(r.get("degraded"))),
+        ) for r in records]
+        with self._conn:
+            self._conn.executemany(
+                f"INSERT INTO predictions ({','.join(self.COLUMNS)}) VALUES ({','.join('?' * len(self.COLUMNS))})",
+                rows)
+
+    def close(self) -> None:
+        self._conn.close()
+
+
+class JsonlSink:
+    """Ghi lô bản ghi vào file JSONL, xoay vòng khi vượt max_bytes (predictions.jsonl.1 ... .N)."""
+
+    def __init__(self, path: str = AUDIT_LOG_PATH, max_bytes: int = AUDIT_JSONL_MAX_BYTES,
+                 backups: int = AUDIT_JSONL_BACKUPS):
+        self.path = path
+        self.max_bytes = max_bytes
+        self.backups = backups
+        os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+
+    def _rotate(self) -> None:
+        for i in range(self.backups - 1, 0, -1):
+            src = f"{self.path}.{i}"
+            if os.path.exists(src):
+                os.replace(src, f"{self.path}.{i + 1}")
+        if self.backups > 0:
+            os.replace(self.path, f"{self.path}.1")
+        else:
+            os.remove(self.path)
+
+    def write(self, records: List[Dict[str, Any]]) -> None:
+        data = "".join(json.dumps(r, ensure_ascii=False) + "\n" for r in records).encode("utf-8")
+        try:
+            if os.path.getsize(self.path) + len(data) > self.max_bytes:
+                self._rotate()
+        except OSError:
+            pass
+        with open(self.path, "ab") as f:
+            f.write(data)
+
+    def close(self) -> None:
+        pass
+
+
+class AuditLog:
+    """
+    Nhật ký không chặn: record() chỉ thêm vào ring buffer trong bộ nhớ (O(1), không I/O);
+    1 luồng nền gom tối đa `batch_size` bản ghi mỗi lần và ghi xuống sink.
+    Buffer đầy -> bỏ bản ghi theo drop_policy và tăng bộ đếm "dropped".
+    """
+
+    def __init__(self, sink, capacity: int = AUDIT_BUFFER, batch_size: int = AUDIT_BATCH,
+                 flush_interval: float = AUDIT_FLUSH_INTERVAL, drop_policy: str = AUDIT_DROP_POLICY):
+        self.sink = sink
+        self.capacity = max(1, int(capacity))
+        self.batch_size = max(1, int(batch_size))
+        self.flush_interval = flush_interval
+        self.drop_policy = drop_policy
+        self._buf: deque = deque()
+        self._lock = threading.Lock()
+        self._wake = threading.Event()
+        self._stopped = False
+        self.queued = self.dropped = self.written = self.failed = 0
+        self._thread = threading.Thread(target=self._run, name="jaremis-audit-log", daemon=True)
+        self._thread.start()
+
+    def record(self, rec: Dict[str, Any]) -> bool:
+        """Thêm 1 bản ghi; False nếu bản ghi này bị bỏ (drop_newest khi đầy hoặc đã đóng)."""
+        with self._lock:
+            if self._stopped:
+                return False
+            if len(self._buf) >= self.capacity:
+                self.dropped += 1
+                AUDIT_RECORDS.inc("dropped")
+                if self.drop_policy == "drop_newest":
+                    return False
+                self._buf.popleft()
+            self._buf.append(rec)
+            self.queued += 1
+            full = len(self._buf) >= self.batch_size
+        AUDIT_RECORDS.inc("queued")
+        if full:
+            self._wake.set()
+        return True
+
+    def _drain(self) -> List[Dict[str, Any]]:
+        with self._lock:
+            n = min(len(self._buf), self.batch_size)
+            return [self._buf.popleft() for _ in range(n)]
+
+    def _write(self, batch: List[Dict[str, Any]]) -> None:
+        try:
+            self.sink.write(batch)
+            self.written += len(batch)
+            AUDIT_RECORDS.inc("written", amount=len(batch))
+        except Exception as e:
+            # Lỗi đĩa/DB không được làm hỏng request: bỏ lô, đếm lỗi
+            self.failed += len(batch)
+            AUDIT_RECORDS.inc("failed", amount=len(batch))
+            print(f"Warning: ghi nhật ký dự đoán lỗi ({e}), bỏ {len(batch)} bản ghi")
+
+    def _run(self) -> None:
+        while True:
+            self._wake.wait(self.flush_interval)
+            self._wake.clear()
+            while True:
+                batch = self._drain()
+                if not batch:
+                    break
+                self._write(batch)
+            if self._stopped:
+                return
+
+    def flush(self, timeout: float = 5.0) -> None:
+        """Chờ buffer được ghi hết (dùng khi tắt process hoặc đọc lại nhật ký)."""
+        deadline = time.monotonic() + timeout
+        while time.monotonic() < deadline:
+            with self._lock:
+                if not self._buf:
+                    break
+            self._wake.set()
+            time.sleep(0.01)
+
+    def close(self, timeout: float = 5.0) -> None:
+        with self._lock:
+            self._stopped = True
+        self._wake.set()
+        self._thread.join(timeout)
+        self.sink.close()
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "sink": type(self.sink).__name__,
+            "buffered": len(self._buf),
+            "capacity": self.capacity,
+            "queued": self.queued,
+            "dropped": self.dropped,
+            "written": self.written,
+            "failed": self.failed,
+        }
+
+
+_audit: Optional[AuditLog] = None
+_audit_lock = threading.Lock()
+
+
+def get_audit_log() -> Optional[AuditLog]:
+    """AuditLog dùng chung (tạo lúc ghi bản ghi đầu tiên); None nếu AUDIT_LOG=off hoặc không mở được sink."""
+    global _audit
+    if _audit is None and AUDIT_LOG != "off":
+        with _audit_lock:
+            if _audit is None:
+                try:
+                    sink = JsonlSink(AUDIT_LOG_PATH) if AUDIT_LOG == "jsonl" else SQLiteSink(AUDIT_LOG_PATH)
+                except (OSError, sqlite3.Error) as e:
+                    print(f"Warning: không mở được nhật ký dự đoán {AUDIT_LOG_PATH} ({e})")
+                    return None
+                _audit = AuditLog(sink)
+                atexit.register(_audit.close)
+    return _audit
+
+
+def log_prediction(symptoms: List[str], result: Dict[str, Any], model_version: str, latency_s: float) -> None:
+    """Ghi 1 dự đoán vào nhật ký (không chặn, không ném lỗi)."""
+    audit = get_audit_log()
+    if audit is None:
+        return
+    audit.record({
+        "ts": time.time(),
+        "symptoms": list(symptoms or []),
+        "normalized": list(result.get("normalized_symptoms") or []),
+        "disease": result.get("disease"),
+        "confidence": result.get("confidence"),
+        "top_k": [{"disease": t["disease"], "prob": t["prob"]} for t in result.get("top_k") or []],
+        "model_version": model_version,
+        "engine": result.get("engine"),
+        "latency_ms": round(latency_s * 1000.0, 3),
+        "degraded": bool(result.get("degraded")),
+    })
+
+
+def audit_stats() -> Dict[str, Any]:
+    audit = _audit
+    return audit.stats() if audit is not None else {"sink": None if AUDIT_LOG == "off" else AUDIT_LOG}
+
+
+def top_symptom_sets(path: str = AUDIT_LOG_PATH, limit: int = 20) -> List[Dict[str, Any]]:
+    """Các tập triệu chứng (đã chuẩn hóa) gặp nhiều nhất trong nhật ký SQLite."""
+    conn = sqlite3.connect(f"file:{path}?mode=ro", uri=True)
+    try:
+        rows = conn.execute(
+            "SELECT symptom_key, COUNT(*) AS n, AVG(latency_ms) FROM predictions "
+            "GROUP BY symptom_key ORDER BY n DESC LIMIT ?", (limit,)).fetchall()
+    finally:
+        conn.close()
+    return [{"symptoms": key.split("|") if key else [], "count": n, "avg_latency_ms": avg} for key, n, avg in rows]
+
+
+REGISTRY.gauge(
+    "jaremis_audit_log", "Trạng thái nhật ký dự đoán (buffered, dropped, written...)", ("stat",),
+    lambda: {(k,): float(v) for k, v in audit_stats().items() if isinstance(v, (int, float))},
+)
+
+
+if __name__ == "__main__":
+    # Tập triệu chứng phổ biến: python -m backend.audit_log [số dòng]
+    import sys
+    for item in top_symptom_sets(limit=int(sys.argv[1]) if len(sys.argv) > 1 else 20):
+        print(f"{item['count']:>7}  {', '.join(item['symptoms'])}")
@@ -0,0 +1,133 @@
+import json
+import os
+import time
+from typing import Any, AsyncIterator, Dict, Iterable, Iterator, List, Optional
+
+from backend.admission import PREDICT_ADMISSION, Overloaded
+from backend.metrics import REGISTRY
+
+# Số ghi chú mỗi lô suy luận và giới hạn độ dài 1 dòng NDJSON
+BULK_BATCH_SIZE = int(os.getenv("BULK_BATCH_SIZE", "256"))
+BULK_MAX_LINE_BYTES = int(os.getenv("BULK_MAX_LINE_BYTES", str(1024 * 1024)))
+# Quá tải: chờ theo Retry-After rồi thử lại lô, tối đa bao nhiêu lần trước khi trả lỗi cho cả lô
+BULK_OVERLOAD_RETRIES = int(os.getenv("BULK_OVERLOAD_RETRIES", "30"))
+
+BULK_LINES = REGISTRY.counter("jaremis_bulk_lines_total", "Dòng NDJSON chẩn đoán hàng loạt theo kết quả", ("outcome",))
+
+NDJSON = "application/x-ndjson"
+
+
+def parse_line(raw: bytes, lineno: int) -> Optional[Dict[str, Any]]:
+    """
+    1 dòng input -> {"id", "line", "text"} hoặc {"id", "line", "error"}; None nếu dòng trống.
+    Chấp nhận {"id": ..., "text": "..."} (hoặc "note") hay 1 chuỗi JSON.
+    """
+    raw = raw.strip()
+    if not raw:
+        return None
+    if len(raw) > BULK_MAX_LINE_BYTES:
+        return {"id": None, "line": lineno, "error": f"Dòng dài quá {BULK_MAX_LINE_BYTES} byte"}
+    try:
+        obj = json.loads(raw)
+    except ValueError as e:
+        return {"id": None, "line": lineno, "error": f"JSON không hợp lệ: {e}"}
+    if isinstance(obj, str):
+        return {"id": lineno, "line": lineno, "text": obj}
+    if isinstance(obj, dict):
+        text = obj.get("text", obj.get("note"))
+        if isinstance(text, str):
+            return {"id": obj.get("id", lineno), "line": lineno, "text": text}
+        return {"id": obj.get("id", lineno), "line": lineno, "error": "Thiếu 'text' dạng chuỗi"}
+    return {"id": None, "line": lineno, "error": "Mỗi dòng phải là object {id, text} hoặc chuỗi"}
+
+
+def _dump(obj: Dict[str, Any]) -> bytes:
+    return (json.dumps(obj, ensure_ascii=False) + "\n").encode("utf-8")
+
+
+def process_batch(items: List[Dict[str, Any]]) -> bytes:
+    """Chẩn đoán 1 lô dòng đã parse (giữ thứ tự), trả về các dòng NDJSON kết quả."""
+    from backend.predict_disease_dl import predict_texts_batch
+    todo = [it for it in items if "text" in it]
+    results: List[Dict[str, Any]] = []
+    if todo:
+        for attempt in range(BULK_OVERLOAD_RETRIES + 1):
+            try:
+                # Cả lô = 1 slot in-flight: không chiếm hết chỗ của request tương tác
+                with PREDICT_ADMISSION.admit():
+                    results = predict_texts_batch([it["text"] for it in todo])
+                break
+            except Overloaded as e:
+                if attempt == BULK_OVERLOAD_RETRIES:
+                    results = [{"error": str(e)} for _ in todo]
+                else:
+                    time.sleep(e.retry_after)
+            except Exception as e:
+                # Lỗi 1 lô không cắt ngang cả luồng: các dòng của lô nhận lỗi, lô sau vẫn chạy
+                results = [{"error": f"Lỗi dự đoán: {e}"} for _ in todo]
+                break
+    by_line = {it["line"]: res for it, res in zip(todo, results)}
+    out = []
+    for it in items:
+        if it["line"] in by_line:
+            row = {"id": it["id"], "line": it["line"], **by_line[it["line"]]}
+        else:
+            row = dict(it)
+        BULK_LINES.inc("error" if "error" in row else "ok")
+        out.append(_dump(row))
+    return b"".join(out)
+
+
+def _split_lines(chunks: Iterable[bytes]) -> Iterator[bytes]:
+    buf = b""
+    for chunk in chunks:
+        buf += chunk
+        *lines, buf = buf.split(b"\n")
+        yield from lines
+    if buf:
+        yield buf
+
+
+def iter_results(chunks: Iterable[bytes], batch_size: int = BULK_BATCH_SIZE) -> Iterator[bytes]:
+    """Luồng byte NDJSON vào -> luồng NDJSON kết quả ra theo lô (Flask / WSGI)."""
+    batch: List[Dict[str, Any]] = []
+    for lineno, raw in enumerate(_split_lines(chunks), start=1):
+        item = parse_line(raw, lineno)
+        if item is not None:
+            batch.append(item)
+        if len(batch) >= batch_size:
+            yield process_batch(batch)
+            batch = []
+    if batch:
+        yield process_batch(batch)
+
+
+async def aiter_results(chunks: AsyncIterator[bytes], batch_size: int = BULK_BATCH_SIZE) -> AsyncIterator[bytes]:
+    """Như iter_results cho request.stream() của FastAPI; suy luận chạy trong threadpool, không chặn event loop."""
+    from starlette.concurrency import run_in_threadpool
+    batch: List[Dict[str, Any]] = []
+    buf = b""
+    lineno = 0
+
+    def take(lines: List[bytes]) -> List[List[Dict[str, Any]]]:
+        nonlocal batch, lineno
+        full = []
+        for raw in lines:
+            lineno += 1
+            item = parse_line(raw, lineno)
+            if item is not None:
+                batch.append(item)
+            if len(batch) >= batch_size:
+                full.append(batch)
+                batch = []
+        return full
+
+    async for chunk in chunks:
+        buf += chunk
+        *lines, buf = buf.split(b"\n")
+        for ready in take(lines):
+            yield await run_in_threadpool(process_batch, ready)
+    for ready in take([buf] if buf else []):
+        yield await run_in_threadpool(process_batch, ready)
+    if batch:
+        yield await run_in_threadpool(process_batch, batch)
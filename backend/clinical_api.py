@@ -1,22 +1,16 @@
-import requests
+from backend import http_client
+from backend.icd10_index import search_icd10
+
+REQUEST_TIMEOUT = 10
+
 
 def search_clinical_table(symptom: str):
-    url = "https://clinicaltables.nlm.nih.gov/api/icd10cm/v3/search"
-    params = {
-        "terms": symptom,
-        "maxList": 10
-    }
-    response = requests.get(url, params=params)
-    if response.status_code == 200:
-        data = response.json()
-        print(data)  # In toàn bộ dữ liệu xem cấu trúc JSON
-        return data[1] if len(data) > 1 else []
-    else:
-        return []
+    """Danh sách mã ICD-10 liên quan (chỉ mục cục bộ, không có kết quả thì hỏi NIH)."""
+    return [item["code"] for item in search_icd10(symptom, limit=10)["items"]]
 
 def get_healthfinder_topics():
     url = "https://health.gov/myhealthfinder/api/v3/topicsearch.json"
-    response = requests.get(url)
+    response = http_client.get(url, timeout=REQUEST_TIMEOUT)
     if response.status_code == 200:
         data = response.json()
         topics = data.get("Result", {}).get("Resources", {}).get("Resource", [])
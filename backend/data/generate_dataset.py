@@ -0,0 +1,207 @@
+"""
+Sinh dữ liệu bệnh - triệu chứng giả lập (có seed, tái lập được) để thử tải train/index/serving.
+
+    python backend/data/generate_dataset.py --records 1000000 --symptoms 20000 --out backend/data/synthetic
+
+- Ghi JSONL chia shard: mapping-00000.jsonl, ... mỗi dòng {"disease": ..., "symptoms": [...]}
+  + symptoms.jsonl (từ điển triệu chứng) + manifest.json (tham số, số dòng từng shard)
+- Bộ nhớ không đổi theo số record: hồ sơ triệu chứng của từng bệnh sinh lại từ (seed, id bệnh),
+  chỉ giữ bảng phân phối tích lũy O(số bệnh + số triệu chứng)
+- Tần suất lệch kiểu Zipf: vài bệnh/triệu chứng rất phổ biến, đa số hiếm
+- Cùng seed + tham số -> cùng nội dung, không phụ thuộc kích thước shard
+"""
+import argparse
+import itertools
+import json
+import os
+import random
+import sys
+import time
+from bisect import bisect_left
+from typing import Dict, Iterator, List, Optional
+
+HERE = os.path.dirname(os.path.abspath(__file__))
+KEYWORDS_PATH = os.path.join(HERE, "symptom_keywords.json")
+
+MAX_SYMPTOMS = 100_000
+MAX_RECORDS = 10_000_000
+# Mặc định số bệnh = records/5 nhưng không quá ngưỡng này (số lớp output của model)
+DEFAULT_MAX_DISEASES = 50_000
+
+# Bổ ngữ ghép với triệu chứng gốc để mở rộng từ điển tới số lượng yêu cầu
+MODIFIERS = [
+    "kéo dài", "dữ dội", "nhẹ", "từng cơn", "về đêm", "buổi sáng", "sau ăn", "khi vận động",
+    "tái phát", "đột ngột", "âm ỉ", "lan tỏa", "một bên", "hai bên", "khi nằm", "khi gắng sức",
+]
+
+
+def _cum_weights(n: int, exponent: float) -> List[float]:
+    """Trọng số tích lũy Zipf: phần tử hạng r có trọng số 1 / r^exponent."""
+    return list(itertools.accumulate(1.0 / (r ** exponent) for r in range(1, n + 1)))
+
+
+def _draw(rng: random.Random, cum: List[float]) -> int:
+    return bisect_left(cum, rng.random() * cum[-1])
+
+
+def symptom_vocabulary(n: int, keywords_path: str = KEYWORDS_PATH) -> Iterator[str]:
+    """n tên triệu chứng không trùng: từ khóa thật trước, rồi ghép bổ ngữ, cuối cùng đánh số."""
+    try:
+        with open(keywords_path, encoding="utf-8") as f:
+            base = list(json.load(f))
+    except (OSError, ValueError):
+        base = []
+    seen = set()
+    count = 0
+
+    def candidates() -> Iterator[str]:
+        yield from base
+        for mod in MODIFIERS:
+            for b in base:
+                yield f"{b} {mod}"
+        for i in itertools.count(1):
+            yield f"triệu chứng đặc biệt {i}"
+
+    for name in candidates():
+        if count >= n:
+            return
+        if name in seen:
+            continue
+        seen.add(name)
+        count += 1
+        yield name
+
+
+class DatasetGenerator:
+    """
+    Mỗi bệnh có 1 hồ sơ cố định (core_min..core_max triệu chứng, rút theo Zipf trên từ điển);
+    mỗi record giữ từng triệu chứng lõi với xác suất keep_prob và thêm 0..noise triệu chứng nhiễu.
+    """
+
+    def __init__(self, symptoms: List[str], n_diseases: int, seed: int = 0, disease_skew: float = 1.0,
+                 symptom_skew: float = 1.1, core_min: int = 3, core_max: int = 8, keep_prob: float = 0.8,
+                 noise: int = 2, min_symptoms: int = 2):
+        self.symptoms = symptoms
+        self.n_diseases = n_diseases
+        self.seed = seed
+        if core_min < 1:
+            raise ValueError("--core-min phải >= 1")
+        # Từ điển nhỏ hơn core_min (vd. --symptoms 2): hồ sơ bệnh dùng toàn bộ từ điển
+        self.core_min = min(core_min, len(symptoms))
+        self.core_max = max(self.core_min, min(core_max, len(symptoms)))
+        self.keep_prob = keep_prob
+        self.noise = noise
+        self.min_symptoms = min_symptoms
+        self._disease_cum = _cum_weights(n_diseases, disease_skew)
+        self._symptom_cum = _cum_weights(len(symptoms), symptom_skew)
+        # Hoán vị cố định: bệnh hạng 1 không luôn là "Bệnh số 1"
+        order = list(range(n_diseases))
+        random.Random(seed ^ 0x5EED).shuffle(order)
+        self._disease_by_rank = order
+
+    @staticmethod
+    def disease_name(did: int) -> str:
+        return f"Bệnh số {did + 1}"
+
+    def profile(self, did: int) -> List[int]:
+        """Triệu chứng lõi của bệnh (tính lại từ seed, không lưu)."""
+        rng = random.Random(self.seed * 1_000_003 + did)
+        size = rng.randint(self.core_min, self.core_max)
+        core: Dict[int, None] = {}
+        while len(core) < size:
+            core[_draw(rng, self._symptom_cum)] = None
+        return list(core)
+
+    def records(self, n: int) -> Iterator[Dict[str, object]]:
+        rng = random.Random(self.seed)
+        for _ in range(n):
+            did = self._disease_by_rank[_draw(rng, self._disease_cum)]
+            core = self.profile(did)
+            chosen = [s for s in core if rng.random() < self.keep_prob]
+            if len(chosen) < self.min_symptoms:
+                chosen = core[:max(self.min_symptoms, len(chosen))]
+            for _ in range(rng.randint(0, self.noise)):
+                s = _draw(rng, self._symptom_cum)
+                if s not in chosen:
+                    chosen.append(s)
+            rng.shuffle(chosen)
+            yield {"disease": self.disease_name(did), "symptoms": [self.symptoms[s] for s in chosen]}
+
+
+def write_dataset(out_dir: str, records: int, n_symptoms: int, n_diseases: Optional[int] = None,
+                  seed: int = 0, shard_size: int = 1_000_000, log=print, **kwargs) -> Dict[str, object]:
+    if not 1 <= n_symptoms <= MAX_SYMPTOMS:
+        raise ValueError(f"--symptoms phải trong [1, {MAX_SYMPTOMS}]")
+    if not 1 <= records <= MAX_RECORDS:
+        raise ValueError(f"--records phải trong [1, {MAX_RECORDS}]")
+    n_diseases = n_diseases or max(1, min(records // 5, DEFAULT_MAX_DISEASES))
+    start = time.perf_counter()
+    symptoms = list(symptom_vocabulary(n_symptoms))
+    # Tạo generator trước khi ghi file: tham số sai thì báo lỗi mà không để lại thư mục dở dang
+    gen = DatasetGenerator(symptoms, n_diseases, seed=seed, **kwargs)
+
+    os.makedirs(out_dir, exist_ok=True)
+    with open(os.path.join(out_dir, "symptoms.jsonl"), "w", encoding="utf-8") as f:
+        for i, s in enumerate(symptoms):
+            f.write(json.dumps({"id": i, "symptom": s}, ensure_ascii=False) + "\n")
+
+    shards = []
+    it = gen.records(records)
+    for shard in itertools.count():
+        name = f"mapping-{shard:05d}.jsonl"
+        written = 0
+        with open(os.path.join(out_dir, name), "w", encoding="utf-8") as f:
+            for rec in itertools.islice(it, shard_size):
+                f.write(json.dumps(rec, ensure_ascii=False) + "\n")
+                written += 1
+        if written == 0:
+            os.remove(os.path.join(out_dir, name))
+            break
+        shards.append({"file": name, "records": written})
+        log(f"{name}: {written} dòng ({sum(s['records'] for s in shards)}/{records})")
+
+    manifest = {
+        "seed": seed,
+        "records": records,
+        "symptoms": len(symptoms),
+        "diseases": n_diseases,
+        "shard_size": shard_size,
+        "params": kwargs,
+        "shards": shards,
+        "seconds": round(time.perf_counter() - start, 3),
+    }
+    with open(os.path.join(out_dir, "manifest.json"), "w", encoding="utf-8") as f:
+        json.dump(manifest, f, ensure_ascii=False, indent=2)
+    return manifest
+
+
+def main(argv=None) -> int:
+    parser = argparse.ArgumentParser(description="Sinh dữ liệu bệnh - triệu chứng giả lập (JSONL chia shard)")
+    parser.add_argument("--records", type=int, default=10_000, help=f"Số dòng (tối đa {MAX_RECORDS})")
+    parser.add_argument("--symptoms", type=int, default=2_500, help=f"Số triệu chứng (tối đa {MAX_SYMPTOMS})")
+    parser.add_argument("--diseases", type=int, default=None, help=f"Số bệnh (mặc định records/5, tối đa {DEFAULT_MAX_DISEASES})")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--shard-size", type=int, default=1_000_000, help="Số dòng mỗi shard")
+    parser.add_argument("--disease-skew", type=float, default=1.0, help="Số mũ Zipf tần suất bệnh (0 = đều)")
+    parser.add_argument("--symptom-skew", type=float, default=1.1, help="Số mũ Zipf tần suất triệu chứng")
+    parser.add_argument("--core-min", type=int, default=3)
+    parser.add_argument("--core-max", type=int, default=8)
+    parser.add_argument("--keep-prob", type=float, default=0.8, help="Xác suất giữ mỗi triệu chứng lõi")
+    parser.add_argument("--noise", type=int, default=2, help="Số triệu chứng nhiễu tối đa mỗi dòng")
+    parser.add_argument("--out", default=os.path.join(HERE, "synthetic"))
+    args = parser.parse_args(argv)
+    try:
+        manifest = write_dataset(
+            args.out, args.records, args.symptoms, args.diseases, seed=args.seed, shard_size=args.shard_size,
+            disease_skew=args.disease_skew, symptom_skew=args.symptom_skew, core_min=args.core_min,
+            core_max=args.core_max, keep_prob=args.keep_prob, noise=args.noise,
+        )
+    except ValueError as e:
+        parser.error(str(e))
+    print(f"Đã sinh {manifest['records']} dòng, {manifest['symptoms']} triệu chứng, "
+          f"{manifest['diseases']} bệnh vào {args.out} ({manifest['seconds']}s)")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,151 @@
+"""
+Deadline theo request: ngân sách thời gian lấy từ header X-Request-Timeout (giây) hoặc mặc định theo route,
+lưu trong contextvar -> tự đi theo luồng/asyncio task (threadpool FastAPI, _in_pool của diagnosis).
+
+- Giai đoạn bắt buộc: timeout = min(timeout riêng, thời gian còn lại) (timeout_for)
+- Giai đoạn tùy chọn (API mức độ, WHO, EndlessMedical, dịch lời khuyên, TTS): allow(stage) = còn đủ
+  ngân sách tối thiểu của stage, không đủ -> bỏ qua và ghi vào danh sách skipped trả cho client
+Không có deadline (script, batch nội bộ, WebSocket) -> mọi hàm trả về như không giới hạn.
+"""
+import contextvars
+import os
+import time
+from contextlib import contextmanager
+from typing import Dict, Iterator, List, Optional
+
+from backend.metrics import REGISTRY
+
+DEADLINE_HEADER = "X-Request-Timeout"
+# Response: các giai đoạn bị bỏ qua vì thiếu thời gian (ngăn bởi dấu phẩy)
+SKIPPED_HEADER = "X-Skipped-Stages"
+DEADLINE_DEFAULT = float(os.getenv("DEADLINE_DEFAULT", "10"))
+DEADLINE_MAX = float(os.getenv("DEADLINE_MAX", "60"))
+# Ngân sách mặc định theo route; None = không đặt deadline (trừ khi client gửi header)
+ROUTE_BUDGETS: Dict[str, Optional[float]] = {
+    "/predict": float(os.getenv("DEADLINE_PREDICT", "3")),
+    "/predict/disease": float(os.getenv("DEADLINE_PREDICT", "3")),
+    "/predict/text": float(os.getenv("DEADLINE_PREDICT", "3")),
+    "/process_audio": float(os.getenv("DEADLINE_PROCESS_AUDIO", "15")),
+    "/predict/text/bulk": None,
+    "/train/model": None,
+}
+NO_DEADLINE_PREFIXES = ("/admin/", "/ws/")
+
+# Thời gian còn lại tối thiểu (giây) để chạy từng giai đoạn tùy chọn
+DEADLINE_OPTIONAL_MIN = float(os.getenv("DEADLINE_OPTIONAL_MIN", "0.5"))
+STAGE_MIN_BUDGET: Dict[str, float] = {
+    "severity_api": DEADLINE_OPTIONAL_MIN,
+    "popular_diseases": DEADLINE_OPTIONAL_MIN,
+    "endless": float(os.getenv("DEADLINE_ENDLESS_MIN", "2")),
+    "translate_output": DEADLINE_OPTIONAL_MIN,
+    "tts": float(os.getenv("DEADLINE_TTS_MIN", "1")),
+}
+
+# Thời gian giữ lại cho các bước bắt buộc phía sau khi chạy 1 giai đoạn tùy chọn (giây)
+DEADLINE_RESERVE = float(os.getenv("DEADLINE_RESERVE", "0.25"))
+
+DEADLINE_SKIPPED = REGISTRY.counter(
+    "jaremis_deadline_skipped_total", "Giai đoạn tùy chọn bị bỏ qua vì request sắp hết thời gian", ("stage",))
+
+
+class DeadlineExceeded(TimeoutError):
+    """Hết thời gian của request trước khi bắt đầu 1 giai đoạn bắt buộc."""
+
+
+class Deadline:
+    def __init__(self, budget: float):
+        self.budget = budget
+        self.expires = time.monotonic() + budget
+        self.skipped: List[str] = []
+
+    def remaining(self) -> float:
+        return max(0.0, self.expires - time.monotonic())
+
+    def skip(self, stage: str) -> None:
+        if stage not in self.skipped:
+            self.skipped.append(stage)
+        DEADLINE_SKIPPED.inc(stage)
+
+
+_DEADLINE: contextvars.ContextVar[Optional[Deadline]] = contextvars.ContextVar("jaremis_deadline", default=None)
+
+
+def current() -> Optional[Deadline]:
+    return _DEADLINE.get()
+
+
+def remaining() -> Optional[float]:
+    """Số giây còn lại, None nếu request không có deadline."""
+    d = _DEADLINE.get()
+    return None if d is None else d.remaining()
+
+
+def timeout_for(timeout: float) -> float:
+    """Timeout cho 1 giai đoạn bắt buộc; ném DeadlineExceeded nếu đã hết giờ."""
+    d = _DEADLINE.get()
+    if d is None:
+        return timeout
+    left = d.remaining()
+    if left <= 0:
+        raise DeadlineExceeded(f"Request đã hết {d.budget:g}s")
+    return min(timeout, left)
+
+
+def optional_timeout(timeout: float) -> float:
+    """Timeout cho giai đoạn tùy chọn đã qua allow(): chừa DEADLINE_RESERVE cho phần còn lại của request."""
+    d = _DEADLINE.get()
+    if d is None:
+        return timeout
+    return max(0.0, min(timeout, d.remaining() - DEADLINE_RESERVE))
+
+
+def allow(stage: str, min_budget: Optional[float] = None) -> bool:
+    """Giai đoạn tùy chọn: còn đủ thời gian thì True, không thì ghi nhận bị bỏ qua và trả False."""
+    d = _DEADLINE.get()
+    if d is None:
+        return True
+    need = STAGE_MIN_BUDGET.get(stage, DEADLINE_OPTIONAL_MIN) if min_budget is None else min_budget
+    if d.remaining() >= need:
+        return True
+    d.skip(stage)
+    return False
+
+
+def skipped_stages() -> List[str]:
+    d = _DEADLINE.get()
+    return list(d.skipped) if d is not None else []
+
+
+def budget_for(path: str, header: Optional[str] = None) -> Optional[float]:
+    """Header hợp lệ (giây, > 0, tối đa DEADLINE_MAX) được ưu tiên, không thì mặc định của route."""
+    if header:
+        try:
+            value = float(header)
+            if value > 0:
+                return min(value, DEADLINE_MAX)
+        except ValueError:
+            pass
+    if path in ROUTE_BUDGETS:
+        return ROUTE_BUDGETS[path]
+    if path.startswith(NO_DEADLINE_PREFIXES):
+        return None
+    return DEADLINE_DEFAULT
+
+
+def start(budget: Optional[float]) -> contextvars.Token:
+    """Đặt deadline cho request hiện tại (hook before_request của Flask); trả token cho reset()."""
+    return _DEADLINE.set(Deadline(budget) if budget is not None else None)
+
+
+def reset(token: contextvars.Token) -> None:
+    _DEADLINE.reset(token)
+
+
+@contextmanager
+def request_deadline(budget: Optional[float]) -> Iterator[Optional[Deadline]]:
+    """Đặt deadline cho đoạn code bên trong (None = không giới hạn)."""
+    token = start(budget)
+    try:
+        yield _DEADLINE.get()
+    finally:
+        reset(token)
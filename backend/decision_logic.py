@@ -28,6 +28,16 @@ def make_decision(diagnosis_result: Dict, symptoms: List[str]) -> Dict:
         else:
             severity = "Thấp"
             recommendations.append(f"Bệnh nhẹ hoặc không nghiêm trọng. Tiếp tục theo dõi triệu chứng.")
+    else:
+        # 1b. Không có EndlessMedical: dùng mức độ (không phải xác suất lớp bệnh) của model nội bộ
+        local = diagnosis_result.get("LocalSeverity")
+        if local:
+            severity = local.get("Level", severity)
+            go_to_hospital = bool(local.get("GoToHospital"))
+            if go_to_hospital:
+                recommendations.append(f"Nghi ngờ: {local.get('Name', '')} (mức độ {severity}). Nên đi khám bác sĩ sớm.")
+            else:
+                recommendations.append(f"Nghi ngờ: {local.get('Name', '')} (mức độ {severity}). Theo dõi triệu chứng và nghỉ ngơi.")
 
     # 2. Phân tích thêm nếu có triệu chứng cụ thể
     if "Fever" in symptoms:
@@ -1,8 +1,12 @@
 # File: backend/diagnosis.py
 
 import os
-import requests
-from typing import List, Dict, Any
+import time
+import asyncio
+import contextvars
+import functools
+from concurrent.futures import ThreadPoolExecutor
+from typing import List, Dict, Any, Optional, Tuple
 from pathlib import Path
 from dotenv import load_dotenv
 
@@ -13,13 +17,41 @@ if not DOTENV_PATH.exists():
     DOTENV_PATH = Path(__file__).resolve().parent / ".env"
 load_dotenv(dotenv_path=DOTENV_PATH, override=False)
 
-# Import các module nội bộ (giữ nguyên nếu bạn đã có)
-from analyzer import extract_symptoms
-from decision_logic import make_decision
+# Import các module nội bộ (chạy từ thư mục gốc: python -m backend.diagnosis)
+from backend import deadline, http_client
+from backend.analyzer import extract_symptom_matches
+from backend.decision_logic import make_decision
+from backend.metrics import REGISTRY, stage_timer
+from backend.predict_disease_dl import predict_disease
+from backend.icd10_index import search_icd10
+
+PIPELINE = "diagnose_and_suggest"
+
+# Deadline (giây) riêng cho từng nguồn chẩn đoán; nguồn quá hạn bị bỏ qua khi hợp nhất kết quả
+SOURCE_TIMEOUTS = {
+    "endless": float(os.getenv("ENDLESS_TIMEOUT", "8")),
+    "local_model": float(os.getenv("LOCAL_MODEL_TIMEOUT", "3")),
+    "icd10": float(os.getenv("ICD10_TIMEOUT", "3")),
+}
+# Số triệu chứng tối đa tra ICD-10 (mỗi triệu chứng 1 request, chạy song song)
+ICD10_MAX_TERMS = int(os.getenv("ICD10_MAX_TERMS", "3"))
+
+# Pool riêng cho các lời gọi chặn: nguồn quá hạn vẫn chạy nốt trong pool
+# nhưng asyncio.run() của wrapper đồng bộ không phải chờ nó (khác default executor).
+_SOURCE_POOL = ThreadPoolExecutor(max_workers=int(os.getenv("DIAGNOSIS_WORKERS", "16")),
+                                  thread_name_prefix="diagnosis-source")
+
+# Nguồn làm giàu kết quả: bỏ qua khi request không còn đủ thời gian (backend.deadline)
+OPTIONAL_SOURCES = ("endless",)
+
+SOURCE_TIMEOUTS_TOTAL = REGISTRY.counter(
+    "jaremis_source_timeouts_total", "Số lần nguồn chẩn đoán quá deadline", ("pipeline", "source"))
 
 # ===== EndlessMedical API (RapidAPI) =====
 ENDLESS_API_KEY = os.getenv("ENDLESSMEDICAL_API_KEY", "")
-ENDLESS_BASE_URL = "https://endlessmedicalapi1.p.rapidapi.com"
+ENDLESS_BASE_URL = os.getenv("ENDLESS_BASE_URL", "https://endlessmedicalapi1.p.rapidapi.com")
+# Timeout đọc mỗi lời gọi EndlessMedical (giây); thử lại/pool do backend.http_client lo
+ENDLESS_HTTP_TIMEOUT = float(os.getenv("ENDLESS_HTTP_TIMEOUT", "20"))
 ENDLESS_INIT_SESSION_URL = f"{ENDLESS_BASE_URL}/InitSession"
 ENDLESS_UPDATE_FEATURE_URL = f"{ENDLESS_BASE_URL}/UpdateFeature"
 ENDLESS_GET_DIAGNOSIS_URL = f"{ENDLESS_BASE_URL}/GetDiagnosis"
@@ -29,50 +61,33 @@ ENDLESS_HEADERS = {
     "x-rapidapi-key": ENDLESS_API_KEY
 }
 
-# ===== NIH Clinical Tables (ICD-10) =====
-CLINICAL_TABLES_API = "https://clinicaltables.nlm.nih.gov/api/icd10cm/v3/search"
+# ===== ICD-10: chỉ mục cục bộ, NIH Clinical Tables khi cục bộ không có kết quả (xem icd10_index) =====
 
 # ===== MyHealthfinder API =====
-MYHEALTHFINDER_API = "https://health.gov/myhealthfinder/api/v3/topicsearch.json"
+MYHEALTHFINDER_API = os.getenv("MYHEALTHFINDER_API", "https://health.gov/myhealthfinder/api/v3/topicsearch.json")
 
 
-def call_endless_api(symptoms: List[str]) -> Dict[str, Any]:
-    """
-    Gửi triệu chứng đến EndlessMedical API để nhận chẩn đoán (top conditions).
-    Trả về dict gồm session info và kết quả chẩn đoán (nếu có).
-    """
-    result: Dict[str, Any] = {"sessionId": None, "diagnosis": None, "raw": None}
-
-    if not ENDLESS_API_KEY:
-        raise RuntimeError("Thiếu ENDLESSMEDICAL_API_KEY trong .env")
+def _endless_session_id(resp) -> Any:
+    resp.raise_for_status()
+    data = resp.json()
+    return data.get("SessionID") or data.get("SessionIDString") or data.get("result")
 
-    # 1) Tạo session
-    session_resp = requests.get(ENDLESS_INIT_SESSION_URL, headers=ENDLESS_HEADERS, timeout=20)
-    session_resp.raise_for_status()
-    session_data = session_resp.json()
-    session_id = session_data.get("SessionID") or session_data.get("SessionIDString") or session_data.get("result")
-    result["sessionId"] = session_id
 
-    # 2) Cập nhật các feature/triệu chứng
+def _endless_feature(session_id: Any, symptom: str) -> Dict[str, Any]:
     # API yêu cầu tên feature chuẩn của họ; ở đây ta cứ gửi chuỗi văn bản để demo.
     # Tùy thực tế, bạn map "symptom text" -> feature name đúng chuẩn trước khi gọi API.
-    for s in symptoms or []:
-        payload = {
-            "SessionID": session_id,
-            "name": str(s),
-            "value": "present"  # có thể cần "present"/"absent"/mức độ tùy API
-        }
-        uf = requests.post(ENDLESS_UPDATE_FEATURE_URL, headers=ENDLESS_HEADERS, json=payload, timeout=20)
-        uf.raise_for_status()
+    return {
+        "SessionID": session_id,
+        "name": str(symptom),
+        "value": "present"  # có thể cần "present"/"absent"/mức độ tùy API
+    }
 
-    # 3) Lấy chẩn đoán
-    diag_resp = requests.get(ENDLESS_GET_DIAGNOSIS_URL, headers=ENDLESS_HEADERS, params={"SessionID": session_id}, timeout=20)
-    diag_resp.raise_for_status()
-    diag_json = diag_resp.json()
-    result["raw"] = diag_json
 
-    # Chuẩn hóa kết quả top conditions (nếu có)
-    # Endless trả định dạng khác nhau tùy phiên bản; ta cố gắng trích top conditions.
+def _parse_endless_diagnosis(diag_json: Any) -> List[Dict[str, Any]]:
+    """
+    Chuẩn hóa kết quả top conditions (nếu có), sắp xếp theo xác suất giảm dần.
+    Endless trả định dạng khác nhau tùy phiên bản; ta cố gắng trích top conditions.
+    """
     candidates = []
     if isinstance(diag_json, dict):
         # một số field thường gặp: "Diseases", "Data", "Conditions"
@@ -94,33 +109,66 @@ def call_endless_api(symptoms: List[str]) -> Dict[str, Any]:
                     candidates.append({"name": str(k), "probability": float(v)})
                 except Exception:
                     pass
-
-    # Sắp xếp theo xác suất giảm dần
     candidates.sort(key=lambda x: x.get("probability", 0.0), reverse=True)
-    result["diagnosis"] = candidates
-    return result
+    return candidates
+
+
+def call_endless_api(symptoms: List[str]) -> Dict[str, Any]:
+    """
+    Gửi triệu chứng đến EndlessMedical API để nhận chẩn đoán (top conditions).
+    Trả về dict gồm session info và kết quả chẩn đoán (nếu có).
+    """
+    if not ENDLESS_API_KEY:
+        raise RuntimeError("Thiếu ENDLESSMEDICAL_API_KEY trong .env")
+
+    # 1) Tạo session
+    session_id = _endless_session_id(
+        http_client.get(ENDLESS_INIT_SESSION_URL, headers=ENDLESS_HEADERS, timeout=ENDLESS_HTTP_TIMEOUT))
+
+    # 2) Cập nhật các feature/triệu chứng (đặt feature = idempotent, được thử lại)
+    for s in symptoms or []:
+        uf = http_client.post(ENDLESS_UPDATE_FEATURE_URL, headers=ENDLESS_HEADERS, json=_endless_feature(session_id, s),
+                              timeout=ENDLESS_HTTP_TIMEOUT, retry_unsafe=True)
+        uf.raise_for_status()
+
+    # 3) Lấy chẩn đoán
+    diag_resp = http_client.get(ENDLESS_GET_DIAGNOSIS_URL, headers=ENDLESS_HEADERS, params={"SessionID": session_id},
+                                timeout=ENDLESS_HTTP_TIMEOUT)
+    diag_resp.raise_for_status()
+    diag_json = diag_resp.json()
+    return {"sessionId": session_id, "diagnosis": _parse_endless_diagnosis(diag_json), "raw": diag_json}
+
+
+async def call_endless_api_async(symptoms: List[str]) -> Dict[str, Any]:
+    """
+    Như call_endless_api trên client async: các feature gửi đồng thời (cùng pool keep-alive),
+    quá deadline của nguồn -> hủy luôn các request đang chờ thay vì để chạy nốt trong thread.
+    """
+    if not ENDLESS_API_KEY:
+        raise RuntimeError("Thiếu ENDLESSMEDICAL_API_KEY trong .env")
+    session_id = _endless_session_id(
+        await http_client.aget(ENDLESS_INIT_SESSION_URL, headers=ENDLESS_HEADERS, timeout=ENDLESS_HTTP_TIMEOUT))
+    updates = await asyncio.gather(*(
+        http_client.apost(ENDLESS_UPDATE_FEATURE_URL, headers=ENDLESS_HEADERS, json=_endless_feature(session_id, s),
+                          timeout=ENDLESS_HTTP_TIMEOUT, retry_unsafe=True)
+        for s in symptoms or []))
+    for uf in updates:
+        uf.raise_for_status()
+    diag_resp = await http_client.aget(ENDLESS_GET_DIAGNOSIS_URL, headers=ENDLESS_HEADERS,
+                                       params={"SessionID": session_id}, timeout=ENDLESS_HTTP_TIMEOUT)
+    diag_resp.raise_for_status()
+    diag_json = diag_resp.json()
+    return {"sessionId": session_id, "diagnosis": _parse_endless_diagnosis(diag_json), "raw": diag_json}
 
 
 def search_clinical_table(term: str) -> Dict[str, Any]:
-    """Tra ICD-10 từ NIH Clinical Tables."""
-    r = requests.get(CLINICAL_TABLES_API, params={"terms": term, "sf": "code,name"}, timeout=20)
-    r.raise_for_status()
-    data = r.json()
-    # Trả về dạng dễ dùng
-    # data format: [index, numFound, [listResults], ...]
-    out: Dict[str, Any] = {"term": term, "total": 0, "items": []}
-    if isinstance(data, list) and len(data) >= 3 and isinstance(data[2], list):
-        out["total"] = int(data[1]) if len(data) > 1 and isinstance(data[1], (int, str)) else len(data[2])
-        for row in data[2]:
-            # row: [code, name, ...]
-            if isinstance(row, list) and len(row) >= 2:
-                out["items"].append({"code": row[0], "name": row[1]})
-    return out
+    """Tra ICD-10 (cục bộ, dự phòng NIH) -> {"term", "total", "items": [{"code", "name"}], "source"}."""
+    return search_icd10(term)
 
 
 def get_healthfinder_topics() -> Dict[str, Any]:
     """Lấy danh sách chủ đề sức khỏe từ MyHealthfinder."""
-    r = requests.get(MYHEALTHFINDER_API, timeout=20)
+    r = http_client.get(MYHEALTHFINDER_API, timeout=20)
     r.raise_for_status()
     data = r.json()
     items = []
@@ -129,41 +177,163 @@ def get_healthfinder_topics() -> Dict[str, Any]:
     return {"items": items}
 
 
-def diagnose_and_suggest(text: str) -> Dict[str, Any]:
+async def _in_pool(stage: str, fn, *args):
+    """Chạy hàm chặn trong _SOURCE_POOL (giữ contextvars), đo thời gian thực của nguồn."""
+    def call():
+        with stage_timer(PIPELINE, stage):
+            return fn(*args)
+    ctx = contextvars.copy_context()
+    return await asyncio.get_running_loop().run_in_executor(_SOURCE_POOL, functools.partial(ctx.run, call))
+
+
+async def _endless_source(features: List[str], keywords: List[str]) -> Dict[str, Any]:
+    with stage_timer(PIPELINE, "endless_api"):
+        return await call_endless_api_async(features)
+
+
+async def _local_model_source(features: List[str], keywords: List[str]) -> Optional[Dict[str, Any]]:
+    if not keywords:
+        return None
+    return await _in_pool("local_model", predict_disease, keywords)
+
+
+async def _icd10_source(features: List[str], keywords: List[str]) -> List[Dict[str, Any]]:
+    terms = features[:ICD10_MAX_TERMS]
+    results = await asyncio.gather(*(_in_pool("icd10", search_clinical_table, t) for t in terms),
+                                   return_exceptions=True)
+    ok = [r for r in results if not isinstance(r, BaseException)]
+    if terms and not ok:
+        raise results[0]
+    return ok
+
+
+SOURCES = {
+    "endless": _endless_source,
+    "local_model": _local_model_source,
+    "icd10": _icd10_source,
+}
+
+
+async def _run_source(name: str, features: List[str], keywords: List[str],
+                      timeout: float) -> Tuple[str, str, Any, float]:
     """
-    Pipeline: tách triệu chứng -> gọi EndlessMedical -> tạo khuyến nghị dựa trên decision_logic.
+    -> (tên nguồn, trạng thái ok|timeout|error|skipped, kết quả hoặc thông báo lỗi, thời gian ms).
+    Deadline của nguồn = min(timeout riêng, thời gian còn lại của request); nguồn tùy chọn chừa DEADLINE_RESERVE.
     """
+    start = time.perf_counter()
+    optional = name in OPTIONAL_SOURCES
+    if optional and not deadline.allow(name):
+        return name, "skipped", "Không đủ thời gian còn lại của request", 0.0
+    try:
+        timeout = deadline.optional_timeout(timeout) if optional else deadline.timeout_for(timeout)
+        value = await asyncio.wait_for(SOURCES[name](features, keywords), timeout)
+        status = "ok"
+    except asyncio.TimeoutError:
+        SOURCE_TIMEOUTS_TOTAL.inc(PIPELINE, name)
+        status, value = "timeout", f"Quá hạn {timeout:g}s"
+    except Exception as e:
+        status, value = "error", str(e)
+    return name, status, value, (time.perf_counter() - start) * 1000.0
+
+
+def _endless_conditions(endless: Optional[Dict[str, Any]]) -> List[Dict[str, Any]]:
+    """Bệnh nghi ngờ của EndlessMedical về định dạng "Diseases" mà make_decision đọc."""
+    diseases = [{"Name": c["name"], "Probability": c["probability"], "Source": "EndlessMedical"}
+                for c in (endless or {}).get("diagnosis") or []]
+    diseases.sort(key=lambda d: d["Probability"], reverse=True)
+    return diseases[:5]
+
+
+def _local_severity(local: Optional[Dict[str, Any]]) -> Optional[Dict[str, Any]]:
+    """
+    Mức độ của model nội bộ cho make_decision. Không đưa top_k vào "Diseases": xác suất softmax
+    là độ tin cậy của lớp bệnh, không phải mức độ nghiêm trọng (cúm p=0.99 vẫn là mức "Thấp").
+    """
+    if not local:
+        return None
+    return {"Name": local["disease"], "Level": local["severity_level"], "Score": local["severity_score"],
+            "GoToHospital": local["should_visit_hospital"]}
+
+
+async def diagnose_and_suggest_async(text: str, timeouts: Optional[Dict[str, float]] = None) -> Dict[str, Any]:
+    """
+    Pipeline: tách triệu chứng -> EndlessMedical, model nội bộ, ICD-10 chạy đồng thời
+    (mỗi nguồn 1 deadline) -> khuyến nghị từ decision_logic trên các kết quả về kịp.
+    Tổng độ trễ ~ nguồn chậm nhất trong deadline thay vì tổng các nguồn.
+    """
+    with stage_timer(PIPELINE, "total"):
+        return await _diagnose_and_suggest(text, {**SOURCE_TIMEOUTS, **(timeouts or {})})
+
+
+async def _diagnose_and_suggest(text: str, timeouts: Dict[str, float]) -> Dict[str, Any]:
     # 1) Trích xuất triệu chứng từ đoạn text người dùng
     try:
-        symptoms = extract_symptoms(text) or []
+        with stage_timer(PIPELINE, "extract_symptoms"):
+            matches = extract_symptom_matches(text) or []
     except Exception:
-        symptoms = []
+        matches = []
+    keywords = [k for k, _ in matches]
+    symptoms = [f for _, f in matches]
 
-    # 2) Gọi EndlessMedical (có thể fail nếu API key bad)
-    endless = {}
-    try:
-        endless = call_endless_api(symptoms)
-    except Exception as e:
-        endless = {"error": str(e)}
+    # 2) Gọi các nguồn đồng thời, nguồn nào quá hạn thì bỏ qua
+    with stage_timer(PIPELINE, "sources"):
+        runs = await asyncio.gather(*(_run_source(name, symptoms, keywords, timeouts[name]) for name in SOURCES))
+    results = {name: (value if status == "ok" else None) for name, status, value, _ in runs}
+    errors = {name: value for name, status, value, _ in runs if status != "ok"}
+    endless = results["endless"] or {}
+    local = results["local_model"]
 
     # 3) Biến đổi dữ liệu đầu vào cho decision_logic
     top_conditions = endless.get("diagnosis") or []
     diagnosis_result = {
         "TopConditions": top_conditions[:5],
-        "SessionID": endless.get("sessionId")
+        "SessionID": endless.get("sessionId"),
+        "Diseases": _endless_conditions(endless),
+        "LocalSeverity": _local_severity(local),
     }
 
     # 4) Quyết định hành động khuyến nghị
-    logic = make_decision(diagnosis_result, symptoms)
+    with stage_timer(PIPELINE, "decision"):
+        logic = make_decision(diagnosis_result, symptoms)
 
     return {
         "Triệu chứng": symptoms,
         "Chẩn đoán EndlessMedical": diagnosis_result,
+        "Chẩn đoán mô hình nội bộ": {
+            "disease": local["disease"],
+            "confidence": local["confidence"],
+            "severity_level": local["severity_level"],
+            "top_k": local["top_k"],
+        } if local else None,
+        "ICD-10": [item for r in results["icd10"] or [] for item in r["items"][:3]],
         "Khuyến nghị": logic,
-        "Lỗi EndlessMedical": endless.get("error")
+        "Lỗi EndlessMedical": errors.get("endless"),
+        "Nguồn": {name: {"status": status, "elapsed_ms": round(ms, 1)} for name, status, _, ms in runs},
+        "Nguồn quá hạn": [name for name, status, _, _ in runs if status == "timeout"],
+        "Giai đoạn bị bỏ qua": deadline.skipped_stages(),
     }
 
 
+async def _diagnose_once(text: str, timeouts: Optional[Dict[str, float]]) -> Dict[str, Any]:
+    # Event loop tạm của asyncio.run: đóng AsyncClient của loop trước khi loop bị hủy (tránh rò socket)
+    try:
+        return await diagnose_and_suggest_async(text, timeouts)
+    finally:
+        await http_client.aclose()
+
+
+def diagnose_and_suggest(text: str, timeouts: Optional[Dict[str, float]] = None) -> Dict[str, Any]:
+    """Wrapper đồng bộ của diagnose_and_suggest_async (dùng được cả khi luồng hiện tại có event loop)."""
+    try:
+        asyncio.get_running_loop()
+    except RuntimeError:
+        return asyncio.run(_diagnose_once(text, timeouts))
+    # Chạy trong bản sao context hiện tại: giữ deadline/cờ degraded của request ở luồng mới
+    ctx = contextvars.copy_context()
+    with ThreadPoolExecutor(max_workers=1) as ex:
+        return ex.submit(ctx.run, asyncio.run, _diagnose_once(text, timeouts)).result()
+
+
 if __name__ == "__main__":
     # Test nhanh trên terminal
     sample = input("Nhập mô tả triệu chứng: ")
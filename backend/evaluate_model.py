@@ -0,0 +1,235 @@
+"""
+Đánh giá model offline: độ chính xác + độ trễ trên đúng đường phục vụ
+(_normalize_input_symptoms -> encode_symptom_sets -> model.predict).
+
+    python -m backend.evaluate_model --engines keras,int8,tflite --drop 0.3 --noise 1 --accents 0.5
+
+- Tập đánh giá: các dòng mapping (hoặc file/thư mục shard held-out qua --mapping), tùy chọn làm nhiễu
+  có seed: bỏ bớt triệu chứng, thêm triệu chứng nhiễu, bỏ dấu tiếng Việt
+- Độ chính xác top-1/3/10, log loss, Brier, ECE (độ hiệu chỉnh) tính vector hóa trên cả tập sau vài lượt predict lô lớn
+- Độ trễ từng mẫu (batch 1, p50/p95/p99): chuẩn hóa + suy luận như 1 request thật
+- Nhiều engine/phiên bản model trong 1 báo cáo: engine đầu tiên là mốc, các engine sau có chênh lệch
+  và tỉ lệ trùng top-1 so với mốc. Chỉ định "engine" hoặc "engine:đường_dẫn_model" (vd. keras:/tmp/new.h5)
+"""
+import argparse
+import json
+import os
+import random
+import sys
+import time
+from typing import Any, Dict, List, Optional, Tuple
+
+import numpy as np
+
+from backend.mapping_io import MAPPING_PATH, load_mapping
+from backend.text_norm import fold
+
+REPORT_PATH = 'backend/models/evaluation_report.json'
+TOP_K = (1, 3, 10)
+CALIBRATION_BINS = 10
+
+
+def build_eval_set(mapping: List[Dict[str, Any]], vocabulary: List[str], sample: int = 0, drop: float = 0.0,
+                   noise: int = 0, accents: float = 0.0, seed: int = 0) -> List[Tuple[List[str], str]]:
+    """
+    (triệu chứng thô, bệnh đúng) cho từng mẫu. Nhiễu có seed:
+    drop = xác suất bỏ mỗi triệu chứng (giữ ít nhất 1), noise = thêm tối đa N triệu chứng ngẫu nhiên,
+    accents = xác suất bỏ dấu từng triệu chứng (kiểm tra bộ chuẩn hóa).
+    """
+    rng = random.Random(seed)
+    rows = [m for m in mapping if m.get("symptoms")]
+    if sample and sample < len(rows):
+        rows = rng.sample(rows, sample)
+    out = []
+    for item in rows:
+        syms = [s for s in item["symptoms"] if isinstance(s, str)]
+        if drop > 0:
+            kept = [s for s in syms if rng.random() >= drop]
+            syms = kept or [rng.choice(syms)]
+        if noise > 0 and vocabulary:
+            syms = syms + [rng.choice(vocabulary) for _ in range(rng.randint(0, noise))]
+        if accents > 0:
+            syms = [fold(s) if rng.random() < accents else s for s in syms]
+        out.append((syms, item["disease"]))
+    return out
+
+
+def load_engine(spec: str) -> Tuple[Any, str, str]:
+    """'engine' hoặc 'engine:path' -> (model có .predict, engine, đường dẫn file model)."""
+    from backend import predict_disease_dl as p
+    engine, _, path = spec.partition(":")
+    engine = engine.strip().lower() or p.INFERENCE_ENGINE
+    if engine == "tflite":
+        # Không phục vụ được (xem SERVING_ENGINES) nhưng vẫn đánh giá được để theo dõi độ lệch
+        path = path or p.TFLITE_MODEL_PATH
+        model = p.TFLiteModel(path)
+    elif not path:
+        model, path = p.load_inference_engine(engine)
+    elif engine == "int8":
+        model = p.Int8DenseModel(path)
+    else:
+        if p.keras is None:
+            raise ImportError("TensorFlow is required but not installed")
+        model = p.keras.models.load_model(path)
+    return model, engine, path
+
+
+def _percentiles(samples_ms: List[float]) -> Dict[str, float]:
+    if not samples_ms:
+        return {}
+    a = np.asarray(samples_ms)
+    return {"p50_ms": float(np.percentile(a, 50)), "p95_ms": float(np.percentile(a, 95)),
+            "p99_ms": float(np.percentile(a, 99)), "mean_ms": float(a.mean())}
+
+
+def score(probs: np.ndarray, labels: np.ndarray, top_k=TOP_K, bins: int = CALIBRATION_BINS) -> Dict[str, Any]:
+    """Chỉ số trên cả tập, vector hóa: hạng của bệnh đúng = số bệnh có xác suất lớn hơn."""
+    rows = np.arange(len(labels))
+    p_true = probs[rows, labels]
+    rank = (probs > p_true[:, None]).sum(axis=1)
+    conf = probs.max(axis=1)
+    correct = rank == 0
+    onehot = np.zeros_like(probs)
+    onehot[rows, labels] = 1.0
+
+    # ECE: |độ chính xác - độ tự tin trung bình| theo từng khoảng độ tự tin, trọng số theo số mẫu
+    edges = np.linspace(0.0, 1.0, bins + 1)
+    which = np.clip(np.digitize(conf, edges[1:-1]), 0, bins - 1)
+    count = np.bincount(which, minlength=bins)
+    acc_bin = np.bincount(which, weights=correct, minlength=bins) / np.maximum(count, 1)
+    conf_bin = np.bincount(which, weights=conf, minlength=bins) / np.maximum(count, 1)
+    ece = float(np.sum(count / max(1, len(labels)) * np.abs(acc_bin - conf_bin)))
+
+    return {
+        **{f"top{k}_accuracy": float(np.mean(rank < k)) for k in top_k},
+        "log_loss": float(-np.mean(np.log(np.clip(p_true, 1e-12, 1.0)))),
+        "brier": float(np.mean(np.sum((probs - onehot) ** 2, axis=1))),
+        "ece": ece,
+        "mean_confidence": float(conf.mean()),
+        "reliability": [
+            {"bin": f"{edges[i]:.1f}-{edges[i + 1]:.1f}", "count": int(count[i]),
+             "accuracy": float(acc_bin[i]), "confidence": float(conf_bin[i])}
+            for i in range(bins) if count[i]
+        ],
+    }
+
+
+def evaluate(engines: List[str], eval_set: List[Tuple[List[str], str]], latency_samples: int = 200,
+             batch_size: int = 1024, seed: int = 0, log=print) -> Dict[str, Any]:
+    from backend import predict_disease_dl as p
+    if not p.all_symptoms:
+        # Chỉ cần danh sách triệu chứng/bệnh cho bộ chuẩn hóa; model phục vụ không bắt buộc
+        try:
+            p.load_model()
+        except (ImportError, OSError, ValueError):
+            pass
+    disease_index = {d: i for i, d in enumerate(p.all_diseases)}
+
+    # Chuẩn hóa 1 lần cho mọi engine (cùng danh sách triệu chứng phục vụ), đo từng mẫu
+    normalized: List[List[str]] = []
+    norm_ms: List[float] = []
+    for raw, _ in eval_set:
+        start = time.perf_counter()
+        normalized.append(p._normalize_input_symptoms(raw))
+        norm_ms.append((time.perf_counter() - start) * 1000.0)
+    keep = [i for i, (_, d) in enumerate(eval_set) if d in disease_index]
+    labels = np.array([disease_index[eval_set[i][1]] for i in keep], dtype=np.int64)
+    X = p.encode_symptom_sets([normalized[i] for i in keep])
+    lat_rows = random.Random(seed).sample(range(len(keep)), min(latency_samples, len(keep)))
+    log(f"Tập đánh giá: {len(eval_set)} mẫu, {len(keep)} có bệnh trong model, "
+        f"{sum(1 for n in normalized if not n)} mẫu không khớp triệu chứng nào")
+
+    report: Dict[str, Any] = {
+        "samples": len(eval_set),
+        "scored_samples": len(keep),
+        "unknown_disease": len(eval_set) - len(keep),
+        "empty_after_normalize": sum(1 for n in normalized if not n),
+        "normalize_latency": _percentiles(norm_ms),
+        "engines": [],
+    }
+    baseline: Optional[np.ndarray] = None
+    for spec in engines:
+        model, engine, path = load_engine(spec)
+        start = time.perf_counter()
+        probs = np.concatenate([np.asarray(model.predict(X[lo:lo + batch_size], verbose=0, batch_size=batch_size))
+                                for lo in range(0, len(X), batch_size)]) if len(X) else np.zeros((0, len(disease_index)))
+        batch_seconds = time.perf_counter() - start
+        if probs.shape[1] != len(p.all_diseases):
+            raise ValueError(f"{spec}: model có {probs.shape[1]} lớp, danh sách bệnh có {len(p.all_diseases)}")
+
+        # Độ trễ 1 request: chuẩn hóa (đã đo) + encode + predict batch 1
+        model.predict(X[:1], verbose=0)
+        infer_ms, total_ms = [], []
+        for i in lat_rows:
+            start = time.perf_counter()
+            model.predict(p.encode_symptom_sets([normalized[keep[i]]]), verbose=0)
+            ms = (time.perf_counter() - start) * 1000.0
+            infer_ms.append(ms)
+            total_ms.append(ms + norm_ms[keep[i]])
+
+        entry = {
+            "spec": spec,
+            "engine": engine,
+            "path": path,
+            "version": engine + "-" + p._file_fingerprint([path, p.SYMPTOMS_PATH, p.DISEASES_PATH]),
+            "metrics": score(probs, labels),
+            "batch_throughput_per_s": len(X) / batch_seconds if batch_seconds > 0 else None,
+            "latency": {"inference": _percentiles(infer_ms), "end_to_end": _percentiles(total_ms)},
+        }
+        if baseline is None:
+            baseline = probs
+        else:
+            base = report["engines"][0]
+            entry["vs_baseline"] = {
+                "top1_agreement": float(np.mean(baseline.argmax(axis=1) == probs.argmax(axis=1))) if len(X) else None,
+                **{k: entry["metrics"][k] - base["metrics"][k]
+                   for k in ("top1_accuracy", "top3_accuracy", "top10_accuracy", "ece", "log_loss")},
+                "p50_speedup": (base["latency"]["end_to_end"].get("p50_ms", 0.0)
+                                / max(entry["latency"]["end_to_end"].get("p50_ms", 0.0), 1e-9)),
+            }
+        report["engines"].append(entry)
+        log(_fmt_row(entry))
+    return report
+
+
+def _fmt_row(e: Dict[str, Any]) -> str:
+    m, lat = e["metrics"], e["latency"]["end_to_end"]
+    row = (f"{e['spec']:<24} top1={m['top1_accuracy']:.4f} top3={m['top3_accuracy']:.4f} "
+           f"top10={m['top10_accuracy']:.4f} ece={m['ece']:.4f} "
+           f"p50={lat.get('p50_ms', 0):.2f}ms p95={lat.get('p95_ms', 0):.2f}ms p99={lat.get('p99_ms', 0):.2f}ms")
+    if "vs_baseline" in e:
+        d = e["vs_baseline"]
+        row += f"  [Δtop1={d['top1_accuracy']:+.4f} trùng top1={d['top1_agreement']:.3f} x{d['p50_speedup']:.1f}]"
+    return row
+
+
+def main(argv=None) -> int:
+    parser = argparse.ArgumentParser(prog="python -m backend.evaluate_model")
+    parser.add_argument("--engines", default="keras", help="Danh sách engine[:path], ngăn cách bởi ','; cái đầu là mốc")
+    parser.add_argument("--mapping", default=MAPPING_PATH, help="File .json/.jsonl hoặc thư mục shard")
+    parser.add_argument("--sample", type=int, default=0, help="Lấy ngẫu nhiên N dòng (0 = tất cả)")
+    parser.add_argument("--drop", type=float, default=0.0, help="Xác suất bỏ mỗi triệu chứng")
+    parser.add_argument("--noise", type=int, default=0, help="Thêm tối đa N triệu chứng ngẫu nhiên")
+    parser.add_argument("--accents", type=float, default=0.0, help="Xác suất bỏ dấu mỗi triệu chứng")
+    parser.add_argument("--latency-samples", type=int, default=200)
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--out", default=REPORT_PATH)
+    args = parser.parse_args(argv)
+
+    mapping = load_mapping(args.mapping)
+    vocabulary = sorted({s for m in mapping for s in m.get("symptoms", []) if isinstance(s, str)})
+    eval_set = build_eval_set(mapping, vocabulary, sample=args.sample, drop=args.drop, noise=args.noise,
+                              accents=args.accents, seed=args.seed)
+    report = evaluate([s for s in args.engines.split(",") if s.strip()], eval_set,
+                      latency_samples=args.latency_samples, seed=args.seed)
+    report.update({"mapping_path": args.mapping,
+                   "perturbation": {"drop": args.drop, "noise": args.noise, "accents": args.accents, "seed": args.seed}})
+    os.makedirs(os.path.dirname(os.path.abspath(args.out)), exist_ok=True)
+    with open(args.out, "w", encoding="utf-8") as f:
+        json.dump(report, f, ensure_ascii=False, indent=2)
+    print(f"Đã lưu: {args.out}")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
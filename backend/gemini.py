@@ -1,21 +1,30 @@
 from __future__ import annotations
-import os, json
+import os, json, re, threading
 from pathlib import Path
-from flask import Flask, request, jsonify, send_file
+from typing import Any, Dict, Iterator, Tuple
+from flask import Flask, request, jsonify, send_file, Response, stream_with_context
 from dotenv import load_dotenv
 
+from backend.cache import TTLCache
+
 # Load .env từ gốc dự án
 ROOT = Path(__file__).resolve().parents[1]
 ENV = ROOT / ".env"
 load_dotenv(dotenv_path=ENV if ENV.exists() else None, override=False)
 
-# Gemini SDK
-import google.generativeai as genai
+# LLM_BACKEND=fake -> dùng backend giả lập cục bộ (test/offline), mặc định gọi Gemini thật
+LLM_BACKEND = (os.getenv("LLM_BACKEND") or "gemini").strip().lower()
+
+if LLM_BACKEND != "fake":
+    # Gemini SDK
+    import google.generativeai as genai
 
-API_KEY = os.getenv("GOOGLE_API_KEY") or ""
-if not API_KEY:
-    raise RuntimeError("Thiếu GOOGLE_API_KEY trong file .env ở thư mục gốc dự án.")
-genai.configure(api_key=API_KEY)
+    API_KEY = os.getenv("GOOGLE_API_KEY") or ""
+    if not API_KEY:
+        raise RuntimeError("Thiếu GOOGLE_API_KEY trong file .env ở thư mục gốc dự án.")
+    genai.configure(api_key=API_KEY)
+else:
+    genai = None
 
 app = Flask(__name__)
 
@@ -29,70 +38,303 @@ SCHEMA_DESC = {
     "light_joke": "string"
 }
 
-def generate_health_intake(symptoms: str, humor: float = 0.25, language: str = "vi", context_facts: dict | None = None):
-    model = genai.GenerativeModel(
-        model_name="gemini-1.5-pro",
-        system_instruction=(
-            "Bạn là trợ lý sàng lọc triệu chứng (không phải bác sĩ). "
-            "Đặt 8–12 câu hỏi khai thác bệnh sử (tuổi/giới, khởi phát/diễn tiến, vị trí/tính chất, sốt/đau, triệu chứng kèm, "
-            "bệnh nền/thuốc/dị ứng, môi trường sống/làm việc, du lịch/phơi nhiễm, thói quen, mùa/vùng dịch, tiêm chủng, nghề nghiệp). "
-            "Nêu các yếu tố có thể liên quan (phi chẩn đoán), dấu hiệu đỏ và bước tiếp theo an toàn. "
-            "Nếu có dấu hiệu nguy cấp, khuyên đi cấp cứu ngay. Giọng điệu ấm áp, hài hước nhẹ. "
-            "Chỉ trả về JSON đúng schema, không thêm text ngoài JSON."
-        )
+MODEL_NAME = "gemini-1.5-pro"
+SYSTEM_INSTRUCTION = (
+    "Bạn là trợ lý sàng lọc triệu chứng (không phải bác sĩ). "
+    "Đặt 8–12 câu hỏi khai thác bệnh sử (tuổi/giới, khởi phát/diễn tiến, vị trí/tính chất, sốt/đau, triệu chứng kèm, "
+    "bệnh nền/thuốc/dị ứng, môi trường sống/làm việc, du lịch/phơi nhiễm, thói quen, mùa/vùng dịch, tiêm chủng, nghề nghiệp). "
+    "Nêu các yếu tố có thể liên quan (phi chẩn đoán), dấu hiệu đỏ và bước tiếp theo an toàn. "
+    "Nếu có dấu hiệu nguy cấp, khuyên đi cấp cứu ngay. Giọng điệu ấm áp, hài hước nhẹ. "
+    "Chỉ trả về JSON đúng schema, không thêm text ngoài JSON."
+)
+GENERATION_CONFIG = {
+    "temperature": 0.6,
+    "top_p": 0.9,
+    "max_output_tokens": 1200,
+    "response_mime_type": "application/json",
+}
+
+# Phần prompt cố định: dựng 1 lần lúc import thay vì mỗi request
+_PROMPT_BODY = "\n".join([
+    "Sinh JSON theo schema dưới, KHÔNG thêm text ngoài JSON.",
+    "Yêu cầu:",
+    "- 8–12 câu hỏi, mỗi câu có 'why', có thể có 'options'.",
+    "- possible_factors: 4–7 mục, giải thích đơn giản (không chẩn đoán/kê đơn).",
+    "- red_flags: 3–6 dấu hiệu + hành động rõ ràng.",
+    "- next_steps: 4–7 bước an toàn, thực tế.",
+    "- light_joke: 1 câu đùa nhẹ nhàng, lịch sự.",
+    "Schema:",
+    json.dumps(SCHEMA_DESC, ensure_ascii=False, indent=2),
+])
+
+# Cache kết quả triage: key = (triệu chứng chuẩn hóa, ngôn ngữ, mức hài hước làm tròn, bối cảnh)
+HUMOR_BUCKETS = 4  # 0, 0.25, 0.5, 0.75, 1.0
+_TRIAGE_CACHE = TTLCache(
+    maxsize=int(os.getenv("TRIAGE_CACHE_SIZE", "512")),
+    ttl=float(os.getenv("TRIAGE_CACHE_TTL", "3600")),
+)
+
+
+class _FakeResponse:
+    def __init__(self, text: str):
+        self.text = text
+
+
+class FakeGenerativeModel:
+    """
+    LLM giả lập cục bộ (LLM_BACKEND=fake): trả JSON cố định đúng schema,
+    hỗ trợ stream=True bằng cách cắt nhỏ chuỗi JSON. Dùng cho test/offline.
+    """
+
+    chunk_size = 48
+
+    def __init__(self, **_: Any):
+        self.calls = 0
+
+    def _payload(self, prompt: str) -> str:
+        return json.dumps({
+            "disclaimer": "Đây là thông tin tham khảo, không thay thế bác sĩ.",
+            "questions": [
+                {"id": f"q{i}", "text": f"Câu hỏi {i}?", "why": "Khai thác bệnh sử", "options": ["Có", "Không"]}
+                for i in range(1, 9)
+            ],
+            "possible_factors": [{"name": "Nhiễm virus", "explanation": "Thường gặp khi có sốt, ho."}],
+            "red_flags": [{"sign": "Khó thở", "why": "Có thể suy hô hấp", "action": "Đi cấp cứu ngay"}],
+            "next_steps": ["Nghỉ ngơi", "Uống đủ nước", "Theo dõi nhiệt độ", "Đi khám nếu nặng hơn"],
+            "light_joke": "Virus cũng cần nghỉ, nhưng bạn nghỉ trước nhé!",
+        }, ensure_ascii=False)
+
+    def generate_content(self, prompt: str, generation_config: Dict[str, Any] | None = None, stream: bool = False):
+        self.calls += 1
+        text = self._payload(prompt)
+        if not stream:
+            return _FakeResponse(text)
+        return (_FakeResponse(text[i:i + self.chunk_size]) for i in range(0, len(text), self.chunk_size))
+
+
+_model = None
+_model_lock = threading.Lock()
+
+
+def get_model():
+    """Tạo client GenerativeModel 1 lần duy nhất và dùng lại cho mọi request."""
+    global _model
+    if _model is None:
+        with _model_lock:
+            if _model is None:
+                if LLM_BACKEND == "fake":
+                    _model = FakeGenerativeModel()
+                else:
+                    _model = genai.GenerativeModel(model_name=MODEL_NAME, system_instruction=SYSTEM_INSTRUCTION)
+    return _model
+
+
+def _humor_bucket(humor: float) -> float:
+    humor = max(0.0, min(1.0, humor))
+    return round(humor * HUMOR_BUCKETS) / HUMOR_BUCKETS
+
+
+def _cache_key(symptoms: str, humor: float, language: str, context_facts: dict | None) -> Tuple[str, str, float, str]:
+    return (
+        re.sub(r"\s+", " ", symptoms).strip().lower(),
+        language.strip().lower(),
+        _humor_bucket(humor),
+        json.dumps(context_facts or {}, ensure_ascii=False, sort_keys=True),
     )
-    prompt = "\n".join([
+
+
+def _build_prompt(symptoms: str, humor: float, language: str, context_facts: dict | None) -> str:
+    return "\n".join([
         f"Ngôn ngữ: {language}",
-        f"Mức hài hước (0-1): {max(0.0,min(1.0,humor))}",
-        "Sinh JSON theo schema dưới, KHÔNG thêm text ngoài JSON.",
-        "Yêu cầu:",
-        "- 8–12 câu hỏi, mỗi câu có 'why', có thể có 'options'.",
-        "- possible_factors: 4–7 mục, giải thích đơn giản (không chẩn đoán/kê đơn).",
-        "- red_flags: 3–6 dấu hiệu + hành động rõ ràng.",
-        "- next_steps: 4–7 bước an toàn, thực tế.",
-        "- light_joke: 1 câu đùa nhẹ nhàng, lịch sự.",
-        "Schema:",
-        json.dumps(SCHEMA_DESC, ensure_ascii=False, indent=2),
+        f"Mức hài hước (0-1): {humor}",
+        _PROMPT_BODY,
         "Triệu chứng người dùng:",
         symptoms.strip(),
         "Bối cảnh hiện có:",
         json.dumps(context_facts or {}, ensure_ascii=False)
     ])
-    resp = model.generate_content(
-        prompt,
-        generation_config={
-            "temperature": 0.6,
-            "top_p": 0.9,
-            "max_output_tokens": 1200,
-            "response_mime_type": "application/json",
-        }
-    )
+
+
+def generate_health_intake(symptoms: str, humor: float = 0.25, language: str = "vi", context_facts: dict | None = None):
+    key = _cache_key(symptoms, humor, language, context_facts)
+    cached = _TRIAGE_CACHE.get(key)
+    if cached is not None:
+        return cached
+
+    prompt = _build_prompt(symptoms, key[2], language, context_facts)
+    resp = get_model().generate_content(prompt, generation_config=GENERATION_CONFIG)
     text = (resp.text or "").strip()
     try:
-        return json.loads(text)
+        data = json.loads(text)
     except Exception:
         return {"parse_error": True, "raw": text, "message": "Không parse được JSON từ Gemini."}
+    _TRIAGE_CACHE.set(key, data)
+    return data
+
+
+_FENCE = re.compile(r"^```(?:json)?\s*|\s*```$")
+_TRAILING_COMMA = re.compile(r",\s*([}\]])")
+
+
+def _loads_lenient(text: str) -> Any:
+    """json.loads; lỗi thì bỏ rào ```json và dấu phẩy thừa trước } / ] (lỗi hay gặp của LLM) rồi thử lại."""
+    try:
+        return json.loads(text)
+    except ValueError:
+        pass
+    try:
+        return json.loads(_TRAILING_COMMA.sub(r"\1", _FENCE.sub("", text)))
+    except ValueError:
+        return None
+
+
+class JsonSectionParser:
+    """
+    Parse tăng dần 1 object JSON cấp cao nhất đang được stream:
+    mỗi khi 1 cặp key/value cấp 1 hoàn chỉnh thì trả về (key, value).
+    """
+
+    def __init__(self):
+        self.buf = ""
+        self.pos = 0
+        self.depth = 0
+        self.in_string = False
+        self.escape = False
+        self.key: str | None = None
+        self.key_start = -1
+        self.value_start = -1
+
+    def feed(self, chunk: str) -> Iterator[Tuple[str, Any]]:
+        self.buf += chunk
+        while self.pos < len(self.buf):
+            i = self.pos
+            ch = self.buf[i]
+            self.pos += 1
+            if self.in_string:
+                if self.escape:
+                    self.escape = False
+                elif ch == "\\":
+                    self.escape = True
+                elif ch == '"':
+                    self.in_string = False
+                    if self.depth == 1 and self.key is None and self.key_start >= 0:
+                        self.key = json.loads(self.buf[self.key_start:i + 1])
+                continue
+            if ch == '"':
+                self.in_string = True
+                if self.depth == 1 and self.key is None:
+                    self.key_start = i
+            elif ch in "{[":
+                self.depth += 1
+            elif ch == ":" and self.depth == 1 and self.key is not None and self.value_start < 0:
+                self.value_start = i + 1
+            elif (ch == "," and self.depth == 1) or (ch in "}]" and self.depth == 1):
+                if self.key is not None and self.value_start >= 0:
+                    yield self.key, json.loads(self.buf[self.value_start:i])
+                self.key, self.key_start, self.value_start = None, -1, -1
+                if ch != ",":
+                    self.depth -= 1
+            elif ch in "}]":
+                self.depth -= 1
+
+
+def stream_health_intake(symptoms: str, humor: float = 0.25, language: str = "vi",
+                         context_facts: dict | None = None) -> Iterator[Tuple[str, Any]]:
+    """
+    Sinh các sự kiện (event, data) theo thứ tự:
+      ("section", {"name", "value"}) cho mỗi mục JSON ngay khi sinh xong,
+      rồi ("done", {"cached": bool}) hoặc ("error", {...}).
+    Kết quả đầy đủ hợp lệ được ghi vào cùng cache với generate_health_intake.
+    """
+    key = _cache_key(symptoms, humor, language, context_facts)
+    cached = _TRIAGE_CACHE.get(key)
+    if cached is not None:
+        for name, value in cached.items():
+            yield "section", {"name": name, "value": value}
+        yield "done", {"cached": True}
+        return
+
+    prompt = _build_prompt(symptoms, key[2], language, context_facts)
+    parser: JsonSectionParser | None = JsonSectionParser()
+    parts = []
+    sent = set()
+    for chunk in get_model().generate_content(prompt, generation_config=GENERATION_CONFIG, stream=True):
+        text = chunk.text or ""
+        parts.append(text)
+        if parser is None:
+            continue
+        try:
+            for name, value in parser.feed(text):
+                sent.add(name)
+                yield "section", {"name": name, "value": value}
+        except ValueError:
+            # Section hỏng: dừng parse tăng dần nhưng vẫn đọc hết stream để parse toàn bộ ở dưới
+            parser = None
+
+    text = "".join(parts).strip()
+    data = _loads_lenient(text)
+    if not isinstance(data, dict):
+        yield "error", {"parse_error": True, "raw": text, "message": "Không parse được JSON từ Gemini."}
+        return
+    # Các mục chưa gửi được vì parse tăng dần đã dừng
+    for name, value in data.items():
+        if name not in sent:
+            yield "section", {"name": name, "value": value}
+    _TRIAGE_CACHE.set(key, data)
+    yield "done", {"cached": False}
+
+
+def _sse(event: str, data: Any) -> str:
+    return f"event: {event}\ndata: {json.dumps(data, ensure_ascii=False)}\n\n"
 # -----------------------------------------
 
 @app.get("/")
 def index():
     return send_file(ROOT / "index.html")
 
+def _triage_args(body: dict):
+    symptoms = (body.get("symptoms") or "").strip()
+    humor = float(body.get("humor") or 0.25)
+    language = (body.get("language") or "vi").strip() or "vi"
+    context_facts = body.get("context_facts") or {}
+    return symptoms, humor, language, context_facts
+
 @app.post("/api/triage")
 def api_triage():
     body = request.get_json(force=True, silent=True) or {}
-    symptoms = (body.get("symptoms") or "").strip()
+    symptoms, humor, language, context_facts = _triage_args(body)
     if not symptoms:
         return jsonify({"error": True, "message": "Vui lòng nhập mô tả triệu chứng."}), 400
-    humor = float(body.get("humor") or 0.25)
-    language = (body.get("language") or "vi").strip() or "vi"
-    context_facts = body.get("context_facts") or {}
     try:
         data = generate_health_intake(symptoms, humor, language, context_facts)
         return jsonify(data)
     except Exception as e:
         return jsonify({"error": True, "message": str(e)}), 500
 
+@app.post("/api/triage/stream")
+def api_triage_stream():
+    body = request.get_json(force=True, silent=True) or {}
+    symptoms, humor, language, context_facts = _triage_args(body)
+    if not symptoms:
+        return jsonify({"error": True, "message": "Vui lòng nhập mô tả triệu chứng."}), 400
+
+    def events():
+        try:
+            for event, data in stream_health_intake(symptoms, humor, language, context_facts):
+                yield _sse(event, data)
+        except Exception as e:
+            yield _sse("error", {"error": True, "message": str(e)})
+
+    return Response(
+        stream_with_context(events()),
+        mimetype="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"},
+    )
+
+@app.get("/api/triage/cache")
+def api_triage_cache():
+    return jsonify(_TRIAGE_CACHE.stats())
+
 if __name__ == "__main__":
-    # Chạy: py backend\web.py
-    app.run(host="127.0.0.1", port=8000, debug=True)
\ No newline at end of file
+    # Chạy: python -m backend.gemini
+    app.run(host="127.0.0.1", port=8000, debug=True)
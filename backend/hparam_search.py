@@ -0,0 +1,245 @@
+"""
+Tìm siêu tham số song song cho model dự đoán bệnh.
+
+    python -m backend.hparam_search --hidden "128,64;256,128;64" --dropout 0,0.2 --batch-size 8,32 \\
+        --learning-rate 0.001,0.003 --workers 4 --epochs 100
+
+- Dữ liệu mã hóa 1 lần vào shared memory (X uint8 + y int32, đã xáo trộn: [:n_val] = validation),
+  các worker (process "spawn", giới hạn số luồng TF) chỉ map lại và train trên view, không copy/mã hóa lại
+- Mỗi trial: EarlyStopping theo val_loss + loại sớm (median stopping): sau `grace` epoch,
+  val_accuracy tốt nhất thấp hơn median các trial khác tại cùng epoch -> dừng
+- Bảng xếp hạng: val_accuracy, val_loss, số epoch, thời gian train, độ trễ suy luận batch 1 (p50/p95)
+"""
+import argparse
+import itertools
+import json
+import os
+import random
+import sys
+import time
+from concurrent.futures import ProcessPoolExecutor, as_completed
+from multiprocessing import get_context, shared_memory
+from typing import Any, Dict, List, Optional, Tuple
+
+import numpy as np
+
+from backend.mapping_io import MAPPING_PATH, load_mapping
+
+REPORT_PATH = 'backend/models/hparam_search.json'
+
+# Trạng thái trong mỗi process worker (gắn lúc khởi tạo)
+_W: Dict[str, Any] = {}
+
+
+class SharedArray:
+    """Mảng numpy nằm trong SharedMemory; process khác gắn lại bằng spec() (tên, shape, dtype)."""
+
+    def __init__(self, array: Optional[np.ndarray] = None, spec: Optional[Dict[str, Any]] = None):
+        if array is not None:
+            self.shm = shared_memory.SharedMemory(create=True, size=max(1, array.nbytes))
+            self.owner = True
+            shape, dtype = array.shape, array.dtype
+        else:
+            # track=False (3.13+) không có ở 3.11: worker chỉ close(), không unlink
+            self.shm = shared_memory.SharedMemory(name=spec["name"])
+            self.owner = False
+            shape, dtype = tuple(spec["shape"]), np.dtype(spec["dtype"])
+        self.array = np.ndarray(shape, dtype=dtype, buffer=self.shm.buf)
+        if array is not None:
+            self.array[...] = array
+
+    def spec(self) -> Dict[str, Any]:
+        return {"name": self.shm.name, "shape": self.array.shape, "dtype": self.array.dtype.str}
+
+    def close(self) -> None:
+        self.array = None
+        self.shm.close()
+        if self.owner:
+            self.shm.unlink()
+
+
+def search_space(hidden: List[Tuple[int, ...]], dropout: List[float], batch_size: List[int],
+                 learning_rate: List[float]) -> List[Dict[str, Any]]:
+    return [{"hidden": list(h), "dropout": d, "batch_size": b, "learning_rate": lr}
+            for h, d, b, lr in itertools.product(hidden, dropout, batch_size, learning_rate)]
+
+
+def _init_worker(specs: Dict[str, Dict[str, Any]], threads: int) -> None:
+    # Giới hạn luồng trước khi import TensorFlow: N worker x `threads` luồng <= số core
+    for var in ("OMP_NUM_THREADS", "TF_NUM_INTRAOP_THREADS", "TF_NUM_INTEROP_THREADS"):
+        os.environ[var] = str(threads)
+    os.environ.setdefault("TF_CPP_MIN_LOG_LEVEL", "2")
+    import tensorflow as tf
+    tf.config.threading.set_intra_op_parallelism_threads(threads)
+    tf.config.threading.set_inter_op_parallelism_threads(1)
+    _W["shared"] = {k: SharedArray(spec=s) for k, s in specs.items()}
+
+
+def _run_trial(trial_id: int, config: Dict[str, Any], epochs: int, patience: int, grace: int,
+               min_peers: int, seed: int) -> Dict[str, Any]:
+    import tensorflow as tf
+    from backend.train_disease_model_dl import build_model, _latency_ms
+
+    shared = _W["shared"]
+    X, y = shared["X"].array, shared["y"].array
+    n_diseases, n_val = (int(v) for v in shared["meta"].array)
+    curves = shared["curves"].array  # (số trial, epochs) val_accuracy, NaN = chưa có
+    tf.keras.utils.set_random_seed(seed + trial_id)
+
+    # Slice = view trên shared memory; Keras tự ép uint8 -> float32 theo từng batch
+    x_train, y_train = X[n_val:], y[n_val:]
+    x_val, y_val = X[:n_val], y[:n_val]
+    model = build_model(X.shape[1], n_diseases, tuple(config["hidden"]), config["dropout"], config["learning_rate"])
+
+    class MedianStop(tf.keras.callbacks.Callback):
+        """Ghi đường cong vào shared memory; kém hơn median các trial khác tại cùng epoch -> dừng."""
+
+        pruned = False
+
+        def on_epoch_end(self, epoch, logs=None):
+            best = max(float((logs or {}).get("val_accuracy", 0.0)),
+                       float(np.nanmax(curves[trial_id, :epoch])) if epoch else 0.0)
+            curves[trial_id, epoch] = best
+            if epoch + 1 < grace:
+                return
+            peers = np.delete(curves[:, epoch], trial_id)
+            peers = peers[~np.isnan(peers)]
+            if len(peers) >= min_peers and best < float(np.median(peers)):
+                self.pruned = True
+                self.model.stop_training = True
+
+    median_stop = MedianStop()
+    early = tf.keras.callbacks.EarlyStopping(monitor="val_loss", patience=patience, restore_best_weights=True)
+    start = time.perf_counter()
+    hist = model.fit(x_train, y_train, validation_data=(x_val, y_val), epochs=epochs,
+                     batch_size=config["batch_size"], callbacks=[early, median_stop], verbose=0)
+    train_seconds = time.perf_counter() - start
+    val_loss, val_acc = model.evaluate(x_val, y_val, verbose=0, batch_size=1024)
+    epochs_run = len(hist.history["loss"])
+    if median_stop.pruned:
+        status = "pruned"
+    elif epochs_run < epochs:
+        status = "early_stopped"
+    else:
+        status = "completed"
+    return {
+        "trial": trial_id,
+        "config": config,
+        "status": status,
+        "val_accuracy": float(val_acc),
+        "val_loss": float(val_loss),
+        "epochs": epochs_run,
+        "train_seconds": round(train_seconds, 3),
+        "params": int(model.count_params()),
+        "latency": _latency_ms(model, x_val, n=50),
+    }
+
+
+def run_search(configs: List[Dict[str, Any]], mapping_path: str = MAPPING_PATH, workers: Optional[int] = None,
+               threads_per_worker: Optional[int] = None, epochs: int = 100, patience: int = 5,
+               grace: int = 5, min_peers: int = 2, val_split: float = 0.2, seed: int = 0,
+               log=print) -> Dict[str, Any]:
+    from backend.train_disease_model_dl import encode_dataset
+
+    cpus = os.cpu_count() or 1
+    workers = max(1, min(workers or cpus, len(configs)))
+    threads = threads_per_worker or max(1, cpus // workers)
+
+    start = time.perf_counter()
+    mapping = load_mapping(mapping_path)
+    X, y, symptoms, diseases = encode_dataset(mapping, dtype=np.uint8)
+    perm = np.random.RandomState(seed).permutation(len(X))
+    n_val = max(1, int(len(X) * val_split))
+    arrays = {
+        "X": X[perm],
+        "y": y[perm],
+        "meta": np.array([len(diseases), n_val], dtype=np.int64),
+        "curves": np.full((len(configs), epochs), np.nan, dtype=np.float64),
+    }
+    shared = {k: SharedArray(v) for k, v in arrays.items()}
+    del X, arrays
+    log(f"Dữ liệu: {len(perm)} mẫu, {len(symptoms)} triệu chứng, {len(diseases)} bệnh "
+        f"({shared['X'].array.nbytes / 1e6:.1f} MB shared); {len(configs)} trial, {workers} worker x {threads} luồng")
+
+    results: List[Dict[str, Any]] = []
+    try:
+        with ProcessPoolExecutor(max_workers=workers, mp_context=get_context("spawn"), initializer=_init_worker,
+                                 initargs=({k: s.spec() for k, s in shared.items()}, threads)) as pool:
+            futures = {pool.submit(_run_trial, i, c, epochs, patience, grace, min_peers, seed): i
+                       for i, c in enumerate(configs)}
+            for fut in as_completed(futures):
+                try:
+                    res = fut.result()
+                except Exception as e:
+                    res = {"trial": futures[fut], "config": configs[futures[fut]], "status": "failed", "error": str(e)}
+                results.append(res)
+                log(_fmt_row(res))
+    finally:
+        for s in shared.values():
+            s.close()
+
+    leaderboard = sorted(results, key=lambda r: (-r.get("val_accuracy", -1.0),
+                                                 r.get("latency", {}).get("p50_ms", float("inf"))))
+    return {
+        "mapping_path": mapping_path,
+        "samples": len(perm),
+        "validation_samples": n_val,
+        "workers": workers,
+        "threads_per_worker": threads,
+        "seconds": round(time.perf_counter() - start, 3),
+        "leaderboard": leaderboard,
+    }
+
+
+def _fmt_row(r: Dict[str, Any]) -> str:
+    c = r["config"]
+    desc = f"hidden={','.join(map(str, c['hidden']))} drop={c['dropout']} bs={c['batch_size']} lr={c['learning_rate']}"
+    if r["status"] == "failed":
+        return f"#{r['trial']:<3} {desc:<48} failed: {r.get('error')}"
+    return (f"#{r['trial']:<3} {desc:<48} acc={r['val_accuracy']:.4f} loss={r['val_loss']:.4f} "
+            f"epochs={r['epochs']:<3} {r['status']:<13} {r['train_seconds']:7.1f}s p50={r['latency']['p50_ms']:.2f}ms")
+
+
+def _floats(s: str) -> List[float]:
+    return [float(x) for x in s.split(",") if x.strip()]
+
+
+def _ints(s: str) -> List[int]:
+    return [int(x) for x in s.split(",") if x.strip()]
+
+
+def main(argv=None) -> int:
+    parser = argparse.ArgumentParser(prog="python -m backend.hparam_search")
+    parser.add_argument("--mapping", default=MAPPING_PATH, help="File .json/.jsonl hoặc thư mục shard")
+    parser.add_argument("--hidden", default="128,64;256,128;64", help="Các kiến trúc, ngăn cách bởi ';'")
+    parser.add_argument("--dropout", default="0,0.2")
+    parser.add_argument("--batch-size", default="8,32")
+    parser.add_argument("--learning-rate", default="0.001,0.003")
+    parser.add_argument("--trials", type=int, default=0, help="Lấy ngẫu nhiên N cấu hình (0 = cả lưới)")
+    parser.add_argument("--epochs", type=int, default=100)
+    parser.add_argument("--patience", type=int, default=5, help="EarlyStopping theo val_loss")
+    parser.add_argument("--grace", type=int, default=5, help="Số epoch trước khi xét loại sớm theo median")
+    parser.add_argument("--workers", type=int, default=0, help="Số process (0 = số core)")
+    parser.add_argument("--threads", type=int, default=0, help="Luồng TF mỗi process (0 = core/worker)")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--out", default=REPORT_PATH)
+    args = parser.parse_args(argv)
+
+    configs = search_space([tuple(_ints(h)) for h in args.hidden.split(";") if h.strip()],
+                           _floats(args.dropout), _ints(args.batch_size), _floats(args.learning_rate))
+    if args.trials and args.trials < len(configs):
+        configs = random.Random(args.seed).sample(configs, args.trials)
+    report = run_search(configs, args.mapping, workers=args.workers or None, threads_per_worker=args.threads or None,
+                        epochs=args.epochs, patience=args.patience, grace=args.grace, seed=args.seed)
+    os.makedirs(os.path.dirname(os.path.abspath(args.out)), exist_ok=True)
+    with open(args.out, "w", encoding="utf-8") as f:
+        json.dump(report, f, ensure_ascii=False, indent=2)
+    print("\nBảng xếp hạng:")
+    for r in report["leaderboard"]:
+        print(_fmt_row(r))
+    print(f"Đã lưu: {args.out} ({report['seconds']}s)")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,176 @@
+# File: backend/http_cache.py
+
+import gzip
+import hashlib
+import json
+import os
+import threading
+import time
+from typing import Any, Callable, Dict, Hashable, List, Optional, Tuple
+
+from backend.cache import SingleFlight
+
+try:
+    import brotli  # tùy chọn: nén br tốt hơn gzip ~15-20% cho JSON
+except ImportError:
+    brotli = None
+
+# Body nhỏ hơn ngưỡng này không nén (header + CPU tốn hơn phần tiết kiệm)
+MIN_COMPRESS_BYTES = 1024
+GZIP_LEVEL = 6
+BROTLI_QUALITY = 9
+
+# Client luôn phải hỏi lại (If-None-Match) nhưng 304 gần như không tốn gì
+CACHE_CONTROL = os.getenv("HTTP_CACHE_CONTROL", "no-cache")
+
+
+def file_stamp(*paths: str) -> Tuple:
+    """Phiên bản dữ liệu = (size, mtime_ns) của từng file; file đổi -> cache response tự hết hiệu lực."""
+    out = []
+    for p in paths:
+        try:
+            st = os.stat(p)
+            out.append((st.st_size, st.st_mtime_ns))
+        except OSError:
+            out.append(None)
+    return tuple(out)
+
+
+def ttl_stamp(ttl: float) -> int:
+    """Phiên bản theo khung thời gian (nguồn ngoài không có mtime, vd. WHO API)."""
+    return int(time.time() // max(1.0, ttl))
+
+
+class CachedPayload:
+    """
+    1 response đã serialize sẵn: body JSON (utf-8) + các bản nén, mỗi bản 1 ETag mạnh riêng
+    (khác content-coding thì khác representation, theo RFC 9110).
+    """
+
+    __slots__ = ("body", "encoded", "etags", "_lock")
+
+    def __init__(self, body: bytes):
+        self.body = body
+        digest = hashlib.sha256(body).hexdigest()[:32]
+        self.encoded: Dict[str, bytes] = {"identity": body}
+        self.etags: Dict[str, str] = {"identity": f'"{digest}"'}
+        self._lock = threading.Lock()
+        if len(body) >= MIN_COMPRESS_BYTES:
+            self.encoded["gzip"] = gzip.compress(body, compresslevel=GZIP_LEVEL, mtime=0)
+            self.etags["gzip"] = f'"{digest}-gz"'
+            if brotli is not None:
+                self.etags["br"] = f'"{digest}-br"'
+
+    def get(self, encoding: str) -> bytes:
+        data = self.encoded.get(encoding)
+        if data is None:
+            # br chỉ nén khi có client yêu cầu lần đầu (quality cao khá tốn CPU)
+            with self._lock:
+                data = self.encoded.get(encoding)
+                if data is None:
+                    data = self.encoded[encoding] = brotli.compress(self.body, quality=BROTLI_QUALITY)
+        return data
+
+
+def _parse_accept_encoding(header: Optional[str]) -> Dict[str, float]:
+    prefs: Dict[str, float] = {}
+    for part in (header or "").split(","):
+        token, _, params = part.strip().partition(";")
+        token = token.strip().lower()
+        if not token:
+            continue
+        q = 1.0
+        for p in params.split(";"):
+            k, _, v = p.strip().partition("=")
+            if k.strip() == "q":
+                try:
+                    q = float(v)
+                except ValueError:
+                    q = 0.0
+        prefs[token] = q
+    return prefs
+
+
+def negotiate_encoding(accept_encoding: Optional[str], available: List[str]) -> str:
+    """Chọn content-coding: ưu tiên br > gzip theo q của client; không khớp -> identity."""
+    prefs = _parse_accept_encoding(accept_encoding)
+    star = prefs.get("*", 0.0)
+    best, best_q = "identity", 0.0
+    for enc in ("br", "gzip"):
+        if enc not in available:
+            continue
+        q = prefs.get(enc, star)
+        if q > best_q:
+            best, best_q = enc, q
+    return best
+
+
+def etag_matches(if_none_match: Optional[str], etags: List[str]) -> bool:
+    """If-None-Match dùng so sánh yếu: bỏ tiền tố W/ rồi so với mọi ETag của payload."""
+    if not if_none_match:
+        return False
+    if if_none_match.strip() == "*":
+        return True
+    wanted = {t.strip()[2:] if t.strip().startswith("W/") else t.strip() for t in if_none_match.split(",")}
+    return any(e in wanted for e in etags)
+
+
+class ResponseCache:
+    """
+    Cache response đã serialize theo key, kèm version (vd. file_stamp của file nguồn).
+    Version đổi -> build lại 1 lần (các request đồng thời chờ chung qua SingleFlight).
+    """
+
+    def __init__(self):
+        self._items: Dict[Hashable, Tuple[Hashable, CachedPayload]] = {}
+        self._flight = SingleFlight()
+        self.hits = 0
+        self.builds = 0
+        self.not_modified = 0
+
+    def get(self, key: Hashable, version: Hashable, build: Callable[[], Any],
+            cacheable: Optional[Callable[[Any], bool]] = None) -> CachedPayload:
+        """cacheable(kết quả build) False -> vẫn trả payload nhưng không lưu (vd. nguồn ngoài lỗi/bị bỏ qua)."""
+        item = self._items.get(key)
+        if item is not None and item[0] == version:
+            self.hits += 1
+            return item[1]
+
+        def compute() -> CachedPayload:
+            value = build()
+            payload = CachedPayload(json.dumps(value, ensure_ascii=False, separators=(",", ":")).encode("utf-8"))
+            self.builds += 1
+            if cacheable is None or cacheable(value):
+                self._items[key] = (version, payload)
+            return payload
+        return self._flight.do((key, version), compute)
+
+    def respond(self, payload: CachedPayload, accept_encoding: Optional[str],
+                if_none_match: Optional[str]) -> Tuple[int, Dict[str, str], bytes]:
+        """-> (status, headers, body) độc lập framework: 304 nếu ETag khớp, ngược lại body đã nén sẵn."""
+        available = list(payload.etags)
+        encoding = negotiate_encoding(accept_encoding, available)
+        headers = {
+            "ETag": payload.etags[encoding],
+            "Vary": "Accept-Encoding",
+            "Cache-Control": CACHE_CONTROL,
+        }
+        if etag_matches(if_none_match, list(payload.etags.values())):
+            self.not_modified += 1
+            return 304, headers, b""
+        if encoding != "identity":
+            headers["Content-Encoding"] = encoding
+        return 200, headers, payload.get(encoding)
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "entries": len(self._items),
+            "hits": self.hits,
+            "builds": self.builds,
+            "not_modified": self.not_modified,
+            "brotli": brotli is not None,
+            "bytes": {str(k): {enc: len(b) for enc, b in p.encoded.items()} for k, (_, p) in self._items.items()},
+        }
+
+
+RESPONSE_CACHE = ResponseCache()
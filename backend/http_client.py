@@ -0,0 +1,295 @@
+"""
+Client HTTP dùng chung cho mọi lời gọi ra ngoài (WHO, EndlessMedical, MyHealthfinder, NIH, API mức độ).
+
+- Mỗi host 1 pool kết nối keep-alive (httpx; HTTP/2 nếu cài gói h2), có bản sync và async
+- Timeout thống nhất: HTTP_CONNECT_TIMEOUT + timeout đọc (HTTP_READ_TIMEOUT hoặc tham số timeout=)
+- Thử lại với full jitter: lỗi kết nối luôn thử lại; timeout đọc / 429, 502, 503, 504 chỉ thử lại
+  với method idempotent, hoặc khi gọi với retry_unsafe=True. Retry-After (giây) được tôn trọng
+- Metric theo host: số request theo kết quả, histogram độ trễ, số lần thử lại theo lý do
+- Request có deadline (backend.deadline): timeout mỗi lần gửi <= thời gian còn lại, không chờ thử lại quá hạn
+Không có httpx -> requests.Session theo host (không HTTP/2; bản async chạy bản sync trong thread).
+"""
+import asyncio
+import os
+import random
+import threading
+import time
+import weakref
+from typing import Any, Dict, Optional
+from urllib.parse import urlsplit
+
+from backend import deadline
+from backend.metrics import REGISTRY
+
+try:
+    import httpx
+except ImportError:
+    httpx = None
+
+try:
+    import requests
+    from requests.adapters import HTTPAdapter
+except ImportError:
+    requests = None
+
+try:
+    import h2  # noqa: F401  (httpx chỉ bật HTTP/2 khi có gói này)
+    _HAS_H2 = True
+except ImportError:
+    _HAS_H2 = False
+
+HTTP_CONNECT_TIMEOUT = float(os.getenv("HTTP_CONNECT_TIMEOUT", "3"))
+HTTP_READ_TIMEOUT = float(os.getenv("HTTP_READ_TIMEOUT", "10"))
+HTTP_RETRIES = int(os.getenv("HTTP_RETRIES", "2"))
+# Chờ trước lần thử thứ n: ngẫu nhiên trong [0, min(MAX, BASE * 2^n)]
+HTTP_BACKOFF_BASE = float(os.getenv("HTTP_BACKOFF_BASE", "0.2"))
+HTTP_BACKOFF_MAX = float(os.getenv("HTTP_BACKOFF_MAX", "2"))
+# Retry-After lớn hơn ngưỡng này -> không chờ, trả luôn response cho caller
+HTTP_RETRY_AFTER_MAX = float(os.getenv("HTTP_RETRY_AFTER_MAX", "5"))
+HTTP_POOL_SIZE = int(os.getenv("HTTP_POOL_SIZE", "10"))
+HTTP_KEEPALIVE_EXPIRY = float(os.getenv("HTTP_KEEPALIVE_EXPIRY", "30"))
+HTTP2 = os.getenv("HTTP_HTTP2", "1") == "1" and _HAS_H2 and httpx is not None
+
+RETRY_STATUS = frozenset({429, 502, 503, 504})
+IDEMPOTENT = frozenset({"GET", "HEAD", "OPTIONS", "PUT", "DELETE"})
+
+HTTP_REQUESTS = REGISTRY.counter(
+    "jaremis_http_client_requests_total", "Request HTTP ra ngoài theo host, method, mã trạng thái hoặc lỗi",
+    ("host", "method", "outcome"))
+HTTP_SECONDS = REGISTRY.histogram(
+    "jaremis_http_client_duration_seconds", "Độ trễ từng lần gửi request HTTP ra ngoài (giây)", ("host",))
+HTTP_RETRIES_TOTAL = REGISTRY.counter(
+    "jaremis_http_client_retries_total", "Số lần thử lại request HTTP ra ngoài theo lý do", ("host", "reason"))
+
+_clients: Dict[str, Any] = {}
+_async_clients: "weakref.WeakKeyDictionary[asyncio.AbstractEventLoop, Dict[str, Any]]" = weakref.WeakKeyDictionary()
+_clients_lock = threading.Lock()
+
+
+def _origin(url: str) -> str:
+    parts = urlsplit(url)
+    return f"{parts.scheme}://{parts.netloc}"
+
+
+def _call_end(timeout: Optional[float]) -> Optional[float]:
+    """Request có deadline: mọi lần thử của 1 lời gọi gói trong `timeout` (giữ phần chừa lại của caller)."""
+    if deadline.current() is None:
+        return None
+    return time.monotonic() + (HTTP_READ_TIMEOUT if timeout is None else float(timeout))
+
+
+def _left(call_end: Optional[float]) -> Optional[float]:
+    left = deadline.remaining()
+    if call_end is not None:
+        left = min(left, call_end - time.monotonic())
+    return left
+
+
+def _timeout(timeout: Optional[float], call_end: Optional[float] = None):
+    # Hết deadline của request -> DeadlineExceeded trước khi gửi
+    read = deadline.timeout_for(HTTP_READ_TIMEOUT if timeout is None else float(timeout))
+    if call_end is not None:
+        read = max(0.0, min(read, call_end - time.monotonic()))
+    connect = min(HTTP_CONNECT_TIMEOUT, read)
+    if httpx is not None:
+        # pool: chờ kết nối rảnh khi pool của host đã dùng hết
+        return httpx.Timeout(read, connect=connect, pool=read)
+    return (connect, read)
+
+
+def _limits():
+    return httpx.Limits(max_connections=HTTP_POOL_SIZE, max_keepalive_connections=HTTP_POOL_SIZE,
+                        keepalive_expiry=HTTP_KEEPALIVE_EXPIRY)
+
+
+def _new_client():
+    if httpx is not None:
+        return httpx.Client(http2=HTTP2, limits=_limits(), follow_redirects=True)
+    if requests is None:
+        raise RuntimeError("Cần httpx hoặc requests để gọi HTTP")
+    session = requests.Session()
+    adapter = HTTPAdapter(pool_connections=1, pool_maxsize=HTTP_POOL_SIZE, max_retries=0)
+    session.mount("http://", adapter)
+    session.mount("https://", adapter)
+    return session
+
+
+def _client(origin: str):
+    client = _clients.get(origin)
+    if client is None:
+        with _clients_lock:
+            client = _clients.get(origin)
+            if client is None:
+                client = _clients[origin] = _new_client()
+    return client
+
+
+def _async_client(origin: str):
+    # Kết nối của AsyncClient gắn với event loop tạo ra nó: mỗi loop 1 bộ client
+    loop = asyncio.get_running_loop()
+    with _clients_lock:
+        per_loop = _async_clients.setdefault(loop, {})
+        client = per_loop.get(origin)
+        if client is None:
+            client = per_loop[origin] = httpx.AsyncClient(http2=HTTP2, limits=_limits(), follow_redirects=True)
+    return client
+
+
+def _error_reason(exc: BaseException) -> str:
+    if httpx is not None:
+        if isinstance(exc, (httpx.ConnectError, httpx.ConnectTimeout)):
+            return "connect"
+        if isinstance(exc, httpx.TimeoutException):
+            return "timeout"
+        if isinstance(exc, httpx.TransportError):
+            return "transport"
+    if requests is not None:
+        if isinstance(exc, requests.exceptions.ConnectTimeout) or (
+                isinstance(exc, requests.exceptions.ConnectionError)
+                and not isinstance(exc, requests.exceptions.ReadTimeout)):
+            return "connect"
+        if isinstance(exc, requests.exceptions.Timeout):
+            return "timeout"
+    return "error"
+
+
+def _retry_delay(attempt: int, method: str, retry_unsafe: bool, reason: str, response=None,
+                 call_end: Optional[float] = None) -> Optional[float]:
+    """Số giây chờ trước lần thử tiếp theo, None = không thử lại."""
+    # Lỗi kết nối: request chưa tới server, an toàn cho cả POST
+    if reason != "connect" and method not in IDEMPOTENT and not retry_unsafe:
+        return None
+    wait = random.uniform(0.0, min(HTTP_BACKOFF_MAX, HTTP_BACKOFF_BASE * (2 ** attempt)))
+    if response is not None:
+        retry_after = response.headers.get("retry-after", "")
+        if retry_after.strip().isdigit():
+            wait = float(retry_after)
+            if wait > HTTP_RETRY_AFTER_MAX:
+                return None
+    # Chờ xong không còn thời gian gửi lại -> trả kết quả/lỗi hiện tại luôn
+    left = _left(call_end)
+    if left is not None and wait >= left:
+        return None
+    return wait
+
+
+def _observe(host: str, method: str, outcome: str, start: float) -> None:
+    HTTP_REQUESTS.inc(host, method, outcome)
+    HTTP_SECONDS.observe(time.perf_counter() - start, host)
+
+
+def request(method: str, url: str, *, timeout: Optional[float] = None, retries: Optional[int] = None,
+            retry_unsafe: bool = False, **kwargs):
+    """
+    Như requests.request / httpx.request (params=, json=, data=, headers=) qua pool của host.
+    Response có status_code, headers, json(), text, raise_for_status(). Hết lượt thử lại:
+    trả response lỗi cuối cùng, hoặc ném exception của lần gửi cuối.
+    """
+    method = method.upper()
+    origin = _origin(url)
+    host = urlsplit(url).netloc
+    retries = HTTP_RETRIES if retries is None else retries
+    client = _client(origin)
+    call_end = _call_end(timeout)
+    for attempt in range(retries + 1):
+        limit = _timeout(timeout, call_end)
+        start = time.perf_counter()
+        try:
+            resp = client.request(method, url, timeout=limit, **kwargs)
+        except Exception as e:
+            reason = _error_reason(e)
+            _observe(host, method, reason, start)
+            delay = _retry_delay(attempt, method, retry_unsafe, reason, call_end=call_end) if attempt < retries else None
+            if delay is None:
+                raise
+            HTTP_RETRIES_TOTAL.inc(host, reason)
+            time.sleep(delay)
+            continue
+        _observe(host, method, str(resp.status_code), start)
+        if resp.status_code in RETRY_STATUS and attempt < retries:
+            delay = _retry_delay(attempt, method, retry_unsafe, str(resp.status_code), resp, call_end)
+            if delay is not None:
+                HTTP_RETRIES_TOTAL.inc(host, str(resp.status_code))
+                resp.close()
+                time.sleep(delay)
+                continue
+        return resp
+
+
+def get(url: str, **kwargs):
+    return request("GET", url, **kwargs)
+
+
+def post(url: str, **kwargs):
+    return request("POST", url, **kwargs)
+
+
+async def arequest(method: str, url: str, *, timeout: Optional[float] = None, retries: Optional[int] = None,
+                   retry_unsafe: bool = False, **kwargs):
+    """Bản async của request() (httpx.AsyncClient); hủy task -> hủy luôn request đang gửi."""
+    if httpx is None:
+        return await asyncio.to_thread(request, method, url, timeout=timeout, retries=retries,
+                                       retry_unsafe=retry_unsafe, **kwargs)
+    method = method.upper()
+    host = urlsplit(url).netloc
+    retries = HTTP_RETRIES if retries is None else retries
+    client = _async_client(_origin(url))
+    call_end = _call_end(timeout)
+    for attempt in range(retries + 1):
+        limit = _timeout(timeout, call_end)
+        start = time.perf_counter()
+        try:
+            resp = await client.request(method, url, timeout=limit, **kwargs)
+        except Exception as e:
+            reason = _error_reason(e)
+            _observe(host, method, reason, start)
+            delay = _retry_delay(attempt, method, retry_unsafe, reason, call_end=call_end) if attempt < retries else None
+            if delay is None:
+                raise
+            HTTP_RETRIES_TOTAL.inc(host, reason)
+            await asyncio.sleep(delay)
+            continue
+        _observe(host, method, str(resp.status_code), start)
+        if resp.status_code in RETRY_STATUS and attempt < retries:
+            delay = _retry_delay(attempt, method, retry_unsafe, str(resp.status_code), resp, call_end)
+            if delay is not None:
+                HTTP_RETRIES_TOTAL.inc(host, str(resp.status_code))
+                await resp.aclose()
+                await asyncio.sleep(delay)
+                continue
+        return resp
+
+
+async def aget(url: str, **kwargs):
+    return await arequest("GET", url, **kwargs)
+
+
+async def apost(url: str, **kwargs):
+    return await arequest("POST", url, **kwargs)
+
+
+def pool_stats() -> Dict[str, Any]:
+    with _clients_lock:
+        return {
+            "backend": "httpx" if httpx is not None else "requests",
+            "http2": HTTP2,
+            "hosts": sorted(_clients),
+            "async_hosts": sorted({o for per_loop in _async_clients.values() for o in per_loop}),
+        }
+
+
+def close() -> None:
+    """Đóng mọi pool sync (vd. lúc tắt app hoặc giữa các test với stub server)."""
+    with _clients_lock:
+        clients = list(_clients.values())
+        _clients.clear()
+    for client in clients:
+        client.close()
+
+
+async def aclose() -> None:
+    """Đóng các pool async của event loop hiện tại."""
+    with _clients_lock:
+        per_loop = _async_clients.pop(asyncio.get_running_loop(), {})
+    for client in per_loop.values():
+        await client.aclose()
@@ -0,0 +1,277 @@
+# File: backend/icd10_index.py
+
+import heapq
+import os
+import re
+import threading
+import unicodedata
+from bisect import bisect_left
+from typing import Any, Dict, Iterable, Iterator, List, Optional, Tuple
+
+from backend import http_client
+from backend.cache import TTLCache
+
+# File mã ICD-10-CM định dạng CMS (icd10cm_codes_<năm>.txt): "<mã không dấu chấm> <tên>" mỗi dòng.
+# Repo chỉ kèm ~140 mã thường gặp; thay bằng file đầy đủ của CMS để có toàn bộ ~74k mã
+# và không cần gọi NIH khi tra cục bộ không ra.
+ICD10_CODES_PATH = os.getenv("ICD10_CODES_PATH", os.path.join(os.path.dirname(__file__), "data", "icd10cm_codes.txt"))
+
+# NIH Clinical Tables (toàn bộ ICD-10-CM): dự phòng khi chỉ mục cục bộ không có kết quả
+CLINICAL_TABLES_API = os.getenv("ICD10_REMOTE_API", "https://clinicaltables.nlm.nih.gov/api/icd10cm/v3/search")
+REMOTE_TIMEOUT = float(os.getenv("ICD10_REMOTE_TIMEOUT", "5"))
+# Bật (mặc định): cục bộ không ra -> hỏi NIH (kết quả cache trong bộ nhớ ICD10_REMOTE_CACHE_TTL giây)
+REMOTE_FALLBACK = os.getenv("ICD10_REMOTE_FALLBACK", "1") == "1"
+# Bật: kết quả NIH còn được ghi bổ sung vào file mã cục bộ
+REMOTE_REFRESH = os.getenv("ICD10_REMOTE_REFRESH", "0") == "1"
+_REMOTE_CACHE = TTLCache(maxsize=int(os.getenv("ICD10_REMOTE_CACHE_SIZE", "2048")),
+                         ttl=float(os.getenv("ICD10_REMOTE_CACHE_TTL", "86400")))
+
+_CODE_TOKEN = re.compile(r"^[a-z]\d[0-9a-z]{0,5}$")
+_TOKEN_SPLIT = re.compile(r"[^0-9a-z]+")
+
+
+def normalize_code(code: str) -> str:
+    """'j45.909' -> 'J45909' (dạng lưu trong file CMS)."""
+    return str(code).replace(".", "").strip().upper()
+
+
+def format_code(code: str) -> str:
+    """'J45909' -> 'J45.909' (dạng hiển thị)."""
+    return code if len(code) <= 3 else f"{code[:3]}.{code[3:]}"
+
+
+def _tokens(text: str) -> List[str]:
+    text = unicodedata.normalize("NFKD", str(text).lower())
+    text = "".join(ch for ch in text if not unicodedata.combining(ch))
+    return [t for t in _TOKEN_SPLIT.split(text) if t]
+
+
+class ICD10Index:
+    """
+    Chỉ mục ICD-10-CM trong bộ nhớ:
+    - Mã: mảng mã đã sắp xếp, tìm theo tiền tố bằng bisect (trie ngầm định, gọn hơn trie từng ký tự).
+    - Tên: chỉ mục ngược token -> id mã; mảng token đã sắp xếp để autocomplete token cuối theo tiền tố.
+    id được đánh theo thứ hạng (tên ngắn/cụ thể trước, rồi theo mã) nên posting list đã sắp sẵn
+    thứ hạng: lấy top-N chỉ cần duyệt đầu danh sách, không phải sort toàn bộ kết quả.
+    """
+
+    def __init__(self, entries: Iterable[Tuple[str, str]]):
+        merged: Dict[str, str] = {}
+        for code, name in entries:
+            code = normalize_code(code)
+            if code:
+                merged[code] = str(name).strip()
+        tokenized = {c: _tokens(n) for c, n in merged.items()}
+        ranked = sorted(merged, key=lambda c: (len(tokenized[c]), c))
+        self.codes: List[str] = ranked
+        self.names: List[str] = [merged[c] for c in ranked]
+        self._doc_tokens: List[Tuple[str, ...]] = [tuple(dict.fromkeys(tokenized[c])) for c in ranked]
+
+        by_code = sorted(range(len(ranked)), key=lambda i: ranked[i])
+        self._code_keys: List[str] = [ranked[i] for i in by_code]
+        self._code_ids: List[int] = by_code
+
+        postings: Dict[str, List[int]] = {}
+        for i, code in enumerate(ranked):
+            for t in self._doc_tokens[i]:
+                postings.setdefault(t, []).append(i)
+        self.vocab: List[str] = sorted(postings)
+        self.postings: Dict[str, List[int]] = postings
+
+    def __len__(self) -> int:
+        return len(self.codes)
+
+    def _item(self, i: int) -> Dict[str, str]:
+        return {"code": format_code(self.codes[i]), "name": self.names[i]}
+
+    def lookup(self, code: str) -> Optional[Dict[str, str]]:
+        code = normalize_code(code)
+        j = bisect_left(self._code_keys, code)
+        if j < len(self._code_keys) and self._code_keys[j] == code:
+            return self._item(self._code_ids[j])
+        return None
+
+    def _code_range(self, prefix: str) -> List[int]:
+        lo = bisect_left(self._code_keys, prefix)
+        hi = bisect_left(self._code_keys, prefix + "\uffff")
+        return self._code_ids[lo:hi]
+
+    def _prefix_stream(self, token: str) -> Iterator[int]:
+        """Các id có token bắt đầu bằng `token`, theo thứ hạng tăng dần, không trùng."""
+        lo = bisect_left(self.vocab, token)
+        hi = bisect_left(self.vocab, token + "\uffff")
+        lists = [self.postings[t] for t in self.vocab[lo:hi]]
+        if len(lists) == 1:
+            yield from lists[0]
+            return
+        last = -1
+        for i in heapq.merge(*lists):
+            if i != last:
+                last = i
+                yield i
+
+    @staticmethod
+    def _contains(sorted_ids: List[int], i: int) -> bool:
+        j = bisect_left(sorted_ids, i)
+        return j < len(sorted_ids) and sorted_ids[j] == i
+
+    def search(self, query: str, limit: int = 10) -> List[Dict[str, str]]:
+        """
+        Tìm theo mã và/hoặc tên: token dạng mã ("j45", "R05.9") lọc theo tiền tố mã,
+        token chữ phải khớp tên (token cuối khớp tiền tố -> autocomplete).
+        Xếp hạng: tên ngắn (cụ thể hơn) trước, sau đó theo mã.
+        """
+        raw = [t for t in re.split(r"\s+", str(query).strip()) if t]
+        is_code = [bool(_CODE_TOKEN.match(t.replace(".", "").lower())) for t in raw]
+        code_prefixes = tuple(normalize_code(t) for t, c in zip(raw, is_code) if c)
+        words = _tokens(" ".join(t for t, c in zip(raw, is_code) if not c))
+        if not words:
+            if not code_prefixes:
+                return []
+            # Chỉ tìm theo mã: trả theo thứ tự mã
+            ids: List[int] = []
+            for p in code_prefixes:
+                ids.extend(self._code_range(p))
+            return [self._item(i) for i in sorted(set(ids), key=lambda i: self.codes[i])[:limit]]
+
+        exact, last = words[:-1], words[-1]
+        exact_lists = []
+        for w in exact:
+            plist = self.postings.get(w)
+            if not plist:
+                return []
+            exact_lists.append(plist)
+        exact_lists.sort(key=len)
+
+        # Luồng dẫn: posting ngắn nhất (nếu có từ đầy đủ) hoặc luồng tiền tố của token cuối
+        if exact_lists:
+            driver: Iterable[int] = exact_lists[0]
+            others = exact_lists[1:]
+            check_prefix = True
+        else:
+            driver, others, check_prefix = self._prefix_stream(last), [], False
+
+        out: List[Dict[str, str]] = []
+        for i in driver:
+            if code_prefixes and not self.codes[i].startswith(code_prefixes):
+                continue
+            if any(not self._contains(plist, i) for plist in others):
+                continue
+            if check_prefix and not any(t.startswith(last) for t in self._doc_tokens[i]):
+                continue
+            out.append(self._item(i))
+            if len(out) >= limit:
+                break
+        return out
+
+    def autocomplete(self, prefix: str, limit: int = 10) -> List[Dict[str, str]]:
+        return self.search(prefix, limit=limit)
+
+
+def load_codes(path: str = ICD10_CODES_PATH) -> List[Tuple[str, str]]:
+    entries: List[Tuple[str, str]] = []
+    with open(path, encoding="utf-8") as f:
+        for line in f:
+            parts = line.strip().split(None, 1)
+            if len(parts) == 2:
+                entries.append((parts[0], parts[1]))
+    return entries
+
+
+def save_codes(entries: Iterable[Tuple[str, str]], path: str = ICD10_CODES_PATH) -> None:
+    merged = {normalize_code(c): n for c, n in entries}
+    tmp = path + ".tmp"
+    with open(tmp, "w", encoding="utf-8") as f:
+        for code in sorted(merged):
+            f.write(f"{code:<7} {merged[code]}\n")
+    os.replace(tmp, path)
+
+
+_index: Optional[ICD10Index] = None
+_index_stamp: Optional[Tuple[int, int]] = None
+_index_lock = threading.Lock()
+
+
+def get_index(path: str = ICD10_CODES_PATH) -> ICD10Index:
+    """Index dùng chung, tự build lại khi file mã thay đổi."""
+    global _index, _index_stamp
+    try:
+        st = os.stat(path)
+        stamp = (st.st_size, st.st_mtime_ns)
+    except OSError:
+        stamp = None
+    if _index is None or stamp != _index_stamp:
+        with _index_lock:
+            if _index is None or stamp != _index_stamp:
+                _index = ICD10Index(load_codes(path) if stamp else [])
+                _index_stamp = stamp
+    return _index
+
+
+def fetch_remote(term: str, max_list: int = 50) -> List[Tuple[str, str]]:
+    """Tra NIH Clinical Tables (pool keep-alive dùng chung, timeout/thử lại qua backend.http_client)."""
+    r = http_client.get(CLINICAL_TABLES_API, params={"terms": term, "sf": "code,name", "df": "code,name",
+                                                     "maxList": max_list}, timeout=REMOTE_TIMEOUT)
+    r.raise_for_status()
+    data = r.json()
+    # data: [tổng số, [mã], null, [[mã, tên], ...]]
+    rows = data[3] if isinstance(data, list) and len(data) > 3 and isinstance(data[3], list) else []
+    return [(row[0], row[1]) for row in rows if isinstance(row, list) and len(row) >= 2]
+
+
+def _merge_codes(rows: Iterable[Tuple[str, str]], path: str = ICD10_CODES_PATH) -> int:
+    """Ghi bổ sung các mã chưa có vào file cục bộ. Trả về số mã mới."""
+    entries = load_codes(path) if os.path.exists(path) else []
+    known = {normalize_code(c) for c, _ in entries}
+    added = 0
+    for code, name in rows:
+        if normalize_code(code) not in known:
+            known.add(normalize_code(code))
+            entries.append((code, name))
+            added += 1
+    if added:
+        save_codes(entries, path)
+    return added
+
+
+def refresh_from_remote(terms: Iterable[str], path: str = ICD10_CODES_PATH) -> int:
+    """Bổ sung mã từ NIH cho các từ khóa vào file cục bộ. Trả về số mã mới."""
+    return _merge_codes([row for term in terms for row in fetch_remote(term)], path)
+
+
+def _remote_search(term: str) -> List[Tuple[str, str]]:
+    """fetch_remote có cache (kể cả kết quả rỗng); lỗi mạng không được cache."""
+    key = " ".join(term.lower().split())
+    rows = _REMOTE_CACHE.get(key)
+    if rows is None:
+        rows = fetch_remote(key)
+        _REMOTE_CACHE.set(key, rows)
+    return rows
+
+
+def search_icd10(term: str, limit: int = 10) -> Dict[str, Any]:
+    """
+    Tra ICD-10 cục bộ, trả về {"term", "total", "items": [{"code", "name"}], "source": "local"|"nih"}.
+    Không có kết quả cục bộ và bật ICD10_REMOTE_FALLBACK -> hỏi NIH (lỗi mạng được ném ra cho caller,
+    không trả rỗng như thể không có mã nào); bật thêm ICD10_REMOTE_REFRESH -> ghi mã mới vào file.
+    """
+    items = get_index(ICD10_CODES_PATH).search(term, limit=limit)
+    source = "local"
+    if not items and (REMOTE_FALLBACK or REMOTE_REFRESH) and str(term).strip():
+        rows = _remote_search(term)
+        if REMOTE_REFRESH and rows:
+            _merge_codes(rows, ICD10_CODES_PATH)
+        items = [{"code": format_code(normalize_code(c)), "name": str(n).strip()} for c, n in rows[:limit]]
+        source = "nih"
+    return {"term": term, "total": len(items), "items": items, "source": source}
+
+
+if __name__ == "__main__":
+    # Làm mới file mã từ NIH: python -m backend.icd10_index fever cough asthma
+    import sys
+    if len(sys.argv) > 1:
+        print(f"Đã thêm {refresh_from_remote(sys.argv[1:])} mã mới vào {ICD10_CODES_PATH}")
+    else:
+        q = input("Nhập mã hoặc tên bệnh (tiếng Anh): ")
+        for it in search_icd10(q)["items"]:
+            print(f"{it['code']:<9} {it['name']}")
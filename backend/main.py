@@ -4,26 +4,88 @@ import json
 import uuid
 from typing import List, Dict, Optional
 
-from fastapi import FastAPI, File, UploadFile, HTTPException
-from fastapi.responses import FileResponse
+from fastapi import FastAPI, File, UploadFile, HTTPException, Request, Header, WebSocket
+from fastapi.responses import FileResponse, JSONResponse, PlainTextResponse, Response, StreamingResponse
+from starlette.concurrency import run_in_threadpool
 from pydantic import BaseModel
 
 from backend.speech_to_text import convert_audio_to_text
-from backend.diagnosis import diagnose_and_suggest
+from backend.diagnosis import diagnose_and_suggest_async
 from backend.tts import speak
 from backend.train_disease_model_dl import train_model
-from backend.predict_disease_dl import predict_disease
+from backend.topk_table import build_topk_table
+from backend.admission import PREDICT_ADMISSION, Overloaded
+from backend.predict_disease_dl import predict_disease, predict_cache_stats, rescore_candidates, load_model
+from backend.bulk_predict import NDJSON, aiter_results
+from backend.voice_session import serve_websocket as serve_voice_websocket
+from backend.retrieval import search_diseases
+from backend.icd10_index import get_index as get_icd10_index
+from backend.symptom_suggest import suggest_symptoms
+from backend.text_predict import predict_text as predict_text_response
 from backend.who_api import get_popular_diseases
+from backend.metrics import CONTENT_TYPE, render_metrics
+from backend.http_cache import RESPONSE_CACHE, file_stamp, ttl_stamp
+from backend.profiler import check_admin_token, profile_for, route_profiler, ProfilerBusy
+from backend import deadline
 
 sys.path.append(os.path.dirname(os.path.abspath(__file__)))
 
 app = FastAPI()
 
+SYMPTOMS_LIST_PATH = 'backend/models/symptoms_list.json'
+DISEASES_LIST_PATH = 'backend/models/diseases_list.json'
+MAPPING_PATH = 'backend/data/disease_symptom_mapping.json'
+# Nguồn WHO không có mtime -> làm mới response cache theo chu kỳ (giây)
+WHO_CACHE_TTL = float(os.getenv("WHO_CACHE_TTL", "3600"))
+
+
+def _cached_json(request: Request, key: str, version, build, cacheable=None) -> Response:
+    """Response JSON serialize + nén sẵn, ETag mạnh; If-None-Match khớp -> 304 không body."""
+    payload = RESPONSE_CACHE.get(key, version, build, cacheable)
+    status, headers, body = RESPONSE_CACHE.respond(
+        payload, request.headers.get("accept-encoding"), request.headers.get("if-none-match"))
+    return Response(body, status_code=status, headers=headers,
+                    media_type="application/json" if status == 200 else None)
+
+
+@app.middleware("http")
+async def route_profiler_hook(request: Request, call_next):
+    # Endpoint đồng bộ chạy trong threadpool -> không biết luồng, lấy mẫu mọi luồng bận
+    route = request.url.path
+    profiled = route_profiler.enter(route)
+    try:
+        return await call_next(request)
+    finally:
+        if profiled:
+            route_profiler.exit(route)
+
+
+@app.middleware("http")
+async def request_deadline_hook(request: Request, call_next):
+    """Deadline cả request (header X-Request-Timeout hoặc mặc định của route), đi theo contextvar tới mọi giai đoạn."""
+    token = deadline.start(deadline.budget_for(request.url.path, request.headers.get(deadline.DEADLINE_HEADER)))
+    current = deadline.current()
+    try:
+        response = await call_next(request)
+    finally:
+        deadline.reset(token)
+    if current is not None and current.skipped:
+        response.headers[deadline.SKIPPED_HEADER] = ",".join(current.skipped)
+    return response
+
 
 class DiseaseRequest(BaseModel):
     symptoms: List[str]
     lat: Optional[float] = None
     lng: Optional[float] = None
+    explain: bool = False
+
+
+class RetrievalRequest(BaseModel):
+    symptoms: List[str]
+    top_k: int = 5
+    method: str = "bm25"
+    rescore: bool = False
 
 
 @app.post("/process_audio")
@@ -34,12 +96,16 @@ async def process_audio(file: UploadFile = File(...)):
             content = await file.read()
             f.write(content)
 
-        text = convert_audio_to_text(file_location)
-        result = diagnose_and_suggest(text)
+        # STT (giải mã audio + gọi mạng) và TTS là lời gọi chặn: chạy trong threadpool, không chặn event loop
+        text = await run_in_threadpool(convert_audio_to_text, file_location)
+        result = await diagnose_and_suggest_async(text)
         diagnosis = result.get("Hành động gợi ý", {}).get("Hành động khuyến nghị", "Không rõ")
-        mp3_path = speak(diagnosis)
-        audio_url = f"/responses/audio/{os.path.basename(mp3_path)}"
-        return {"diagnosis": diagnosis, "audio_url": audio_url}
+        audio_url = None
+        # TTS là phần tùy chọn: không đủ thời gian thì trả chẩn đoán không kèm audio
+        if deadline.allow("tts"):
+            mp3_path = await run_in_threadpool(speak, diagnosis)
+            audio_url = f"/responses/audio/{os.path.basename(mp3_path)}"
+        return {"diagnosis": diagnosis, "audio_url": audio_url, "skipped_stages": deadline.skipped_stages()}
     except Exception as e:
         raise HTTPException(status_code=500, detail=f"Lỗi xử lý audio: {str(e)}")
     finally:
@@ -50,6 +116,12 @@ async def process_audio(file: UploadFile = File(...)):
                 pass
 
 
+@app.websocket("/ws/voice")
+async def voice_ws(websocket: WebSocket):
+    """Gửi audio PCM theo chunk lúc đang nói; nhận transcript từng đoạn và chẩn đoán ngay khi ngừng nói."""
+    await serve_voice_websocket(websocket)
+
+
 @app.get("/responses/audio/{filename}")
 async def get_audio(filename: str):
     path = os.path.join("backend", "responses", "audio", filename)
@@ -62,33 +134,124 @@ async def get_audio(filename: str):
 async def train_ai_model():
     try:
         train_model()
-        return {"status": "success", "message": "Đã huấn luyện lại model"}
+        # Nạp model mới vào process đang phục vụ trước, bảng top-k dựng bằng chính model đó
+        # -> cùng model_version, lookup không lệch phiên bản và không dựng lại ở luồng nền
+        load_model()
+        precomputed = build_topk_table()
+        return {"status": "success", "message": "Đã huấn luyện lại model",
+                "precomputed": {k: precomputed[k] for k in ("model_version", "entries", "combinations")}}
     except Exception as e:
         raise HTTPException(status_code=500, detail=f"Lỗi huấn luyện: {str(e)}")
 
 
 @app.post("/predict/disease")
-async def predict_disease_api(req: DiseaseRequest):
+def predict_disease_api(req: DiseaseRequest):
+    # Đồng bộ -> chạy trong threadpool, chờ hàng đợi admission không chặn event loop
     try:
-        result = predict_disease(req.symptoms, lat=req.lat, lng=req.lng)
+        with PREDICT_ADMISSION.admit():
+            result = predict_disease(req.symptoms, explain=req.explain)
         return {"symptoms": req.symptoms, "prediction": result}
+    except Overloaded as e:
+        raise HTTPException(status_code=503, detail=str(e), headers={"Retry-After": str(e.retry_after)})
     except Exception as e:
         raise HTTPException(status_code=500, detail=f"Lỗi dự đoán: {str(e)}")
 
 
+@app.post("/predict/text")
+async def predict_text_api(request: Request):
+    """Chẩn đoán từ câu mô tả tự do (tiếng Việt): trích triệu chứng -> model (hợp đồng: backend.text_predict)."""
+    try:
+        data = await request.json()
+    except ValueError:
+        data = None
+    status, body, headers = await run_in_threadpool(predict_text_response, data)
+    return JSONResponse(body, status_code=status, headers=headers)
+
+
+class DuplexStreamingResponse(StreamingResponse):
+    """
+    Stream response trong lúc vẫn đọc request.stream(): StreamingResponse mặc định (ASGI < 2.4, vd. uvicorn)
+    chạy song song listen_for_disconnect, nó tranh receive() và nuốt mất các chunk body còn lại.
+    Client ngắt kết nối -> request.stream() tự ném ClientDisconnect.
+    """
+
+    async def __call__(self, scope, receive, send) -> None:
+        await self.stream_response(send)
+
+
+@app.post("/predict/text/bulk")
+async def predict_text_bulk_api(request: Request):
+    """Body NDJSON {"id", "text"} mỗi dòng -> NDJSON kết quả cùng thứ tự, stream theo lô."""
+    return DuplexStreamingResponse(aiter_results(request.stream()), media_type=NDJSON)
+
+
+@app.post("/predict/retrieval")
+def predict_retrieval_api(req: RetrievalRequest):
+    if req.method not in ("bm25", "jaccard"):
+        raise HTTPException(status_code=400, detail="method phải là 'bm25' hoặc 'jaccard'")
+    try:
+        if req.rescore:
+            candidates = rescore_candidates(req.symptoms, top_k=req.top_k, method=req.method)
+        else:
+            candidates = search_diseases(req.symptoms, top_k=req.top_k, method=req.method)
+        return {"symptoms": req.symptoms, "method": req.method, "candidates": candidates}
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=f"Lỗi truy xuất: {str(e)}")
+
+
+@app.get("/symptoms/suggest")
+def symptoms_suggest(q: str = "", limit: int = 10):
+    """Gợi ý triệu chứng khi gõ (không dấu, sai chính tả nhẹ) kèm cột model chuẩn (canonical)."""
+    limit = max(1, min(limit, 50))
+    return {"q": q, "suggestions": suggest_symptoms(q, limit=limit)}
+
+
+@app.get("/icd10/search")
+def icd10_search(q: str, limit: int = 10):
+    """Tra/autocomplete ICD-10-CM theo mã ("J45", "R05.9") hoặc tên tiếng Anh (chỉ mục cục bộ)."""
+    limit = max(1, min(limit, 100))
+    items = get_icd10_index().search(q, limit=limit)
+    return {"q": q, "total": len(items), "items": items}
+
+
+@app.get("/icd10/{code}")
+def icd10_lookup(code: str):
+    item = get_icd10_index().lookup(code)
+    if item is None:
+        raise HTTPException(status_code=404, detail="Không tìm thấy mã ICD-10")
+    return item
+
+
+@app.get("/metrics")
+async def metrics():
+    return PlainTextResponse(render_metrics(), media_type=CONTENT_TYPE)
+
+
+@app.get("/cache/stats")
+async def get_cache_stats():
+    stats = predict_cache_stats()
+    stats["responses"] = RESPONSE_CACHE.stats()
+    stats["admission"] = PREDICT_ADMISSION.stats()
+    return stats
+
+
+def _model_info() -> Dict:
+    with open(SYMPTOMS_LIST_PATH, 'r', encoding='utf-8') as f:
+        symptoms = json.load(f)
+    with open(DISEASES_LIST_PATH, 'r', encoding='utf-8') as f:
+        diseases = json.load(f)
+    return {
+        "total_symptoms": len(symptoms),
+        "total_diseases": len(diseases),
+        "symptoms": symptoms,
+        "diseases": diseases
+    }
+
+
 @app.get("/model/info")
-async def get_model_info():
+async def get_model_info(request: Request):
     try:
-        with open('backend/models/symptoms_list.json', 'r', encoding='utf-8') as f:
-            symptoms = json.load(f)
-        with open('backend/models/diseases_list.json', 'r', encoding='utf-8') as f:
-            diseases = json.load(f)
-        return {
-            "total_symptoms": len(symptoms),
-            "total_diseases": len(diseases),
-            "symptoms": symptoms,
-            "diseases": diseases
-        }
+        return _cached_json(request, "model_info", file_stamp(SYMPTOMS_LIST_PATH, DISEASES_LIST_PATH), _model_info)
     except Exception as e:
         raise HTTPException(status_code=500, detail=f"Lỗi đọc thông tin model: {str(e)}")
 
@@ -96,13 +259,13 @@ async def get_model_info():
 @app.post("/add/training-data")
 async def add_training_data(data: Dict):
     try:
-        with open('backend/data/disease_symptom_mapping.json', 'r', encoding='utf-8') as f:
+        with open(MAPPING_PATH, 'r', encoding='utf-8') as f:
             mapping = json.load(f)
 
         new_entry = {"disease": data["disease"], "symptoms": data["symptoms"]}
         mapping.append(new_entry)
 
-        with open('backend/data/disease_symptom_mapping.json', 'w', encoding='utf-8') as f:
+        with open(MAPPING_PATH, 'w', encoding='utf-8') as f:
             json.dump(mapping, f, ensure_ascii=False, indent=2)
 
         return {"status": "success", "message": "Đã thêm dữ liệu huấn luyện mới", "total_entries": len(mapping)}
@@ -110,20 +273,92 @@ async def add_training_data(data: Dict):
         raise HTTPException(status_code=500, detail=f"Lỗi thêm dữ liệu: {str(e)}")
 
 
+def _training_data() -> Dict:
+    with open(MAPPING_PATH, 'r', encoding='utf-8') as f:
+        mapping = json.load(f)
+    return {"total_entries": len(mapping), "data": mapping}
+
+
 @app.get("/training-data")
-async def get_training_data():
+async def get_training_data(request: Request):
     try:
-        with open('backend/data/disease_symptom_mapping.json', 'r', encoding='utf-8') as f:
-            mapping = json.load(f)
-        return {"total_entries": len(mapping), "data": mapping}
+        return _cached_json(request, "training_data", file_stamp(MAPPING_PATH), _training_data)
     except Exception as e:
         raise HTTPException(status_code=500, detail=f"Lỗi đọc dữ liệu: {str(e)}")
 
 
+def _who_popular_diseases() -> Dict:
+    data = get_popular_diseases()
+    if data is None:
+        # WHO lỗi hoặc bị bỏ qua vì deadline: không cache để lần sau gọi lại
+        return {"status": "unavailable", "data": []}
+    return {"status": "success", "data": data}
+
+
 @app.get("/who/popular-diseases")
-async def who_popular_diseases():
+def who_popular_diseases(request: Request):
+    # def thường (threadpool): lần build gọi WHO API chặn, không được chạy trên event loop
     try:
-        data = get_popular_diseases()
-        return {"status": "success", "data": data}
+        return _cached_json(request, "who_popular_diseases", ttl_stamp(WHO_CACHE_TTL), _who_popular_diseases,
+                            cacheable=lambda p: p["status"] == "success" and not deadline.skipped_stages())
     except Exception as e:
-        raise HTTPException(status_code=500, detail=f"Lỗi lấy dữ liệu WHO: {str(e)}")
\ No newline at end of file
+        raise HTTPException(status_code=500, detail=f"Lỗi lấy dữ liệu WHO: {str(e)}")
+
+
+# ===== Admin: profiler lấy mẫu (header X-Admin-Token = ADMIN_TOKEN) =====
+class RouteProfileRequest(BaseModel):
+    route: str
+    requests: int = 10
+    interval_ms: float = 5
+    allocations: bool = True
+
+
+def _require_admin(token: Optional[str]) -> None:
+    if not check_admin_token(token):
+        raise HTTPException(status_code=403, detail="Forbidden")
+
+
+def _profile_response(result: Dict, fmt: str):
+    if fmt == "collapsed":
+        return Response(result["collapsed"], media_type="text/plain",
+                        headers={"Content-Disposition": "attachment; filename=profile.collapsed"})
+    return result
+
+
+@app.post("/admin/profile")
+def admin_profile(seconds: float = 10, interval_ms: float = 5, allocations: bool = True, format: str = "json",
+                  x_admin_token: Optional[str] = Header(None), authorization: Optional[str] = Header(None)):
+    """Lấy mẫu toàn bộ worker trong N giây, trả JSON hoặc file collapsed stacks."""
+    _require_admin(x_admin_token or authorization)
+    try:
+        result = profile_for(seconds, interval=interval_ms / 1000.0, allocations=allocations)
+    except ProfilerBusy as e:
+        raise HTTPException(status_code=409, detail=str(e))
+    return _profile_response(result, format)
+
+
+@app.post("/admin/profile/route")
+async def admin_profile_route_arm(req: RouteProfileRequest, x_admin_token: Optional[str] = Header(None),
+                                  authorization: Optional[str] = Header(None)):
+    _require_admin(x_admin_token or authorization)
+    try:
+        route_profiler.arm(req.route, req.requests, interval=req.interval_ms / 1000.0, allocations=req.allocations)
+    except ProfilerBusy as e:
+        raise HTTPException(status_code=409, detail=str(e))
+    return route_profiler.status()
+
+
+@app.get("/admin/profile/route")
+async def admin_profile_route_result(format: str = "json", x_admin_token: Optional[str] = Header(None),
+                                     authorization: Optional[str] = Header(None)):
+    _require_admin(x_admin_token or authorization)
+    if route_profiler.last_result is None:
+        return route_profiler.status()
+    return _profile_response(route_profiler.last_result, format)
+
+
+@app.delete("/admin/profile/route")
+async def admin_profile_route_cancel(x_admin_token: Optional[str] = Header(None),
+                                     authorization: Optional[str] = Header(None)):
+    _require_admin(x_admin_token or authorization)
+    return route_profiler.cancel() or route_profiler.status()
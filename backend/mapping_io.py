@@ -0,0 +1,62 @@
+import glob
+import json
+import os
+from typing import Any, Dict, Iterator, List
+
+MAPPING_PATH = 'backend/data/disease_symptom_mapping.json'
+
+
+def _valid(item: Any) -> bool:
+    return isinstance(item, dict) and bool(item.get("disease")) and isinstance(item.get("symptoms"), list)
+
+
+def mapping_files(path: str) -> List[str]:
+    """File JSONL của 1 bộ dữ liệu: file đơn, thư mục shard (mapping-*.jsonl) hoặc glob."""
+    if os.path.isdir(path):
+        return sorted(glob.glob(os.path.join(path, "mapping-*.jsonl")))
+    if any(c in path for c in "*?["):
+        return sorted(glob.glob(path))
+    return [path]
+
+
+def is_jsonl(path: str) -> bool:
+    return os.path.isdir(path) or path.endswith(".jsonl") or any(c in path for c in "*?[")
+
+
+def iter_mapping(path: str = MAPPING_PATH) -> Iterator[Dict[str, Any]]:
+    """
+    Duyệt từng dòng mapping, bộ nhớ không đổi với JSONL (dữ liệu lớn từ data/generate_dataset.py).
+    File .json (định dạng cũ, 1 mảng) vẫn phải đọc cả file.
+    """
+    if not is_jsonl(path):
+        yield from load_mapping(path)
+        return
+    for file in mapping_files(path):
+        with open(file, encoding='utf-8') as f:
+            for line in f:
+                line = line.strip()
+                if not line:
+                    continue
+                try:
+                    item = json.loads(line)
+                except ValueError:
+                    continue
+                if _valid(item):
+                    yield item
+
+
+def load_mapping(path: str = MAPPING_PATH) -> List[Dict[str, Any]]:
+    """Đọc mapping bệnh-triệu chứng; làm phẳng các list lồng nhau, bỏ qua phần tử sai định dạng."""
+    if is_jsonl(path):
+        return list(iter_mapping(path))
+    with open(path, encoding='utf-8') as f:
+        data = json.load(f)
+    out: List[Dict[str, Any]] = []
+    stack = [data]
+    while stack:
+        item = stack.pop()
+        if isinstance(item, list):
+            stack.extend(reversed(item))
+        elif _valid(item):
+            out.append(item)
+    return out
@@ -0,0 +1,175 @@
+import functools
+import threading
+import time
+from bisect import bisect_left
+from contextlib import contextmanager
+from typing import Callable, Dict, Iterator, List, Optional, Tuple
+
+# Content-Type chuẩn cho Prometheus text exposition format
+CONTENT_TYPE = "text/plain; version=0.0.4; charset=utf-8"
+
+# Bucket (giây): từ 0.5ms cho normalize/cache tới 30s cho API ngoài/huấn luyện
+DEFAULT_BUCKETS = (0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0)
+
+
+def _fmt_labels(names: Tuple[str, ...], values: Tuple[str, ...], extra: str = "") -> str:
+    parts = [f'{n}="{_escape(v)}"' for n, v in zip(names, values)]
+    if extra:
+        parts.append(extra)
+    return "{" + ",".join(parts) + "}" if parts else ""
+
+
+def _escape(v: str) -> str:
+    return str(v).replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+
+
+def _fmt_float(v: float) -> str:
+    if v == float("inf"):
+        return "+Inf"
+    return repr(float(v))
+
+
+class Counter:
+    def __init__(self, name: str, doc: str, labels: Tuple[str, ...] = ()):
+        self.name, self.doc, self.labels = name, doc, labels
+        self._values: Dict[Tuple[str, ...], float] = {}
+        self._lock = threading.Lock()
+
+    def inc(self, *label_values: str, amount: float = 1.0) -> None:
+        with self._lock:
+            self._values[label_values] = self._values.get(label_values, 0.0) + amount
+
+    def value(self, *label_values: str) -> float:
+        return self._values.get(label_values, 0.0)
+
+    def render(self) -> List[str]:
+        lines = [f"# HELP {self.name} {self.doc}", f"# TYPE {self.name} counter"]
+        with self._lock:
+            items = list(self._values.items())
+        for lv, v in items:
+            lines.append(f"{self.name}{_fmt_labels(self.labels, lv)} {_fmt_float(v)}")
+        return lines
+
+
+class Gauge:
+    """Gauge lấy giá trị qua callback lúc render: fn() -> {label_values: value}."""
+
+    def __init__(self, name: str, doc: str, labels: Tuple[str, ...], fn: Callable[[], Dict[Tuple[str, ...], float]]):
+        self.name, self.doc, self.labels, self.fn = name, doc, labels, fn
+
+    def render(self) -> List[str]:
+        lines = [f"# HELP {self.name} {self.doc}", f"# TYPE {self.name} gauge"]
+        try:
+            values = self.fn() or {}
+        except Exception:
+            values = {}
+        for lv, v in values.items():
+            lines.append(f"{self.name}{_fmt_labels(self.labels, lv)} {_fmt_float(v)}")
+        return lines
+
+
+class Histogram:
+    def __init__(self, name: str, doc: str, labels: Tuple[str, ...] = (), buckets: Tuple[float, ...] = DEFAULT_BUCKETS):
+        self.name, self.doc, self.labels = name, doc, labels
+        self.buckets = tuple(sorted(buckets))
+        # label_values -> [counts theo bucket (không cộng dồn) + bucket +Inf, sum]
+        self._series: Dict[Tuple[str, ...], List] = {}
+        self._lock = threading.Lock()
+
+    def observe(self, value: float, *label_values: str) -> None:
+        i = bisect_left(self.buckets, value)
+        with self._lock:
+            s = self._series.get(label_values)
+            if s is None:
+                s = self._series[label_values] = [[0] * (len(self.buckets) + 1), 0.0]
+            s[0][i] += 1
+            s[1] += value
+
+    def count(self, *label_values: str) -> int:
+        s = self._series.get(label_values)
+        return sum(s[0]) if s else 0
+
+    def render(self) -> List[str]:
+        lines = [f"# HELP {self.name} {self.doc}", f"# TYPE {self.name} histogram"]
+        with self._lock:
+            items = [(lv, list(s[0]), s[1]) for lv, s in self._series.items()]
+        for lv, counts, total in items:
+            acc = 0
+            for le, c in zip(self.buckets + (float("inf"),), counts):
+                acc += c
+                le_label = 'le="%s"' % _fmt_float(le)
+                lines.append(f"{self.name}_bucket{_fmt_labels(self.labels, lv, le_label)} {acc}")
+            lines.append(f"{self.name}_sum{_fmt_labels(self.labels, lv)} {_fmt_float(total)}")
+            lines.append(f"{self.name}_count{_fmt_labels(self.labels, lv)} {acc}")
+        return lines
+
+
+class Registry:
+    def __init__(self):
+        self._metrics: Dict[str, object] = {}
+        self._lock = threading.Lock()
+
+    def register(self, metric):
+        with self._lock:
+            # Module có thể bị import 2 lần (importlib) -> dùng lại metric cũ cùng tên
+            return self._metrics.setdefault(metric.name, metric)
+
+    def counter(self, name: str, doc: str, labels: Tuple[str, ...] = ()) -> Counter:
+        return self.register(Counter(name, doc, labels))
+
+    def histogram(self, name: str, doc: str, labels: Tuple[str, ...] = (),
+                  buckets: Tuple[float, ...] = DEFAULT_BUCKETS) -> Histogram:
+        return self.register(Histogram(name, doc, labels, buckets))
+
+    def gauge(self, name: str, doc: str, labels: Tuple[str, ...],
+              fn: Callable[[], Dict[Tuple[str, ...], float]]) -> Gauge:
+        with self._lock:
+            # Gauge callback: đăng ký lại thì thay callback mới
+            self._metrics[name] = Gauge(name, doc, labels, fn)
+            return self._metrics[name]
+
+    def render(self) -> str:
+        with self._lock:
+            metrics = list(self._metrics.values())
+        lines: List[str] = []
+        for m in metrics:
+            lines.extend(m.render())
+        return "\n".join(lines) + "\n"
+
+
+REGISTRY = Registry()
+
+STAGE_SECONDS = REGISTRY.histogram(
+    "jaremis_stage_duration_seconds", "Thời gian chạy từng giai đoạn pipeline (giây)", ("pipeline", "stage"))
+STAGE_ERRORS = REGISTRY.counter(
+    "jaremis_stage_errors_total", "Số lần giai đoạn pipeline ném exception", ("pipeline", "stage"))
+
+
+@contextmanager
+def stage_timer(pipeline: str, stage: str) -> Iterator[None]:
+    """Đo 1 giai đoạn: ghi histogram thời gian (kể cả khi lỗi) và đếm lỗi."""
+    start = time.perf_counter()
+    try:
+        yield
+    except BaseException:
+        STAGE_ERRORS.inc(pipeline, stage)
+        raise
+    finally:
+        STAGE_SECONDS.observe(time.perf_counter() - start, pipeline, stage)
+
+
+def timed(pipeline: str, stage: Optional[str] = None):
+    """Decorator tương đương stage_timer cho cả hàm (stage mặc định = tên hàm)."""
+    def deco(fn):
+        name = stage or fn.__name__
+
+        @functools.wraps(fn)
+        def wrapper(*args, **kwargs):
+            with stage_timer(pipeline, name):
+                return fn(*args, **kwargs)
+        return wrapper
+    return deco
+
+
+def render_metrics() -> str:
+    return REGISTRY.render()
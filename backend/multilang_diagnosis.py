@@ -1,6 +1,10 @@
 from typing import Dict, Any, Optional
+from backend import deadline
 from backend.trans import translate_text
 from backend.predict_disease_dl import analyze_symptoms_text
+from backend.metrics import stage_timer
+
+PIPELINE = "multilang_diagnose"
 
 def multilang_diagnose(symptoms_text: str, user_lang: Optional[str] = None) -> Dict[str, Any]:
     """
@@ -11,10 +15,16 @@ def multilang_diagnose(symptoms_text: str, user_lang: Optional[str] = None) -> D
     4. Dịch kết quả về ngôn ngữ người dùng
     5. Trả về kết quả
     """
+    with stage_timer(PIPELINE, "total"):
+        return _multilang_diagnose(symptoms_text, user_lang)
+
+
+def _multilang_diagnose(symptoms_text: str, user_lang: Optional[str] = None) -> Dict[str, Any]:
     try:
         # Bước 1: Nhận diện ngôn ngữ (nếu không được cung cấp)
         if not user_lang:
-            detect_result = translate_text(symptoms_text, src="auto", dest="en")
+            with stage_timer(PIPELINE, "detect_language"):
+                detect_result = translate_text(symptoms_text, src="auto", dest="en")
             if detect_result.get("error"):
                 return {"error": True, "message": "Không thể nhận diện ngôn ngữ"}
             user_lang = detect_result["src"]
@@ -22,20 +32,23 @@ def multilang_diagnose(symptoms_text: str, user_lang: Optional[str] = None) -> D
         # Bước 2: Dịch sang tiếng Việt (nếu không phải tiếng Việt)
         vietnamese_text = symptoms_text
         if user_lang != "vi":
-            translate_to_vi = translate_text(symptoms_text, src=user_lang, dest="vi")
+            with stage_timer(PIPELINE, "translate_input"):
+                translate_to_vi = translate_text(symptoms_text, src=user_lang, dest="vi")
             if translate_to_vi.get("error"):
                 return {"error": True, "message": "Không thể dịch sang tiếng Việt"}
             vietnamese_text = translate_to_vi["translated"]
         
         # Bước 3: AI chẩn đoán (tiếng Việt)
-        diagnosis_result = analyze_symptoms_text(vietnamese_text)
+        with stage_timer(PIPELINE, "diagnose"):
+            diagnosis_result = analyze_symptoms_text(vietnamese_text)
         if diagnosis_result.get("error"):
             return diagnosis_result
         
-        # Bước 4: Dịch kết quả về ngôn ngữ người dùng
+        # Bước 4: Dịch kết quả về ngôn ngữ người dùng (tùy chọn: bỏ qua khi sắp hết deadline)
         translated_advice = diagnosis_result.get("advice", "")
-        if user_lang != "vi" and translated_advice:
-            advice_translation = translate_text(translated_advice, src="vi", dest=user_lang)
+        if user_lang != "vi" and translated_advice and deadline.allow("translate_output"):
+            with stage_timer(PIPELINE, "translate_output"):
+                advice_translation = translate_text(translated_advice, src="vi", dest=user_lang)
             if not advice_translation.get("error"):
                 diagnosis_result["advice"] = advice_translation["translated"]
                 diagnosis_result["advice_original"] = translated_advice
@@ -47,7 +60,8 @@ def multilang_diagnose(symptoms_text: str, user_lang: Optional[str] = None) -> D
             "original_symptoms": symptoms_text,
             "vietnamese_symptoms": vietnamese_text,
             "diagnosis": diagnosis_result,
-            "pipeline": "multilang"
+            "pipeline": "multilang",
+            "skipped_stages": deadline.skipped_stages(),
         }
         
     except Exception as e:
@@ -1,9 +1,23 @@
 import os
 import json
-from typing import List, Dict, Any, Optional
+import hashlib
+import logging
+import random
+import threading
+import time
+from typing import List, Dict, Any, Optional, Tuple
 import numpy as np
-import unicodedata
-import re
+
+from backend.admission import is_degraded
+from backend.analyzer import KeywordIndex
+from backend.audit_log import log_prediction
+from backend.cache import TTLCache, SingleFlight
+from backend.metrics import REGISTRY, stage_timer
+from backend.retrieval import get_index as get_retrieval_index
+from backend.text_norm import fold, fold_many, normalize_many, normalize_text
+from backend import deadline, http_client, topk_table
+
+log = logging.getLogger(__name__)
 
 # Dùng tf.keras (TF 2.12)
 try:
@@ -11,14 +25,10 @@ try:
     keras = tf.keras
 except ImportError:
     print("Warning: TensorFlow not installed. Please install with: pip install tensorflow")
+    tf = None
     keras = None
 
 # Thư viện ngoài (tùy chọn)
-try:
-    import requests
-except ImportError:
-    requests = None
-
 try:
     from dotenv import load_dotenv
 except ImportError:
@@ -29,45 +39,332 @@ try:
 except Exception:
     rf_process = None
 
+MODEL_PATH = 'backend/models/disease_model_dl.h5'
+SYMPTOMS_PATH = 'backend/models/symptoms_list.json'
+DISEASES_PATH = 'backend/models/diseases_list.json'
+SYNONYMS_PATH = 'backend/data/symptom_synonyms.json'
+INT8_MODEL_PATH = 'backend/models/disease_model_int8.npz'
+TFLITE_MODEL_PATH = 'backend/models/disease_model_int8.tflite'
+
+# Engine suy luận: keras (float32 .h5) | int8 (NumPy int8, phải xuất từ đúng model .h5 đang có).
+# TFLite int8 chưa được hỗ trợ để phục vụ: lệch nhiều so với model float (top-3 overlap ~0.59,
+# xem quantization_report.json), chỉ dùng để đo trong export_quantized / evaluate_model.
+SERVING_ENGINES = ("keras", "int8")
+INFERENCE_ENGINE = (os.getenv("INFERENCE_ENGINE") or "keras").strip().lower()
+
 # Model và danh sách triệu chứng/bệnh
 model: Optional[Any] = None
+model_version: str = ""
 all_symptoms: List[str] = []
 all_diseases: List[str] = []
+_symptom_index: Dict[str, int] = {}
+_disease_index: Dict[str, int] = {}
+# Đặc trưng mức độ tính sẵn khi load model: bệnh có từ khóa nguy hiểm (theo all_diseases),
+# triệu chứng cảnh báo đỏ (mặt nạ theo cột all_symptoms)
+_disease_critical: np.ndarray = np.zeros(0, dtype=bool)
+_red_flag_mask: np.ndarray = np.zeros(0, dtype=bool)
+
+CRITICAL_NAME_KWS = (
+    "nhồi máu", "đột quỵ", "xuất huyết", "suy tim", "suy thận", "ung thư", "nhiễm trùng huyết",
+    "viêm màng não", "viêm cơ tim", "tắc mạch", "phình", "sốc", "suy hô hấp", "hoại tử"
+)
+RED_FLAG_SYMPTOMS = frozenset({
+    "đau ngực", "khó thở", "mất ý thức", "liệt", "yếu nửa người", "co giật",
+    "sốt cao", "nôn ra máu", "đi ngoài ra máu", "đau đầu dữ dội", "đau bụng dữ dội",
+    "đau ngực dữ dội", "chảy máu không cầm", "vàng da", "lơ mơ", "đau mắt dữ dội"
+})
+SEVERITY_LEVELS = np.array(["Thấp", "Trung bình", "Cao"], dtype=object)
+
+# Cache kết quả dự đoán theo (model_version, tập triệu chứng chuẩn hóa đã sắp xếp)
+_PREDICT_CACHE = TTLCache(
+    maxsize=int(os.getenv("PREDICT_CACHE_SIZE", "2048")),
+    ttl=float(os.getenv("PREDICT_CACHE_TTL", "600")),
+)
+_PREDICT_FLIGHT = SingleFlight()
+
+PIPELINE = "predict_disease"
+
+# Không load được model (thiếu TensorFlow/file model) -> dự đoán bằng chỉ mục triệu chứng
+RETRIEVAL_FALLBACK = (os.getenv("RETRIEVAL_FALLBACK") or "1") != "0"
+# Số bệnh ứng viên lấy từ chỉ mục trước khi model chấm lại (rescore_candidates)
+RETRIEVAL_CANDIDATES = int(os.getenv("RETRIEVAL_CANDIDATES", "30"))
+# Giải thích (explain=true): occlusion (leave-one-out, mọi engine) | gradient (gradient×input, chỉ keras)
+EXPLAIN_METHOD = (os.getenv("EXPLAIN_METHOD") or "occlusion").strip().lower()
+EXPLAIN_TOP_K = int(os.getenv("EXPLAIN_TOP_K", "3"))
+# Tổ hợp phổ biến trả lời bằng bảng top-k tính sẵn (backend/topk_table.py), không suy luận
+TOPK_TABLE = (os.getenv("TOPK_TABLE") or "1") != "0"
+# Bảng lệch phiên bản model -> tự dựng lại ở luồng nền
+TOPK_TABLE_AUTO_BUILD = (os.getenv("TOPK_TABLE_AUTO_BUILD") or "1") != "0"
+
+
+def _file_fingerprint(paths: List[str]) -> str:
+    """Phiên bản model = hash(kích thước + mtime) của các file model, đổi khi train lại."""
+    h = hashlib.sha1()
+    for p in paths:
+        try:
+            st = os.stat(p)
+            h.update(f"{p}:{st.st_size}:{st.st_mtime_ns};".encode())
+        except OSError:
+            h.update(f"{p}:missing;".encode())
+    return h.hexdigest()[:12]
+
+
+def source_fingerprint(model_path: str = MODEL_PATH, symptoms_path: str = SYMPTOMS_PATH,
+                       diseases_path: str = DISEASES_PATH) -> Dict[str, str]:
+    """
+    Hash nội dung model float + danh sách cột/nhãn, ghi vào file int8 lúc export để phát hiện file cũ
+    sau khi train lại ("labels": số/thứ tự triệu chứng và bệnh; "model": trọng số .h5, rỗng nếu không có file).
+    """
+    def digest(paths: List[str]) -> str:
+        h = hashlib.sha1()
+        for p in paths:
+            with open(p, 'rb') as f:
+                h.update(hashlib.sha1(f.read()).digest())
+        return h.hexdigest()[:16]
+    return {
+        "labels": digest([symptoms_path, diseases_path]),
+        "model": digest([model_path]) if os.path.exists(model_path) else "",
+    }
 
 
-def load_model() -> None:
-    """Load model và dữ liệu."""
-    global model, all_symptoms, all_diseases
+def _softmax(z: np.ndarray) -> np.ndarray:
+    z = z - z.max(axis=-1, keepdims=True)
+    e = np.exp(z)
+    return e / e.sum(axis=-1, keepdims=True)
+
+
+_ACTIVATIONS = {
+    "relu": lambda z: np.maximum(z, 0.0),
+    "softmax": _softmax,
+    "linear": lambda z: z,
+}
+
+
+class Int8DenseModel:
+    """
+    Suy luận NumPy cho model Dense đã lượng tử hóa int8 (per-output-channel, đối xứng).
+    File .npz: w{i} (int8, in x out), s{i} (float32 scale theo cột), b{i} (float32 bias), activations,
+    source_labels / source_model (source_fingerprint() của model float lúc export; file cũ không có -> "").
+    API giống keras: predict(X, verbose=0) -> (n, n_diseases) float32.
+    """
+
+    def __init__(self, path: str = INT8_MODEL_PATH):
+        with np.load(path, allow_pickle=False) as data:
+            acts = [str(a) for a in data["activations"]]
+            self.layers = [(data[f"w{i}"], data[f"s{i}"], data[f"b{i}"], acts[i]) for i in range(len(acts))]
+            self.source = {k: str(data[f"source_{k}"]) if f"source_{k}" in data.files else ""
+                           for k in ("labels", "model")}
+
+    def check_source(self, expected: Dict[str, str]) -> None:
+        """Ném ValueError nếu file int8 không được xuất từ model float/danh sách nhãn hiện tại."""
+        stale = [k for k in ("labels", "model") if expected.get(k) and self.source.get(k) != expected[k]]
+        if stale:
+            raise ValueError(f"Model int8 lệch với model float hiện tại ({', '.join(stale)}); "
+                             "xuất lại: python -m backend.train_disease_model_dl --export-int8")
+
+    @property
+    def nbytes(self) -> int:
+        return int(sum(w.nbytes + s.nbytes + b.nbytes for w, s, b, _ in self.layers))
+
+    def predict(self, X, verbose: int = 0, batch_size: Optional[int] = None) -> np.ndarray:
+        X = np.asarray(X, dtype=np.float32)
+        w, s, b, act = self.layers[0]
+        if len(X) == 1 and np.all((X == 0.0) | (X == 1.0)):
+            # Input one-hot: X @ W = tổng các hàng W ứng với triệu chứng có mặt (cộng int32, không nhân ma trận)
+            acc = w[np.flatnonzero(X[0])].sum(axis=0, dtype=np.int32)[None, :]
+            h = acc.astype(np.float32) * s + b
+        else:
+            h = (X @ w.astype(np.float32)) * s + b
+        h = _ACTIVATIONS[act](h)
+        for w, s, b, act in self.layers[1:]:
+            h = _ACTIVATIONS[act]((h @ w.astype(np.float32)) * s + b)
+        return h.astype(np.float32, copy=False)
+
+
+class TFLiteModel:
+    """Suy luận TFLite (int8) với API predict() giống keras; Interpreter không thread-safe nên có khóa."""
+
+    def __init__(self, path: str = TFLITE_MODEL_PATH, num_threads: Optional[int] = None):
+        try:
+            from ai_edge_litert.interpreter import Interpreter
+        except ImportError:
+            if tf is None:
+                raise ImportError("Cần tensorflow hoặc ai-edge-litert để chạy model TFLite")
+            Interpreter = tf.lite.Interpreter
+        self._lock = threading.Lock()
+        self.interpreter = Interpreter(model_path=path, num_threads=num_threads)
+        self.interpreter.allocate_tensors()
+        self._in = self.interpreter.get_input_details()[0]
+        self._out = self.interpreter.get_output_details()[0]
+        self._batch = int(self._in["shape"][0])
+
+    def predict(self, X, verbose: int = 0, batch_size: Optional[int] = None) -> np.ndarray:
+        X = np.asarray(X, dtype=np.float32)
+        with self._lock:
+            if len(X) != self._batch:
+                self.interpreter.resize_tensor_input(self._in["index"], list(X.shape))
+                self.interpreter.allocate_tensors()
+                self._in = self.interpreter.get_input_details()[0]
+                self._out = self.interpreter.get_output_details()[0]
+                self._batch = len(X)
+            if self._in["dtype"] == np.int8:
+                scale, zero = self._in["quantization"]
+                X = np.clip(np.round(X / scale + zero), -128, 127).astype(np.int8)
+            self.interpreter.set_tensor(self._in["index"], X)
+            self.interpreter.invoke()
+            out = self.interpreter.get_tensor(self._out["index"]).copy()
+        if self._out["dtype"] == np.int8:
+            scale, zero = self._out["quantization"]
+            out = (out.astype(np.float32) - zero) * scale
+        return out
+
+
+def engine_path(engine: str = INFERENCE_ENGINE) -> str:
+    return INT8_MODEL_PATH if engine == "int8" else MODEL_PATH
+
+
+def file_version(engine: str = INFERENCE_ENGINE) -> str:
+    """model_version mà load_model() sẽ có nếu nạp lại từ các file hiện tại."""
+    return engine + "-" + _file_fingerprint([engine_path(engine), SYMPTOMS_PATH, DISEASES_PATH])
+
+
+def load_inference_engine(engine: str = INFERENCE_ENGINE) -> Tuple[Any, str]:
+    """Trả về (model có .predict, đường dẫn file model) theo engine (SERVING_ENGINES)."""
+    if engine not in SERVING_ENGINES:
+        raise ValueError(f"INFERENCE_ENGINE không hỗ trợ phục vụ: {engine} (có: {', '.join(SERVING_ENGINES)})")
+    if engine == "int8":
+        int8_model = Int8DenseModel(INT8_MODEL_PATH)
+        int8_model.check_source(source_fingerprint())
+        return int8_model, INT8_MODEL_PATH
     if keras is None:
         raise ImportError("TensorFlow is required but not installed")
-    model = keras.models.load_model('backend/models/disease_model_dl.h5')
-    with open('backend/models/symptoms_list.json', encoding='utf-8') as f:
-        all_symptoms = json.load(f)
-    with open('backend/models/diseases_list.json', encoding='utf-8') as f:
-        all_diseases = json.load(f)
+    return keras.models.load_model(MODEL_PATH), MODEL_PATH
 
 
-def evaluate_severity(disease: str, confidence: float, symptoms: List[str]) -> Dict[str, Any]:
+_swap_lock = threading.Lock()
+# Lần load_model() lỗi gần nhất: (file_version lúc đó, lỗi). Đường nạp lười không thử lại mỗi request,
+# chỉ khi gọi load_model() trực tiếp (train/reload) hoặc file model đổi.
+_load_failure: Optional[Tuple[str, Exception]] = None
+
+
+def load_model() -> None:
     """
-    Trả về:
-      - severity_score: 0..1
-      - severity_level: "Cao" | "Trung bình" | "Thấp"
-      - should_visit_hospital: bool
-    Ưu tiên gọi API nếu .env có SEVERITY_API_URL (+ SEVERITY_API_KEY), nếu không dùng heuristic nội bộ.
+    Load (hoặc nạp lại sau khi train) model và dữ liệu. Mọi thứ dựng xong mới gán 1 lượt, nên request đang
+    chạy thấy trọn bộ cũ hoặc trọn bộ mới. Model lỗi -> vẫn gán danh sách triệu chứng/bệnh (fallback chỉ mục),
+    model = None, rồi ném lỗi.
     """
-    # 1) API ngoài nếu có cấu hình
+    global model, model_version, all_symptoms, all_diseases, _symptom_index, _disease_index
+    global _disease_critical, _red_flag_mask, _load_failure
+    with open(SYMPTOMS_PATH, encoding='utf-8') as f:
+        symptoms = json.load(f)
+    with open(DISEASES_PATH, encoding='utf-8') as f:
+        diseases = json.load(f)
+    critical, red_flags = _severity_features(symptoms, diseases)
+    version = file_version(INFERENCE_ENGINE)
+    new_model = None
+    try:
+        new_model, _ = load_inference_engine(INFERENCE_ENGINE)
+    except (ImportError, OSError, ValueError) as e:
+        _load_failure = (version, e)
+        log.warning("Không load được model %s (%s), dùng chỉ mục triệu chứng tới khi nạp lại", version, e)
+        raise
+    else:
+        _load_failure = None
+    finally:
+        with _swap_lock:
+            all_symptoms, all_diseases = symptoms, diseases
+            _symptom_index = {s: i for i, s in enumerate(symptoms)}
+            _disease_index = {d: i for i, d in enumerate(diseases)}
+            _disease_critical, _red_flag_mask = critical, red_flags
+            model, model_version = new_model, version if new_model is not None else ""
+
+
+def _load_model_lazily() -> None:
+    """load_model() khi request cần model; đã lỗi với đúng file_version hiện tại -> ném lại lỗi cũ, không nạp lại."""
+    failure = _load_failure
+    if failure is not None and failure[0] == file_version(INFERENCE_ENGINE):
+        raise failure[1].with_traceback(None)
+    load_model()
+
+
+def _is_critical_name(disease: str) -> bool:
+    disease_lc = (disease or "").lower()
+    return any(kw in disease_lc for kw in CRITICAL_NAME_KWS)
+
+
+def _severity_features(symptoms: List[str], diseases: List[str]) -> Tuple[np.ndarray, np.ndarray]:
+    """Quét từ khóa/triệu chứng cảnh báo 1 lần cho cả danh sách (thay vì mỗi request)."""
+    critical = np.fromiter((_is_critical_name(d) for d in diseases), dtype=bool, count=len(diseases))
+    red_flags = np.fromiter((s.strip().lower() in RED_FLAG_SYMPTOMS for s in symptoms), dtype=bool, count=len(symptoms))
+    return critical, red_flags
+
+
+def red_flag_hits(symptoms: List[str]) -> int:
+    """Số triệu chứng cảnh báo đỏ; tên đúng cột model tra mặt nạ, tên lạ so trực tiếp với tập."""
+    hits = 0
+    for s in set(symptoms or []):
+        col = _symptom_index.get(s)
+        if col is not None and col < len(_red_flag_mask):
+            hits += bool(_red_flag_mask[col])
+        else:
+            hits += s.strip().lower() in RED_FLAG_SYMPTOMS
+    return hits
+
+
+def severity_scores(confidence: np.ndarray, critical: np.ndarray, hits: np.ndarray) -> Dict[str, np.ndarray]:
+    """
+    Heuristic mức độ vector hóa (mọi mảng broadcast được với nhau, vd. (n, k) ứng viên và (n, 1) số cảnh báo):
+    score = 0.35 * confidence + 0.4 * bệnh nguy hiểm + min(0.35, 0.15 * số triệu chứng cảnh báo).
+    """
+    hits = np.asarray(hits)
+    score = (0.35 * np.clip(confidence, 0.0, 1.0) + 0.4 * np.asarray(critical, dtype=np.float64)
+             + np.minimum(0.35, 0.15 * hits))
+    score = np.clip(score, 0.0, 1.0)
+    level = (score >= 0.5).astype(np.int8) + (score >= 0.7)
+    return {"score": score, "level": SEVERITY_LEVELS[level], "should_visit_hospital": (score >= 0.7) | (hits >= 2)}
+
+
+def severity_batch(probs: np.ndarray, X: np.ndarray, top_k: int = 3) -> Dict[str, np.ndarray]:
+    """
+    Mức độ cho top-k bệnh của cả lô (probs từ predict_proba_batch, X từ encode_symptom_sets):
+    trả về các mảng (n, top_k): disease_idx, prob, score, level, should_visit_hospital.
+    """
+    k = max(1, min(top_k, probs.shape[1]))
+    idx = np.argpartition(-probs, k - 1, axis=1)[:, :k]
+    idx = np.take_along_axis(idx, np.argsort(-np.take_along_axis(probs, idx, axis=1), axis=1), axis=1)
+    prob = np.take_along_axis(probs, idx, axis=1)
+    hits = (X[:, _red_flag_mask] > 0).sum(axis=1, keepdims=True)
+    return {"disease_idx": idx, "prob": prob, **severity_scores(prob, _disease_critical[idx], hits)}
+
+
+def _candidate_severity(candidates: List[Tuple[Optional[int], str, float]], symptoms: List[str]) -> List[Dict[str, Any]]:
+    """Mức độ heuristic cho từng ứng viên (chỉ số bệnh hoặc None, tên bệnh, xác suất) trong 1 lượt NumPy."""
+    if not candidates:
+        return []
+    critical = np.array([bool(_disease_critical[i]) if i is not None and i < len(_disease_critical)
+                         else _is_critical_name(name) for i, name, _ in candidates])
+    sev = severity_scores(np.array([p for _, _, p in candidates], dtype=np.float64), critical,
+                          red_flag_hits(symptoms))
+    return [{"severity_score": float(sev["score"][i]), "severity_level": str(sev["level"][i]),
+             "should_visit_hospital": bool(sev["should_visit_hospital"][i])} for i in range(len(candidates))]
+
+
+def _severity_from_api(disease: str, confidence: float, symptoms: List[str]) -> Optional[Dict[str, Any]]:
+    """API ngoài nếu .env có SEVERITY_API_URL; None khi không cấu hình, lỗi, đang giảm tải hoặc sắp hết deadline."""
     try:
         if load_dotenv:
             load_dotenv(dotenv_path='backend/.env')
         api_url = os.getenv("SEVERITY_API_URL")
         api_key = os.getenv("SEVERITY_API_KEY")
-        if api_url and requests:
+        if api_url and not is_degraded() and deadline.allow("severity_api"):
             payload = {"disease": disease, "confidence": confidence, "symptoms": symptoms}
             headers = {"Content-Type": "application/json"}
             if api_key:
                 headers["Authorization"] = f"Bearer {api_key}"
-            resp = requests.post(api_url, json=payload, headers=headers, timeout=10)
-            if resp.ok:
+            # POST chỉ đọc (tính điểm), thử lại được như GET
+            resp = http_client.post(api_url, json=payload, headers=headers, timeout=deadline.optional_timeout(10),
+                                    retry_unsafe=True)
+            if resp.status_code < 400:
                 data = resp.json()
                 score = float(data.get("severity_score", 0.0))
                 score = max(0.0, min(1.0, score))
@@ -79,43 +376,30 @@ def evaluate_severity(disease: str, confidence: float, symptoms: List[str]) -> D
                 }
     except Exception:
         pass
+    return None
 
-    # 2) Heuristic nội bộ
-    disease_lc = (disease or "").lower()
-    CRITICAL_NAME_KWS = [
-        "nhồi máu", "đột quỵ", "xuất huyết", "suy tim", "suy thận", "ung thư", "nhiễm trùng huyết",
-        "viêm màng não", "viêm cơ tim", "tắc mạch", "phình", "sốc", "suy hô hấp", "hoại tử"
-    ]
-    RED_FLAG_SYMPTOMS = {
-        "đau ngực", "khó thở", "mất ý thức", "liệt", "yếu nửa người", "co giật",
-        "sốt cao", "nôn ra máu", "đi ngoài ra máu", "đau đầu dữ dội", "đau bụng dữ dội",
-        "đau ngực dữ dội", "chảy máu không cầm", "vàng da", "lơ mơ", "đau mắt dữ dội"
-    }
-    syms = {s.strip().lower() for s in (symptoms or [])}
-    has_critical_name = any(kw in disease_lc for kw in CRITICAL_NAME_KWS)
-    red_flag_hits = sum(1 for s in syms if s in RED_FLAG_SYMPTOMS)
-
-    score = 0.0
-    score += 0.35 * max(0.0, min(1.0, confidence))
-    score += 0.4 if has_critical_name else 0.0
-    score += min(0.35, 0.15 * red_flag_hits)
-
-    score = max(0.0, min(1.0, score))
-    level = "Cao" if score >= 0.7 else ("Trung bình" if score >= 0.5 else "Thấp")
-    should_go = score >= 0.7 or red_flag_hits >= 2
 
-    return {
-        "severity_score": score,
-        "severity_level": level,
-        "should_visit_hospital": should_go,
-    }
+def evaluate_severity(disease: str, confidence: float, symptoms: List[str]) -> Dict[str, Any]:
+    """
+    Trả về:
+      - severity_score: 0..1
+      - severity_level: "Cao" | "Trung bình" | "Thấp"
+      - should_visit_hospital: bool
+    Ưu tiên gọi API nếu .env có SEVERITY_API_URL (+ SEVERITY_API_KEY), nếu không dùng heuristic nội bộ
+    (đặc trưng bệnh/triệu chứng tính sẵn lúc load model).
+    Chế độ giảm tải (backend.admission) hoặc request sắp hết deadline (backend.deadline): bỏ qua API ngoài,
+    chỉ dùng heuristic.
+    """
+    return (_severity_from_api(disease, confidence, symptoms)
+            or _candidate_severity([(_disease_index.get(disease), disease, confidence)], symptoms)[0])
 
 
 def _fetch_popular_diseases() -> List[str]:
     """Lấy danh sách bệnh phổ biến từ WHO API (nếu có)."""
     try:
         from backend.who_api import get_popular_diseases
-        data = get_popular_diseases()
+        with stage_timer(PIPELINE, "popular_diseases"):
+            data = get_popular_diseases()
         items = data.get("data", data) if isinstance(data, dict) else data
         names: List[str] = []
         for it in items or []:
@@ -130,30 +414,24 @@ def _fetch_popular_diseases() -> List[str]:
         return []
 
 
-def get_advice(disease: str, confidence: float, symptoms: List[str],
-               severity_level: Optional[str] = None, should_visit_hospital: Optional[bool] = None) -> str:
-    """Sinh lời khuyên đơn giản + động viên."""
-    import random
+FUNNY_TIPS = [
+    "Nhớ giữ tinh thần lạc quan nhé!", "Nghỉ ngơi hợp lý, uống đủ nước nha!",
+    "Bạn là chiến binh, mọi chuyện sẽ ổn!", "Nếu mệt, hãy nhờ người thân hỗ trợ!",
+    "Ăn uống lành mạnh và ngủ đủ giấc!", "Mang sạc dự phòng nếu phải đi viện nhé!"
+]
+
 
+def _advice_parts(disease: str, confidence: float, symptoms: List[str],
+                  severity_level: Optional[str] = None, should_visit_hospital: Optional[bool] = None) -> List[str]:
+    """Phần lời khuyên cố định (không gồm câu động viên ngẫu nhiên) -> có thể cache."""
     if severity_level is None or should_visit_hospital is None:
         sev = evaluate_severity(disease, confidence, symptoms or [])
         severity_level = sev["severity_level"]
         should_visit_hospital = sev["should_visit_hospital"]
 
-    try:
-        with open('backend/data/disease_symptom_mapping.json', encoding='utf-8') as f:
-            _ = {e.get("disease", "").lower() for e in json.load(f) if isinstance(e, dict)}
-    except Exception:
-        pass
-
-    funny_tips = [
-        "Nhớ giữ tinh thần lạc quan nhé!", "Nghỉ ngơi hợp lý, uống đủ nước nha!",
-        "Bạn là chiến binh, mọi chuyện sẽ ổn!", "Nếu mệt, hãy nhờ người thân hỗ trợ!",
-        "Ăn uống lành mạnh và ngủ đủ giấc!", "Mang sạc dự phòng nếu phải đi viện nhé!"
-    ]
-
     parts: List[str] = []
-    pop_names = _fetch_popular_diseases()
+    # Giảm tải: không gọi WHO (enrichment tùy chọn)
+    pop_names = [] if is_degraded() else _fetch_popular_diseases()
     if disease and disease.lower() in pop_names:
         parts.append("Bệnh này đang khá phổ biến, bạn nên theo dõi kỹ triệu chứng.")
 
@@ -164,23 +442,36 @@ def get_advice(disease: str, confidence: float, symptoms: List[str],
             parts.append("Tình trạng trung bình. Nghỉ ngơi, uống đủ nước và theo dõi 24–48 giờ.")
         else:
             parts.append("Tình trạng nhẹ. Nghỉ ngơi và theo dõi thêm.")
+    return parts
 
-    parts.append(random.choice(funny_tips))
+
+def get_advice(disease: str, confidence: float, symptoms: List[str],
+               severity_level: Optional[str] = None, should_visit_hospital: Optional[bool] = None) -> str:
+    """Sinh lời khuyên đơn giản + động viên."""
+    parts = _advice_parts(disease, confidence, symptoms, severity_level, should_visit_hospital)
+    parts.append(random.choice(FUNNY_TIPS))
     return " ".join(parts)
 
 
 def _vn_norm(s: str) -> str:
-    """Chuẩn hóa tiếng Việt: lower, trim, bỏ dấu, rút gọn khoảng trắng."""
-    if not s:
-        return ""
-    s = s.strip().lower()
-    s = unicodedata.normalize("NFD", s)
-    s = "".join(ch for ch in s if unicodedata.category(ch) != "Mn")
-    s = re.sub(r"\s+", " ", s).strip()
-    return s
+    """Chuẩn hóa tiếng Việt không dấu (giữ tên cũ cho code gọi trực tiếp): xem backend.text_norm.fold."""
+    return fold(s)
 
 
-def _load_symptom_synonyms() -> Dict[str, str]:
+def _file_stamp(path: str) -> Optional[Tuple[int, int]]:
+    try:
+        st = os.stat(path)
+        return st.st_size, st.st_mtime_ns
+    except OSError:
+        return None
+
+
+# (khóa: danh sách triệu chứng + file synonyms, bảng tra) -> dựng lại khi model/synonyms đổi
+_lookup_cache: Optional[Tuple[Tuple[Any, ...], Tuple[Dict[str, str], Dict[str, str]]]] = None
+
+
+def _load_symptom_synonyms(exact_map: Dict[str, str], folded_map: Dict[str, str]
+                           ) -> Tuple[Dict[str, str], Dict[str, str]]:
     """
     Đọc backend/data/symptom_synonyms.json (tùy chọn).
     Định dạng gợi ý:
@@ -188,61 +479,73 @@ def _load_symptom_synonyms() -> Dict[str, str]:
       "ho khan": ["ho kh", "ho khô", "cơn ho khan"],
       "sốt": ["sot", "sốt nhẹ", "sốt cao"]
     }
-    Trả về map token_norm -> canonical_symptom_trong_all_symptoms (nếu khớp).
+    Trả về 2 map (giữ dấu, không dấu) token -> canonical_symptom_trong_all_symptoms (nếu khớp).
     """
-    tok2canon: Dict[str, str] = {}
+    exact: Dict[str, str] = {}
+    folded: Dict[str, str] = {}
     try:
-        with open("backend/data/symptom_synonyms.json", encoding="utf-8") as f:
+        with open(SYNONYMS_PATH, encoding="utf-8") as f:
             data = json.load(f)
         if isinstance(data, dict):
-            # Map all_symptoms đã chuẩn hóa -> bản gốc
-            canon_sym_map = { _vn_norm(s): s for s in (all_symptoms or []) }
             for canon, syns in data.items():
-                canon_key = _vn_norm(str(canon))
-                if canon_key not in canon_sym_map:
+                canon_name = exact_map.get(normalize_text(str(canon))) or folded_map.get(fold(str(canon)))
+                if canon_name is None:
                     # Nếu canonical chưa có trong model, bỏ qua để tránh lệch cột
                     continue
-                canon_name = canon_sym_map[canon_key]
-                for w in (syns or []):
-                    if isinstance(w, str):
-                        tok2canon[_vn_norm(w)] = canon_name
                 # Cho phép token đúng canonical cũng map về chính nó
-                tok2canon[canon_key] = canon_name
+                words = [str(canon)] + [w for w in (syns or []) if isinstance(w, str)]
+                for key, fkey in zip(normalize_many(words), fold_many(words)):
+                    exact.setdefault(key, canon_name)
+                    folded.setdefault(fkey, canon_name)
     except Exception:
         pass
-    return tok2canon
+    return exact, folded
+
+
+def _symptom_lookup() -> Tuple[Dict[str, str], Dict[str, str], Dict[str, str], Dict[str, str]]:
+    """
+    Bảng tra (synonyms giữ dấu, triệu chứng giữ dấu, synonyms không dấu, triệu chứng không dấu),
+    chuẩn hóa cả từ điển 1 lần (bulk) thay vì mỗi request.
+    """
+    global _lookup_cache
+    key = (id(all_symptoms), len(all_symptoms), SYNONYMS_PATH, _file_stamp(SYNONYMS_PATH))
+    cached = _lookup_cache
+    if cached is None or cached[0] != key:
+        names = list(all_symptoms or [])
+        exact_map: Dict[str, str] = {}
+        folded_map: Dict[str, str] = {}
+        # Trùng khi bỏ dấu (vd. "đau mắt"/"đau mặt"): bản không dấu giữ triệu chứng đầu tiên
+        for name, k, fk in zip(names, normalize_many(names), fold_many(names)):
+            exact_map.setdefault(k, name)
+            folded_map.setdefault(fk, name)
+        syn_exact, syn_folded = _load_symptom_synonyms(exact_map, folded_map)
+        cached = _lookup_cache = (key, (syn_exact, exact_map, syn_folded, folded_map))
+    return cached[1]
 
 
 def _normalize_input_symptoms(raw_inputs: List[str]) -> List[str]:
     """
     Biến danh sách triệu chứng người dùng -> danh sách triệu chứng đúng cột model.
-    - Ưu tiên map synonyms
-    - Sau đó exact match theo chuẩn hóa
+    - Khớp giữ dấu trước (synonyms rồi tên triệu chứng): "đau mắt" không bị nhầm "đau mặt"
+    - Sau đó khớp không dấu (người dùng gõ "dau mat", "sot")
     - Cuối cùng fuzzy match (rapidfuzz) nếu có, ngưỡng 90
     """
     if not raw_inputs:
         return []
-    canon_sym_map = { _vn_norm(s): s for s in (all_symptoms or []) }
-    synonyms = _load_symptom_synonyms()
+    syn_exact, canon_exact, syn_folded, canon_folded = _symptom_lookup()
     out: List[str] = []
     seen = set()
 
     for token in raw_inputs:
-        t = _vn_norm(token)
-        mapped = None
-
-        # 1) synonyms
-        if t in synonyms:
-            mapped = synonyms[t]
-        # 2) exact theo chuẩn hóa
-        elif t in canon_sym_map:
-            mapped = canon_sym_map[t]
-        # 3) fuzzy match
-        elif rf_process:
-            choices = list(canon_sym_map.keys())
-            best = rf_process.extractOne(t, choices, score_cutoff=90)
-            if best:
-                mapped = canon_sym_map[best[0]]
+        k = normalize_text(token)
+        mapped = syn_exact.get(k) or canon_exact.get(k)
+        if mapped is None:
+            t = fold(token)
+            mapped = syn_folded.get(t) or canon_folded.get(t)
+            if mapped is None and rf_process and t:
+                best = rf_process.extractOne(t, list(canon_folded.keys()), score_cutoff=90)
+                if best:
+                    mapped = canon_folded[best[0]]
 
         if mapped and mapped not in seen:
             seen.add(mapped)
@@ -250,42 +553,418 @@ def _normalize_input_symptoms(raw_inputs: List[str]) -> List[str]:
     return out
 
 
-def predict_disease(input_symptoms: List[str]) -> Dict[str, Any]:
-    """Dự đoán bệnh, đánh giá mức độ và sinh lời khuyên (không dùng GPS/Google Maps)."""
+_text_index_cache: Optional[Tuple[Tuple[Any, ...], KeywordIndex]] = None
+
+
+def _text_index() -> KeywordIndex:
+    """Cụm từ (tên triệu chứng model + synonyms) -> triệu chứng đúng cột model; dựng lại cùng bảng tra."""
+    global _text_index_cache
+    lookup = _symptom_lookup()
+    cached = _text_index_cache
+    if cached is None or cached[0] is not _lookup_cache:
+        syn_exact = lookup[0]
+        phrases = {s: s for s in all_symptoms}
+        for phrase, canon in syn_exact.items():
+            phrases.setdefault(phrase, canon)
+        cached = _text_index_cache = (_lookup_cache, KeywordIndex(phrases))
+    return cached[1]
+
+
+def extract_text_symptoms(text: str) -> Tuple[List[str], List[str]]:
+    """
+    Câu tự do -> (cụm từ đã khớp, triệu chứng đúng cột model) trong 1 lượt quét n-gram:
+    tách từ khóa và chuẩn hóa cùng lúc, ưu tiên cụm dài nhất ("đau đầu dữ dội" thay vì "đau đầu").
+    """
+    if model is None and not all_symptoms:
+        try:
+            _load_model_lazily()
+        except (ImportError, OSError, ValueError):
+            # Danh sách triệu chứng đã nạp trước model: vẫn trích được, dự đoán qua chỉ mục
+            if not RETRIEVAL_FALLBACK:
+                raise
+    matches = _text_index().match(text or "", longest=True)
+    return [phrase for phrase, _ in matches], [canon for _, canon in matches]
+
+
+def analyze_symptoms_text(text: str, explain: bool = False) -> Dict[str, Any]:
+    """Chẩn đoán từ câu mô tả tiếng Việt: trích triệu chứng rồi predict_disease như input dạng list."""
+    with stage_timer(PIPELINE, "extract_text"):
+        phrases, symptoms = extract_text_symptoms(text)
+    if not symptoms:
+        return {"error": True, "message": "Không nhận diện được triệu chứng nào trong câu mô tả",
+                "extracted_symptoms": []}
+    result = predict_disease(symptoms, explain=explain)
+    result["extracted_symptoms"] = phrases
+    return result
+
+
+def predict_texts_batch(texts: List[str], top_k: int = 3) -> List[Dict[str, Any]]:
+    """
+    Chẩn đoán hàng loạt câu mô tả: trích triệu chứng từng câu, gộp tập trùng,
+    1 lần predict theo lô + mức độ vector hóa (severity_batch). Không gọi API ngoài, không lời khuyên.
+    Không có model -> xếp hạng theo chỉ mục triệu chứng từng câu.
+    """
+    extracted = [extract_text_symptoms(t) for t in texts]
+    results: List[Dict[str, Any]] = [
+        {"extracted_symptoms": phrases, "normalized_symptoms": syms} for phrases, syms in extracted]
+    todo = [i for i, (_, syms) in enumerate(extracted) if syms]
+    for i, res in enumerate(results):
+        if not res["normalized_symptoms"]:
+            res["error"] = "Không nhận diện được triệu chứng nào"
+    if not todo:
+        return results
+
     if model is None:
-        load_model()
+        for i in todo:
+            pred = _compute_retrieval_prediction(extracted[i][1])
+            results[i].update({k: pred[k] for k in ("disease", "confidence", "severity_level", "severity_score",
+                                                    "should_visit_hospital", "top_k", "engine")})
+        return results
+
+    # Tập triệu chứng trùng nhau (ghi chú lặp lại) chỉ suy luận 1 lần
+    unique: Dict[Tuple[str, ...], int] = {}
+    rows = [unique.setdefault(tuple(sorted(extracted[i][1])), len(unique)) for i in todo]
+    sets = [list(k) for k in unique]
+    with stage_timer(PIPELINE, "batch_inference"):
+        X = encode_symptom_sets(sets)
+        probs = np.asarray(model.predict(X, verbose=0, batch_size=max(1, min(len(X), 1024))))
+    with stage_timer(PIPELINE, "batch_severity"):
+        sev = severity_batch(probs, X, top_k=top_k)
+    for i, r in zip(todo, rows):
+        top = [{
+            "disease": all_diseases[int(sev["disease_idx"][r, j])],
+            "prob": float(sev["prob"][r, j]),
+            "severity": {"severity_score": float(sev["score"][r, j]), "severity_level": str(sev["level"][r, j]),
+                         "should_visit_hospital": bool(sev["should_visit_hospital"][r, j])},
+        } for j in range(sev["prob"].shape[1])]
+        results[i].update({
+            "disease": top[0]["disease"],
+            "confidence": top[0]["prob"],
+            **top[0]["severity"],
+            "top_k": top,
+            "engine": INFERENCE_ENGINE,
+        })
+    return results
+
+
+def _compute_prediction(norm_syms: List[str]) -> Dict[str, Any]:
+    """Suy luận + đánh giá mức độ + lời khuyên cố định cho 1 tập triệu chứng đã chuẩn hóa."""
+    engine = INFERENCE_ENGINE
+    probs = None
+    hit = _lookup_precomputed(norm_syms)
+    if hit is not None:
+        ranked = [(int(i), float(p)) for i, p in zip(*hit)]
+        engine = "precomputed"
+    else:
+        with stage_timer(PIPELINE, "encode"):
+            input_vec = encode_symptom_sets([norm_syms])
+        with stage_timer(PIPELINE, "inference"):
+            pred = model.predict(input_vec, verbose=0)
+        probs = pred[0]
+        ranked = [(int(i), float(probs[i])) for i in np.argsort(probs)[-3:][::-1]]
+    predicted_disease, confidence = all_diseases[ranked[0][0]], ranked[0][1]
+
+    # Top-K gợi ý, mỗi ứng viên kèm mức độ (heuristic vector hóa)
+    top_k = [{"disease": all_diseases[i], "prob": p} for i, p in ranked[:3]]
+
+    with stage_timer(PIPELINE, "severity"):
+        candidates = _candidate_severity([(i, all_diseases[i], p) for i, p in ranked[:3]], norm_syms)
+        for item, cand in zip(top_k, candidates):
+            item["severity"] = cand
+        sev = _severity_from_api(predicted_disease, confidence, norm_syms or []) or candidates[0]
+    with stage_timer(PIPELINE, "advice"):
+        advice_parts = _advice_parts(predicted_disease, confidence, norm_syms, sev["severity_level"], sev["should_visit_hospital"])
+    with stage_timer(PIPELINE, "serialize_probabilities"):
+        if probs is None:
+            # Trả lời từ bảng: chỉ có top-k đã lưu
+            all_probabilities = {all_diseases[i]: p for i, p in ranked}
+        else:
+            all_probabilities = {d: float(p) for d, p in zip(all_diseases, probs)}
+    with stage_timer(PIPELINE, "explain"):
+        _attach_matched_symptoms(top_k, norm_syms)
 
-    # CHUẨN HÓA TRIỆU CHỨNG
-    norm_syms = _normalize_input_symptoms([s for s in (input_symptoms or []) if isinstance(s, str)])
-    sym_set = set(norm_syms)
+    return {
+        "disease": predicted_disease,
+        "confidence": confidence,
+        "severity_level": sev["severity_level"],
+        "severity_score": sev["severity_score"],
+        "advice_parts": advice_parts,
+        "should_visit_hospital": sev["should_visit_hospital"],
+        "top_k": top_k,
+        "all_probabilities": all_probabilities,
+        "engine": engine,
+    }
 
-    input_vec = np.array([[int(symptom in sym_set) for symptom in all_symptoms]], dtype=np.float32)
-    pred = model.predict(input_vec, verbose=0)
-    probs = pred[0]
-    idx = int(np.argmax(probs))
-    predicted_disease = all_diseases[idx]
-    confidence = float(probs[idx])
 
-    # Top-K gợi ý
-    top_k_idx = np.argsort(probs)[-3:][::-1]
-    top_k = [{"disease": all_diseases[i], "prob": float(probs[i])} for i in top_k_idx]
+def _lookup_precomputed(norm_syms: List[str]) -> Optional[Tuple[np.ndarray, np.ndarray]]:
+    """Top-k (chỉ số bệnh, xác suất) từ bảng tính sẵn của đúng model_version, None nếu không có."""
+    if not TOPK_TABLE or not norm_syms:
+        return None
+    with stage_timer(PIPELINE, "precomputed_lookup"):
+        table = topk_table.get_table(model_version, auto_build=TOPK_TABLE_AUTO_BUILD)
+        if table is None:
+            return None
+        hit = table.lookup([_symptom_index[s] for s in norm_syms if s in _symptom_index])
+    topk_table.record_lookup(hit is not None)
+    return hit
 
-    sev = evaluate_severity(predicted_disease, confidence, norm_syms or [])
-    advice = get_advice(predicted_disease, confidence, norm_syms, sev["severity_level"], sev["should_visit_hospital"])
+
+def _attach_matched_symptoms(top_k: List[Dict[str, Any]], norm_syms: List[str]) -> None:
+    """Giải thích: triệu chứng input nào có trong mapping của từng bệnh gợi ý."""
+    try:
+        index = get_retrieval_index()
+    except (OSError, ValueError):
+        return
+    for item in top_k:
+        item["matched_symptoms"] = index.matched_symptoms(item["disease"], norm_syms)
+
+
+def _compute_retrieval_prediction(norm_syms: List[str]) -> Dict[str, Any]:
+    """
+    Dự đoán không cần TensorFlow: xếp hạng bệnh theo độ trùng triệu chứng (BM25).
+    confidence = tỉ lệ triệu chứng input khớp với bệnh đứng đầu.
+    """
+    with stage_timer(PIPELINE, "retrieval"):
+        hits = get_retrieval_index().search(norm_syms, top_k=3)
+    total = sum(h["score"] for h in hits) or 1.0
+    top_k = [{"disease": h["disease"], "prob": h["score"] / total, "matched_symptoms": h["matched_symptoms"]}
+             for h in hits]
+    if hits:
+        predicted_disease, confidence = hits[0]["disease"], float(hits[0]["coverage"])
+    else:
+        predicted_disease, confidence = "Không xác định", 0.0
+
+    with stage_timer(PIPELINE, "severity"):
+        candidates = _candidate_severity([(_disease_index.get(t["disease"]), t["disease"], t["prob"]) for t in top_k],
+                                         norm_syms)
+        for item, cand in zip(top_k, candidates):
+            item["severity"] = cand
+        sev = evaluate_severity(predicted_disease, confidence, norm_syms or [])
+    with stage_timer(PIPELINE, "advice"):
+        advice_parts = _advice_parts(predicted_disease, confidence, norm_syms, sev["severity_level"], sev["should_visit_hospital"])
 
     return {
         "disease": predicted_disease,
         "confidence": confidence,
         "severity_level": sev["severity_level"],
         "severity_score": sev["severity_score"],
-        "advice": advice,
+        "advice_parts": advice_parts,
         "should_visit_hospital": sev["should_visit_hospital"],
         "top_k": top_k,
+        "all_probabilities": {t["disease"]: t["prob"] for t in top_k},
+        "engine": "retrieval",
+    }
+
+
+def rescore_candidates(input_symptoms: List[str], top_k: int = 5, candidates: int = RETRIEVAL_CANDIDATES,
+                       method: str = "bm25") -> List[Dict[str, Any]]:
+    """
+    Lọc ứng viên bằng chỉ mục triệu chứng rồi model chấm lại trong tập ứng viên
+    (xác suất chuẩn hóa lại trên các ứng viên). Không có model -> giữ thứ hạng theo chỉ mục.
+    """
+    if model is None:
+        try:
+            _load_model_lazily()
+        except (ImportError, OSError, ValueError):
+            if not RETRIEVAL_FALLBACK:
+                raise
+    norm_syms = _normalize_input_symptoms([s for s in (input_symptoms or []) if isinstance(s, str)])
+    hits = get_retrieval_index().search(norm_syms, top_k=max(top_k, candidates), method=method)
+    if model is None or not hits:
+        return [{"disease": h["disease"], "prob": None, "retrieval_score": h["score"],
+                 "matched_symptoms": h["matched_symptoms"]} for h in hits[:top_k]]
+
+    disease_index = {d: i for i, d in enumerate(all_diseases)}
+    probs = predict_proba_batch([norm_syms], normalized=True)[0]
+    scored = [(float(probs[disease_index[h["disease"]]]) if h["disease"] in disease_index else 0.0, h) for h in hits]
+    total = sum(p for p, _ in scored) or 1.0
+    scored.sort(key=lambda x: (x[0], x[1]["score"]), reverse=True)
+    return [{"disease": h["disease"], "prob": p / total, "retrieval_score": h["score"],
+             "matched_symptoms": h["matched_symptoms"]} for p, h in scored[:top_k]]
+
+
+def encode_symptom_sets(symptom_sets: List[List[str]]) -> np.ndarray:
+    """Mã hóa nhiều tập triệu chứng (đã chuẩn hóa) thành ma trận one-hot (n, len(all_symptoms))."""
+    X = np.zeros((len(symptom_sets), len(all_symptoms)), dtype=np.float32)
+    for row, syms in enumerate(symptom_sets):
+        cols = [_symptom_index[s] for s in syms if s in _symptom_index]
+        X[row, cols] = 1.0
+    return X
+
+
+def predict_proba_batch(symptom_sets: List[List[str]], normalized: bool = False) -> np.ndarray:
+    """
+    Suy luận theo lô: trả về ma trận xác suất (n, len(all_diseases)) sau 1 lần model.predict.
+    Không đánh giá mức độ/lời khuyên (dùng cho benchmark, đánh giá, xử lý hàng loạt).
+    """
+    if model is None:
+        _load_model_lazily()
+    if not normalized:
+        symptom_sets = [_normalize_input_symptoms([s for s in (syms or []) if isinstance(s, str)])
+                        for syms in symptom_sets]
+    X = encode_symptom_sets(symptom_sets)
+    return np.asarray(model.predict(X, verbose=0, batch_size=max(1, min(len(X), 1024))))
+
+
+def _occlusion_contributions(syms: List[str], top_k: int) -> Tuple[np.ndarray, List[int], np.ndarray]:
+    """
+    Leave-one-out trong 1 lô: hàng 0 = input gốc, hàng i = bỏ triệu chứng i-1.
+    contribution[j, i] = p(bệnh j | đủ) - p(bệnh j | bỏ triệu chứng i).
+    """
+    X = encode_symptom_sets([syms] + [syms[:i] + syms[i + 1:] for i in range(len(syms))])
+    probs = np.asarray(model.predict(X, verbose=0, batch_size=len(X)))
+    disease_idx = [int(i) for i in np.argsort(probs[0])[-top_k:][::-1]]
+    picked = probs[:, disease_idx]
+    return probs[0], disease_idx, picked[0][:, None] - picked[1:].T
+
+
+def _gradient_contributions(syms: List[str], top_k: int) -> Tuple[np.ndarray, List[int], np.ndarray]:
+    """
+    gradient×input: nhân bản input k lần, hàng j lấy đạo hàm xác suất bệnh top-j
+    -> 1 forward + 1 backward cho cả top-k. Input one-hot nên gradient×input = gradient tại cột có mặt.
+    """
+    if tf is None or not isinstance(model, keras.Model):
+        raise ValueError("gradient chỉ hỗ trợ engine keras")
+    cols = [_symptom_index[s] for s in syms]
+    x = tf.constant(np.repeat(encode_symptom_sets([syms]), top_k, axis=0))
+    with tf.GradientTape() as tape:
+        tape.watch(x)
+        out = model(x, training=False)
+        probs = out[0].numpy()
+        disease_idx = [int(i) for i in np.argsort(probs)[-top_k:][::-1]]
+        target = tf.reduce_sum(tf.gather_nd(out, [[j, d] for j, d in enumerate(disease_idx)]))
+    grads = tape.gradient(target, x).numpy()
+    return probs, disease_idx, grads[:len(disease_idx), cols]
+
+
+def explain_prediction(norm_syms: List[str], top_k: int = EXPLAIN_TOP_K,
+                       method: str = EXPLAIN_METHOD) -> Dict[str, Any]:
+    """
+    Đóng góp của từng triệu chứng input cho top-k bệnh (sắp giảm dần theo đóng góp).
+    Chi phí ~ 1 lần suy luận: mọi biến thể được chấm trong cùng 1 lô (hoặc 1 lượt backward).
+    """
+    if model is None:
+        _load_model_lazily()
+    syms = [s for s in dict.fromkeys(norm_syms) if s in _symptom_index]
+    top_k = max(1, min(top_k, len(all_diseases)))
+    if method == "gradient" and syms:
+        try:
+            probs, disease_idx, contrib = _gradient_contributions(syms, top_k)
+        except ValueError:
+            method = "occlusion"
+    if method != "gradient" or not syms:
+        method = "occlusion"
+        probs, disease_idx, contrib = _occlusion_contributions(syms, top_k)
+    return {
+        "method": method,
+        "symptoms": syms,
+        "diseases": [{
+            "disease": all_diseases[d],
+            "prob": float(probs[d]),
+            "contributions": sorted(
+                ({"symptom": s, "contribution": float(c)} for s, c in zip(syms, contrib[row])),
+                key=lambda item: item["contribution"], reverse=True),
+        } for row, d in enumerate(disease_idx)],
+    }
+
+
+def _prediction_key(norm_syms: List[str]) -> Tuple[str, Tuple[str, ...]]:
+    return model_version, tuple(sorted(norm_syms))
+
+
+def predict_disease(input_symptoms: List[str], explain: bool = False) -> Dict[str, Any]:
+    """
+    Dự đoán bệnh, đánh giá mức độ và sinh lời khuyên (không dùng GPS/Google Maps).
+    explain=True: thêm "explanation" = đóng góp từng triệu chứng cho top-k bệnh (None nếu đang dùng chỉ mục).
+    """
+    start = time.perf_counter()
+    with stage_timer(PIPELINE, "total"):
+        result = _predict_disease(input_symptoms)
+        if explain:
+            result["explanation"] = _cached_explanation(result["normalized_symptoms"]) if model is not None else None
+    # Chỉ đẩy vào ring buffer, luồng nền ghi đĩa theo lô
+    log_prediction(input_symptoms, result, model_version, time.perf_counter() - start)
+    return result
+
+
+def _cached_explanation(norm_syms: List[str]) -> Dict[str, Any]:
+    key = ("explain", EXPLAIN_METHOD) + _prediction_key(norm_syms)
+    cached = _PREDICT_CACHE.get(key)
+    if cached is None:
+        with stage_timer(PIPELINE, "explain_contributions"):
+            cached = explain_prediction(norm_syms)
+        _PREDICT_CACHE.set(key, cached)
+    return cached
+
+
+def _predict_disease(input_symptoms: List[str]) -> Dict[str, Any]:
+    if model is None:
+        try:
+            with stage_timer(PIPELINE, "load_model"):
+                _load_model_lazily()
+        except (ImportError, OSError, ValueError):
+            if not RETRIEVAL_FALLBACK:
+                raise
+
+    # CHUẨN HÓA TRIỆU CHỨNG
+    with stage_timer(PIPELINE, "normalize"):
+        raw = [s for s in (input_symptoms or []) if isinstance(s, str)]
+        # Không có danh sách triệu chứng của model -> giữ input, chỉ mục tự chuẩn hóa
+        norm_syms = _normalize_input_symptoms(raw) if all_symptoms else [s.strip() for s in raw if s.strip()]
+
+    # Cache + gộp request trùng: thứ tự/dấu khác nhau vẫn cùng key sau chuẩn hóa
+    if model is None:
+        key = ("retrieval-" + get_retrieval_index().version, tuple(sorted(norm_syms)))
+        compute_fn = _compute_retrieval_prediction
+    else:
+        key = _prediction_key(norm_syms)
+        compute_fn = _compute_prediction
+    base = _PREDICT_CACHE.get(key)
+    if base is None:
+        def compute() -> Dict[str, Any]:
+            before = len(deadline.skipped_stages())
+            res = compute_fn(norm_syms)
+            res["degraded"] = is_degraded()
+            # Request gộp (SingleFlight) nhận cùng kết quả: mang theo các giai đoạn bị bỏ qua
+            res["skipped_stages"] = deadline.skipped_stages()[before:]
+            # Kết quả thiếu enrichment không cache, request sau lúc hết tải/đủ thời gian sẽ tính đủ
+            if not res["degraded"] and not res["skipped_stages"]:
+                _PREDICT_CACHE.set(key, res)
+            return res
+        base = _PREDICT_FLIGHT.do(key, compute)
+
+    # Câu động viên vẫn chọn ngẫu nhiên cho từng response
+    return {
+        "disease": base["disease"],
+        "confidence": base["confidence"],
+        "severity_level": base["severity_level"],
+        "severity_score": base["severity_score"],
+        "advice": " ".join(base["advice_parts"] + [random.choice(FUNNY_TIPS)]),
+        "should_visit_hospital": base["should_visit_hospital"],
+        "top_k": [dict(t, severity=dict(t["severity"])) if "severity" in t else dict(t) for t in base["top_k"]],
         "normalized_symptoms": norm_syms,
-        "all_probabilities": {d: float(p) for d, p in zip(all_diseases, probs)},
+        "all_probabilities": dict(base["all_probabilities"]),
+        "engine": base["engine"],
+        "degraded": base.get("degraded", False),
+        "skipped_stages": list(base.get("skipped_stages", [])),
     }
 
 
+def predict_cache_stats() -> Dict[str, Any]:
+    """Thống kê cache dự đoán (hit ratio, số request được gộp)."""
+    stats = _PREDICT_CACHE.stats()
+    stats["coalesced"] = _PREDICT_FLIGHT.coalesced
+    stats["model_version"] = model_version
+    stats["precomputed"] = topk_table.table_stats()
+    return stats
+
+
+REGISTRY.gauge(
+    "jaremis_predict_cache", "Thống kê cache kết quả predict_disease", ("stat",),
+    lambda: {(k,): float(v) for k, v in predict_cache_stats().items() if isinstance(v, (int, float))},
+)
+
+
 if __name__ == "__main__":
     try:
         user_input = input("Nhập các triệu chứng cách nhau bởi dấu phẩy (ví dụ: đau đầu, sốt, ho):\n> ")
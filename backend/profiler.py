@@ -0,0 +1,274 @@
+import hmac
+import os
+import sys
+import threading
+import time
+import tracemalloc
+from collections import Counter
+from typing import Any, Dict, List, Optional, Set
+
+# Token admin cho endpoint profiler; không cấu hình -> endpoint bị tắt
+ADMIN_TOKEN_ENV = "ADMIN_TOKEN"
+
+MAX_SECONDS = 120.0
+DEFAULT_INTERVAL = 0.005  # 5ms ~ 200 mẫu/giây, overhead thấp
+
+# Khoá WSGI environ: request đã được hook route profiler của lớp ASGI bao ngoài (backend/asgi.py)
+PROFILED_ENVIRON_KEY = "jaremis.route_profiled"
+
+# Frame "chờ" (luồng rảnh) bị bỏ qua khi lấy mẫu toàn bộ luồng
+_IDLE_FILES = ("threading.py", "selectors.py", "queue.py", "socketserver.py", "base_events.py", "thread.py")
+_IDLE_FUNCS = {"wait", "select", "get", "_worker", "serve_forever", "_run_once", "run_forever", "accept", "poll"}
+
+
+def check_admin_token(provided: Optional[str]) -> bool:
+    expected = os.getenv(ADMIN_TOKEN_ENV) or ""
+    if not expected or not provided:
+        return False
+    if provided.startswith("Bearer "):
+        provided = provided[len("Bearer "):]
+    return hmac.compare_digest(provided.encode(), expected.encode())
+
+
+def _frame_label(frame) -> str:
+    code = frame.f_code
+    return f"{code.co_name} ({os.path.basename(code.co_filename)}:{code.co_firstlineno})"
+
+
+def _is_idle(frame) -> bool:
+    code = frame.f_code
+    return code.co_name in _IDLE_FUNCS and code.co_filename.endswith(_IDLE_FILES)
+
+
+class SamplingProfiler:
+    """
+    Profiler lấy mẫu: 1 luồng nền đọc sys._current_frames() mỗi `interval` giây
+    và đếm stack (gốc -> lá) dạng "collapsed" (flamegraph.pl / speedscope đọc được).
+    - thread_ids: chỉ lấy mẫu các luồng này (None = mọi luồng, bỏ luồng rảnh)
+    """
+
+    def __init__(self, interval: float = DEFAULT_INTERVAL, max_depth: int = 128,
+                 allocations: bool = True, alloc_frames: int = 16):
+        self.interval = max(0.001, float(interval))
+        self.max_depth = max_depth
+        self.allocations = allocations
+        self.alloc_frames = alloc_frames
+        self.thread_ids: Optional[Set[int]] = None
+        self.exclude: Set[int] = set()
+        self.stacks: Counter = Counter()
+        self.samples = 0
+        self._stop = threading.Event()
+        self._thread: Optional[threading.Thread] = None
+        self._started_tracemalloc = False
+        self._t0 = 0.0
+        self.duration = 0.0
+        self._alloc_snapshot = None
+
+    def start(self) -> None:
+        if self.allocations and not tracemalloc.is_tracing():
+            tracemalloc.start(self.alloc_frames)
+            self._started_tracemalloc = True
+        self._t0 = time.perf_counter()
+        self._thread = threading.Thread(target=self._run, name="jaremis-profiler", daemon=True)
+        self._thread.start()
+
+    def stop(self) -> None:
+        self._stop.set()
+        if self._thread is not None:
+            self._thread.join()
+        self.duration = time.perf_counter() - self._t0
+        if self.allocations and tracemalloc.is_tracing():
+            self._alloc_snapshot = tracemalloc.take_snapshot()
+            if self._started_tracemalloc:
+                tracemalloc.stop()
+
+    def _run(self) -> None:
+        own = threading.get_ident()
+        names = {}
+        while not self._stop.wait(self.interval):
+            wanted = self.thread_ids
+            if wanted is not None and not wanted:
+                continue
+            if len(names) != threading.active_count():
+                names = {t.ident: t.name for t in threading.enumerate()}
+            for tid, frame in sys._current_frames().items():
+                if tid == own or tid in self.exclude or (wanted is not None and tid not in wanted):
+                    continue
+                if wanted is None and _is_idle(frame):
+                    continue
+                labels: List[str] = []
+                f = frame
+                while f is not None and len(labels) < self.max_depth:
+                    labels.append(_frame_label(f))
+                    f = f.f_back
+                labels.append(names.get(tid, f"thread-{tid}"))
+                self.stacks[";".join(reversed(labels))] += 1
+                self.samples += 1
+
+    def collapsed(self) -> str:
+        return "".join(f"{stack} {count}\n" for stack, count in self.stacks.most_common())
+
+    def allocation_hotspots(self, limit: int = 25) -> List[Dict[str, Any]]:
+        if self._alloc_snapshot is None:
+            return []
+        snap = self._alloc_snapshot.filter_traces([
+            tracemalloc.Filter(False, tracemalloc.__file__),
+            tracemalloc.Filter(False, __file__),
+        ])
+        out = []
+        for stat in snap.statistics("traceback")[:limit]:
+            frames = stat.traceback
+            out.append({
+                "location": f"{frames[0].filename}:{frames[0].lineno}",
+                "size_kb": round(stat.size / 1024, 1),
+                "count": stat.count,
+                "traceback": [f"{fr.filename}:{fr.lineno}" for fr in frames],
+            })
+        return out
+
+    def result(self, mode: str, **extra: Any) -> Dict[str, Any]:
+        top = [{"stack": s, "samples": c} for s, c in self.stacks.most_common(20)]
+        res = {
+            "mode": mode,
+            "duration_s": round(self.duration, 3),
+            "interval_s": self.interval,
+            "samples": self.samples,
+            "top_stacks": top,
+            "collapsed": self.collapsed(),
+            "allocations": self.allocation_hotspots(),
+        }
+        res.update(extra)
+        return res
+
+
+# ===== Phiên profiling dùng chung cho process (chỉ 1 phiên tại 1 thời điểm) =====
+_session_lock = threading.Lock()
+_busy = False
+
+
+class ProfilerBusy(RuntimeError):
+    pass
+
+
+def _acquire() -> None:
+    global _busy
+    with _session_lock:
+        if _busy:
+            raise ProfilerBusy("Đang có phiên profiling khác chạy")
+        _busy = True
+
+
+def _release() -> None:
+    global _busy
+    with _session_lock:
+        _busy = False
+
+
+def profile_for(seconds: float, interval: float = DEFAULT_INTERVAL, allocations: bool = True) -> Dict[str, Any]:
+    """Lấy mẫu mọi luồng đang bận trong `seconds` giây (chặn luồng gọi tới khi xong)."""
+    seconds = max(0.1, min(MAX_SECONDS, float(seconds)))
+    _acquire()
+    try:
+        prof = SamplingProfiler(interval=interval, allocations=allocations)
+        prof.exclude.add(threading.get_ident())  # bỏ chính luồng đang chờ profile
+        prof.start()
+        time.sleep(seconds)
+        prof.stop()
+        return prof.result("duration", seconds=seconds)
+    finally:
+        _release()
+
+
+class RouteProfiler:
+    """
+    Profile K request kế tiếp của 1 route: arm(route, k) rồi các hook
+    enter(route)/exit(route) quanh handler đánh dấu luồng cần lấy mẫu.
+    - thread_ident=None ở enter(): không biết luồng chạy handler (vd. FastAPI
+      endpoint đồng bộ chạy trong threadpool) -> lấy mẫu mọi luồng bận trong lúc request chạy.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.route: Optional[str] = None
+        self.remaining = 0
+        self.requested = 0
+        self._profiler: Optional[SamplingProfiler] = None
+        self._active: Dict[int, int] = {}
+        self._all_threads = 0
+        self.last_result: Optional[Dict[str, Any]] = None
+
+    def arm(self, route: str, requests: int, interval: float = DEFAULT_INTERVAL, allocations: bool = True) -> None:
+        _acquire()
+        with self._lock:
+            self.route = route
+            self.remaining = self.requested = max(1, int(requests))
+            self.last_result = None
+            self._active.clear()
+            self._all_threads = 0
+            self._profiler = SamplingProfiler(interval=interval, allocations=allocations)
+            self._profiler.thread_ids = set()
+            self._profiler.start()
+
+    def status(self) -> Dict[str, Any]:
+        with self._lock:
+            return {
+                "armed": self._profiler is not None,
+                "route": self.route,
+                "requested": self.requested,
+                "remaining": self.remaining,
+                "has_result": self.last_result is not None,
+            }
+
+    def enter(self, route: str, thread_ident: Optional[int] = None) -> bool:
+        if self._profiler is None or route != self.route:
+            return False
+        with self._lock:
+            prof = self._profiler
+            if prof is None or self.remaining <= 0:
+                return False
+            if thread_ident is None:
+                self._all_threads += 1
+                prof.thread_ids = None
+            else:
+                self._active[thread_ident] = self._active.get(thread_ident, 0) + 1
+                if self._all_threads == 0:
+                    prof.thread_ids = set(self._active)
+            return True
+
+    def exit(self, route: str, thread_ident: Optional[int] = None) -> None:
+        with self._lock:
+            prof = self._profiler
+            if prof is None or route != self.route:
+                return
+            if thread_ident is None:
+                self._all_threads = max(0, self._all_threads - 1)
+            elif thread_ident in self._active:
+                self._active[thread_ident] -= 1
+                if self._active[thread_ident] <= 0:
+                    del self._active[thread_ident]
+            if self._all_threads == 0:
+                prof.thread_ids = set(self._active)
+            self.remaining -= 1
+            if self.remaining > 0:
+                return
+            self._profiler = None
+        prof.stop()
+        with self._lock:
+            self.last_result = prof.result("route", route=route, requests=self.requested)
+        _release()
+
+    def cancel(self) -> Optional[Dict[str, Any]]:
+        with self._lock:
+            prof = self._profiler
+            self._profiler = None
+        if prof is None:
+            return None
+        prof.stop()
+        with self._lock:
+            self.last_result = prof.result("route", route=self.route, requests=self.requested - self.remaining,
+                                           cancelled=True)
+        _release()
+        return self.last_result
+
+
+route_profiler = RouteProfiler()
@@ -0,0 +1,150 @@
+import heapq
+import math
+import os
+import threading
+from collections import defaultdict
+from typing import Any, Callable, Dict, List, Optional, Tuple
+
+from backend.mapping_io import MAPPING_PATH, load_mapping
+from backend.text_norm import fold
+
+# Tham số BM25 chuẩn
+BM25_K1 = 1.2
+BM25_B = 0.75
+
+
+def _default_norm(s: str) -> str:
+    return fold(s)
+
+
+class SymptomIndex:
+    """
+    Chỉ mục ngược triệu chứng -> các bệnh có triệu chứng đó (từ disease_symptom_mapping).
+    Mỗi bệnh = hợp các tập triệu chứng của mọi dòng mapping cùng tên bệnh;
+    tf = số dòng của bệnh có liệt kê triệu chứng.
+    Trọng số BM25 của từng posting được tính sẵn nên truy vấn chỉ là cộng dồn.
+    """
+
+    def __init__(self, mapping: List[Dict[str, Any]], normalize: Callable[[str], str] = _default_norm,
+                 version: str = ""):
+        self.normalize = normalize
+        self.version = version
+        self.diseases: List[str] = []
+        disease_id: Dict[str, int] = {}
+        tf: List[Dict[str, int]] = []
+        self.display: Dict[str, str] = {}
+
+        for item in mapping:
+            name = str(item["disease"])
+            did = disease_id.get(name)
+            if did is None:
+                did = disease_id[name] = len(self.diseases)
+                self.diseases.append(name)
+                tf.append({})
+            for raw in item["symptoms"]:
+                if not isinstance(raw, str):
+                    continue
+                key = normalize(raw)
+                if not key:
+                    continue
+                self.display.setdefault(key, raw)
+                tf[did][key] = tf[did].get(key, 0) + 1
+
+        self.disease_id = disease_id
+        self.disease_keys = [frozenset(t) for t in tf]
+        self.doc_len = [len(t) for t in tf]
+        n = len(self.diseases)
+        avgdl = (sum(self.doc_len) / n) if n else 1.0
+
+        df: Dict[str, int] = defaultdict(int)
+        for t in tf:
+            for key in t:
+                df[key] += 1
+        self.idf = {k: math.log(1.0 + (n - d + 0.5) / (d + 0.5)) for k, d in df.items()}
+
+        # postings: symptom -> [(disease_id, trọng số bm25)]
+        self.postings: Dict[str, List[Tuple[int, float]]] = defaultdict(list)
+        for did, t in enumerate(tf):
+            norm_len = 1.0 - BM25_B + BM25_B * self.doc_len[did] / avgdl
+            for key, f in t.items():
+                w = self.idf[key] * f * (BM25_K1 + 1.0) / (f + BM25_K1 * norm_len)
+                self.postings[key].append((did, w))
+        self.postings = dict(self.postings)
+
+    def __len__(self) -> int:
+        return len(self.diseases)
+
+    def symptoms_of(self, disease: str) -> List[str]:
+        did = self.disease_id.get(disease)
+        if did is None:
+            return []
+        return [self.display[k] for k in sorted(self.disease_keys[did])]
+
+    def search(self, symptoms: List[str], top_k: int = 5, method: str = "bm25",
+               min_matches: int = 1) -> List[Dict[str, Any]]:
+        """
+        Top-k bệnh chia sẻ nhiều triệu chứng nhất với input.
+        method: "bm25" (ưu tiên triệu chứng hiếm) | "jaccard" (|giao| / |hợp|).
+        """
+        query: List[str] = []
+        for s in symptoms or []:
+            key = self.normalize(s) if isinstance(s, str) else ""
+            if key and key not in query:
+                query.append(key)
+
+        scores: Dict[int, float] = defaultdict(float)
+        matched: Dict[int, List[str]] = defaultdict(list)
+        for key in query:
+            for did, w in self.postings.get(key, ()):
+                scores[did] += w
+                matched[did].append(key)
+
+        if method == "jaccard":
+            for did in scores:
+                m = len(matched[did])
+                scores[did] = m / (len(query) + self.doc_len[did] - m)
+
+        best = heapq.nlargest(
+            top_k,
+            (did for did in scores if len(matched[did]) >= min_matches),
+            key=lambda did: (scores[did], len(matched[did])),
+        )
+        return [{
+            "disease": self.diseases[did],
+            "score": float(scores[did]),
+            "matched_symptoms": [self.display[k] for k in matched[did]],
+            "coverage": len(matched[did]) / len(query) if query else 0.0,
+        } for did in best]
+
+    def matched_symptoms(self, disease: str, symptoms: List[str]) -> List[str]:
+        """Các triệu chứng input có trong danh sách triệu chứng của bệnh (giải thích kết quả)."""
+        did = self.disease_id.get(disease)
+        if did is None:
+            return []
+        keys = self.disease_keys[did]
+        return [s for s in symptoms or [] if self.normalize(s) in keys]
+
+
+_index: Optional[SymptomIndex] = None
+_index_stamp: Optional[Tuple[int, int]] = None
+_index_lock = threading.Lock()
+
+
+def get_index(path: str = MAPPING_PATH) -> SymptomIndex:
+    """Index dùng chung, tự build lại khi file mapping thay đổi (vd. /add/training-data)."""
+    global _index, _index_stamp
+    try:
+        st = os.stat(path)
+        stamp = (st.st_size, st.st_mtime_ns)
+    except OSError:
+        stamp = None
+    if _index is None or stamp != _index_stamp:
+        with _index_lock:
+            if _index is None or stamp != _index_stamp:
+                _index = SymptomIndex(load_mapping(path), version="%s-%s" % (stamp or ("missing", "")))
+                _index_stamp = stamp
+    return _index
+
+
+def search_diseases(symptoms: List[str], top_k: int = 5, method: str = "bm25") -> List[Dict[str, Any]]:
+    return get_index().search(symptoms, top_k=top_k, method=method)
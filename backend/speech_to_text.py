@@ -1,6 +1,84 @@
-from gtts import gTTS
-import uuid
+"""
+Nhận dạng giọng nói (STT) với backend thay được, chọn bằng STT_BACKEND:
+
+- "google": speech_recognition + Google Web Speech (cần mạng, gói tùy chọn)
+- "fake": offline, tất định (đoạn thứ i -> cụm thứ i trong STT_FAKE_TEXT, ngăn bởi '|') để test/dev
+- register_stt_backend(name, factory) để gắn backend khác (Whisper, Vosk, ...)
+
+Backend nhận từng đoạn tiếng nói đã cắt im lặng (pydub AudioSegment) -> text.
+"""
 import os
+import threading
+import uuid
+from typing import Callable, Dict, List, Optional
+
+from gtts import gTTS
+from pydub import AudioSegment
+
+try:
+    import speech_recognition as sr
+except ImportError:
+    sr = None
+
+STT_BACKEND = os.getenv("STT_BACKEND", "google" if sr is not None else "fake")
+STT_LANGUAGE = os.getenv("STT_LANGUAGE", "vi-VN")
+STT_FAKE_TEXT = os.getenv("STT_FAKE_TEXT", "Đây là kết quả giả lập từ giọng nói")
+
+
+class FakeSTT:
+    """Không cần mạng/model: trả cụm văn bản cấu hình sẵn theo thứ tự đoạn, hết cụm -> ""."""
+
+    name = "fake"
+
+    def __init__(self, text: Optional[str] = None):
+        self.phrases = [p.strip() for p in (STT_FAKE_TEXT if text is None else text).split("|") if p.strip()]
+
+    def transcribe(self, audio: AudioSegment, index: int = 0) -> str:
+        return self.phrases[index] if index < len(self.phrases) else ""
+
+
+class GoogleSTT:
+    """Google Web Speech qua speech_recognition; đoạn không nhận ra được -> "", lỗi mạng/API -> RuntimeError."""
+
+    name = "google"
+
+    def __init__(self, language: str = STT_LANGUAGE):
+        if sr is None:
+            raise RuntimeError("Chưa cài speech_recognition (pip install SpeechRecognition)")
+        self.language = language
+        self._recognizer = sr.Recognizer()
+
+    def transcribe(self, audio: AudioSegment, index: int = 0) -> str:
+        data = sr.AudioData(audio.raw_data, audio.frame_rate, audio.sample_width)
+        try:
+            return self._recognizer.recognize_google(data, language=self.language)
+        except sr.UnknownValueError:
+            return ""
+        except sr.RequestError as e:
+            raise RuntimeError(f"Google STT lỗi: {e}") from e
+
+
+STT_BACKENDS: Dict[str, Callable[[], object]] = {"fake": FakeSTT, "google": GoogleSTT}
+_instances: Dict[str, object] = {}
+_instances_lock = threading.Lock()
+
+
+def register_stt_backend(name: str, factory: Callable[[], object]) -> None:
+    """factory() -> object có transcribe(audio: AudioSegment, index: int) -> str."""
+    with _instances_lock:
+        STT_BACKENDS[name] = factory
+        _instances.pop(name, None)
+
+
+def get_stt_backend(name: Optional[str] = None):
+    name = name or STT_BACKEND
+    with _instances_lock:
+        if name not in _instances:
+            if name not in STT_BACKENDS:
+                raise ValueError(f"STT backend không hỗ trợ: {name} (có: {', '.join(sorted(STT_BACKENDS))})")
+            _instances[name] = STT_BACKENDS[name]()
+        return _instances[name]
+
 
 def speak(text):
     tts = gTTS(text, lang="vi")
@@ -8,6 +86,11 @@ def speak(text):
     tts.save(filename)
     return filename
 
-def convert_audio_to_text(audio_path):
-    return "Đây là kết quả giả lập từ giọng nói"
 
+def convert_audio_to_text(audio_path, backend: Optional[str] = None) -> str:
+    """File audio -> text: cắt im lặng (VAD năng lượng) rồi nhận dạng từng đoạn nói."""
+    from backend.vad import split_speech
+    stt = get_stt_backend(backend)
+    segments = split_speech(AudioSegment.from_file(audio_path))
+    parts: List[str] = [stt.transcribe(seg, i) for i, seg in enumerate(segments)]
+    return " ".join(p for p in parts if p)
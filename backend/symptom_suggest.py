@@ -0,0 +1,273 @@
+# File: backend/symptom_suggest.py
+
+import heapq
+import json
+import os
+import threading
+from bisect import bisect_left
+from typing import Any, Callable, Dict, List, Optional, Tuple
+
+import numpy as np
+
+from backend.text_norm import fold, normalize_text
+
+SYMPTOMS_PATH = os.path.join(os.path.dirname(__file__), "models", "symptoms_list.json")
+KEYWORDS_PATH = os.path.join(os.path.dirname(__file__), "data", "symptom_keywords.json")
+
+# Hạng kết quả: khớp đầu chuỗi > khớp đầu 1 từ bên trong > gần đúng (sai chính tả)
+TIER_PREFIX, TIER_INFIX, TIER_FUZZY = 0, 1, 2
+# Truy vấn có dấu: xét thêm ứng viên (x limit) để đưa mục khớp đúng dấu lên trước
+ACCENT_LOOKAHEAD = 8
+
+
+def _default_norm(s: str) -> str:
+    # Bỏ dấu + đ -> d: gõ "dau" vẫn ra "đau"
+    return fold(s)
+
+
+def _max_typos(n: int) -> int:
+    """Số lỗi gõ cho phép theo độ dài truy vấn (gõ ít ký tự thì không sửa lỗi)."""
+    return 0 if n < 4 else (1 if n < 8 else 2)
+
+
+class _RangeMin:
+    """Sparse table: vị trí giá trị nhỏ nhất trong đoạn [lo, hi) với O(1) mỗi truy vấn."""
+
+    def __init__(self, values: np.ndarray):
+        self.values = values
+        levels = [np.arange(len(values), dtype=np.int32)]
+        span = 1
+        while span * 2 <= len(values):
+            prev = levels[-1]
+            left, right = prev[:-span], prev[span:]
+            levels.append(np.where(values[left] <= values[right], left, right).astype(np.int32))
+            span *= 2
+        self.levels = levels
+
+    def argmin(self, lo: int, hi: int) -> int:
+        k = (hi - lo).bit_length() - 1
+        a, b = int(self.levels[k][lo]), int(self.levels[k][hi - (1 << k)])
+        return a if self.values[a] <= self.values[b] else b
+
+
+class SymptomSuggester:
+    """
+    Gợi ý triệu chứng theo từng phím gõ, khớp không phân biệt dấu (truy vấn có dấu thì mục đúng dấu lên trước):
+    - tiền tố cả chuỗi và tiền tố từng từ bên trong: mảng hậu tố tại ranh giới từ (bisect)
+      + sparse table trên thứ hạng để lấy top-N trong khoảng khớp mà không duyệt cả khoảng
+    - sai chính tả: sinh biến thể 1-2 lỗi nhưng chỉ theo các tiền tố có thật trong mảng hậu tố
+    id đánh theo thứ hạng (chuỗi ngắn trước).
+    """
+
+    def __init__(self, entries: List[Tuple[str, Optional[str], str]],
+                 normalize: Callable[[str], str] = _default_norm):
+        """
+        entries: [(chuỗi hiển thị, cột model chuẩn hoặc None, nguồn)]; trùng chuỗi giữ dấu (normalize_text)
+        giữ mục đầu tiên. Các mục chỉ khác dấu ("cứng cổ"/"cứng cơ") là 2 mục riêng, chung key khớp.
+        """
+        self.normalize = normalize
+        by_text: Dict[str, Tuple[str, Optional[str], str]] = {}
+        for text, canonical, source in entries:
+            exact = normalize_text(text)
+            if exact and normalize(text) and exact not in by_text:
+                by_text[exact] = (text, canonical, source)
+        ranked = sorted(by_text, key=lambda t: (len(normalize(t)), normalize(t), t))
+        self.exact: List[str] = ranked
+        self.keys: List[str] = [normalize(t) for t in ranked]
+        self.entries = [by_text[t] for t in ranked]
+
+        # Hậu tố tại mọi ranh giới từ (vị trí 0 = cả chuỗi): (hậu tố, id, vị trí)
+        suffixes: List[Tuple[str, int, int]] = []
+        for i, key in enumerate(self.keys):
+            suffixes.append((key, i, 0))
+            suffixes.extend((key[p + 1:], i, p + 1) for p, ch in enumerate(key) if ch == " ")
+        suffixes.sort()
+        self._suffix_keys = [s for s, _, _ in suffixes]
+        self._suffix_ids = [i for _, i, _ in suffixes]
+        # Thứ hạng gộp: khớp đầu chuỗi luôn đứng trước khớp giữa chuỗi
+        n = len(ranked)
+        self._range_min = _RangeMin(np.array([i if p == 0 else n + i for _, i, p in suffixes], dtype=np.int64))
+
+    def __len__(self) -> int:
+        return len(self.keys)
+
+    def _item(self, i: int, tier: int, dist: int = 0) -> Dict[str, Any]:
+        text, canonical, source = self.entries[i]
+        return {"text": text, "canonical": canonical, "source": source,
+                "match": ("prefix", "infix", "fuzzy")[tier], "distance": dist}
+
+    def _top_in_range(self, lo: int, hi: int, limit: int) -> List[Tuple[int, int]]:
+        """top-`limit` id khác nhau (theo thứ hạng gộp) trong đoạn [lo, hi) của mảng hậu tố -> [(tier, id)]."""
+        n = len(self.keys)
+        out: List[Tuple[int, int]] = []
+        seen = set()
+        heap: List[Tuple[int, int, int, int]] = []
+        if lo < hi:
+            m = self._range_min.argmin(lo, hi)
+            heap.append((int(self._range_min.values[m]), m, lo, hi))
+        while heap and len(out) < limit:
+            v, m, a, b = heapq.heappop(heap)
+            i = self._suffix_ids[m]
+            if i not in seen:
+                seen.add(i)
+                out.append((TIER_PREFIX if v < n else TIER_INFIX, i))
+            for x, y in ((a, m), (m + 1, b)):
+                if x < y:
+                    mm = self._range_min.argmin(x, y)
+                    heapq.heappush(heap, (int(self._range_min.values[mm]), mm, x, y))
+        return out
+
+    def _range(self, prefix: str, lo: int = 0, hi: Optional[int] = None) -> Tuple[int, int]:
+        keys = self._suffix_keys
+        hi = len(keys) if hi is None else hi
+        lo = bisect_left(keys, prefix, lo, hi)
+        return lo, bisect_left(keys, prefix + "\uffff", lo, hi)
+
+    def _children(self, prefix: str, lo: int, hi: int) -> List[Tuple[str, int, int]]:
+        """Các ký tự kế tiếp khác nhau sau `prefix` trong khoảng [lo, hi) kèm khoảng con (nhảy bằng bisect)."""
+        keys, d, out = self._suffix_keys, len(prefix), []
+        j = lo
+        while j < hi:
+            if len(keys[j]) <= d:
+                j += 1
+                continue
+            c = keys[j][d]
+            end = bisect_left(keys, prefix + c + "\uffff", j, hi)
+            out.append((c, j, end))
+            j = end
+        return out
+
+    def _fuzzy_search(self, done: str, lo: int, hi: int, rest: str, edits: int, dist: int,
+                      matches: Dict[str, int]) -> None:
+        """
+        Tìm tiền tố trong mảng hậu tố cách `done + rest` tối đa `edits` lỗi (thay/thiếu/thừa 1 ký tự).
+        [lo, hi) là khoảng của `done`. Mỗi nhánh: khớp đúng 1 đoạn của rest rồi đặt 1 lỗi; đoạn
+        không tồn tại thì cắt nhánh ngay, nên chỉ mở rộng các tiền tố thực sự có trong từ điển.
+        matches: tiền tố khớp -> số lỗi nhỏ nhất.
+        """
+        full = done + rest
+        flo, fhi = self._range(full, lo, hi)
+        if flo < fhi and dist < matches.get(full, dist + 1):
+            matches[full] = dist
+        if edits == 0:
+            return
+        for i in range(len(rest)):
+            head = done + rest[:i]
+            if i:
+                lo, hi = self._range(head, lo, hi)
+                if lo >= hi:
+                    return
+            # Thừa rest[i] (gõ dư 1 ký tự)
+            self._fuzzy_search(head, lo, hi, rest[i + 1:], edits - 1, dist + 1, matches)
+            for c, clo, chi in self._children(head, lo, hi):
+                if c != rest[i]:
+                    # Gõ sai rest[i] thành c
+                    self._fuzzy_search(head + c, clo, chi, rest[i + 1:], edits - 1, dist + 1, matches)
+                    # Thiếu ký tự c trước rest[i]
+                    self._fuzzy_search(head + c, clo, chi, rest[i:], edits - 1, dist + 1, matches)
+
+    def _accent_first(self, hits: List[Tuple[int, int]], query: str, limit: int) -> List[Tuple[int, int]]:
+        """Mục có tiền tố (cả chuỗi hoặc 1 từ) khớp đúng dấu với truy vấn lên trước, giữ thứ hạng trong mỗi nhóm."""
+        q = " " + query
+        same = [h for h in hits if (" " + self.exact[h[1]]).find(q) >= 0]
+        return (same + [h for h in hits if h not in same])[:limit]
+
+    def suggest(self, query: str, limit: int = 10) -> List[Dict[str, Any]]:
+        q = self.normalize(query or "")
+        if not q or limit <= 0:
+            return []
+
+        # 1) Tiền tố: cả chuỗi (vị trí 0) hoặc đầu 1 từ bên trong
+        accented = normalize_text(query)
+        if accented != fold(accented):
+            exact = self._accent_first(self._top_in_range(*self._range(q), limit * ACCENT_LOOKAHEAD),
+                                       accented, limit)
+        else:
+            exact = self._top_in_range(*self._range(q), limit)
+        out = [self._item(i, tier) for tier, i in exact]
+        max_dist = _max_typos(len(q))
+        if len(out) >= limit or not max_dist:
+            return out
+
+        # 2) Sai chính tả (chỉ khi chưa đủ kết quả): thử 1 lỗi trước, chưa có kết quả nào mới nới lên max_dist.
+        #    Ký tự đầu phải đúng (lỗi ở ký tự đầu hiếm, bỏ ràng buộc thì số nhánh tăng vài chục lần).
+        found = {i for _, i in exact}
+        fuzzy: Dict[int, Tuple[int, int]] = {}
+        for dist in range(1, max_dist + 1):
+            matches: Dict[str, int] = {}
+            lo, hi = self._range(q[0])
+            self._fuzzy_search(q[0], lo, hi, q[1:], dist, 0, matches)
+            for prefix, d in matches.items():
+                if d == 0:
+                    continue
+                lo, hi = self._range(prefix)
+                for tier, i in self._top_in_range(lo, hi, limit + len(found)):
+                    if i not in found and (d, tier) < fuzzy.get(i, (dist + 1, tier)):
+                        fuzzy[i] = (d, tier)
+            if out or fuzzy:
+                break
+        ranked = sorted(fuzzy, key=lambda i: (fuzzy[i], i))[:limit - len(out)]
+        out.extend(self._item(i, TIER_FUZZY, fuzzy[i][0]) for i in ranked)
+        return out
+
+
+def load_vocabulary(symptoms_path: str = SYMPTOMS_PATH,
+                    keywords_path: str = KEYWORDS_PATH) -> List[Tuple[str, Optional[str], str]]:
+    """
+    Cột triệu chứng của model + từ khóa trong symptom_keywords.json (kèm cột model nếu trùng:
+    giữ dấu trước, không dấu sau, như _normalize_input_symptoms).
+    """
+    entries: List[Tuple[str, Optional[str], str]] = []
+    canon_exact: Dict[str, str] = {}
+    canon_folded: Dict[str, str] = {}
+    try:
+        with open(symptoms_path, encoding="utf-8") as f:
+            symptoms = json.load(f)
+    except (OSError, ValueError):
+        symptoms = []
+    for s in symptoms:
+        if isinstance(s, str):
+            entries.append((s, s, "model"))
+            canon_exact.setdefault(normalize_text(s), s)
+            canon_folded.setdefault(_default_norm(s), s)
+    try:
+        with open(keywords_path, encoding="utf-8") as f:
+            keywords = json.load(f)
+    except (OSError, ValueError):
+        keywords = {}
+    for kw in keywords:
+        if isinstance(kw, str):
+            entries.append((kw, canon_exact.get(normalize_text(kw)) or canon_folded.get(_default_norm(kw)), "keyword"))
+    return entries
+
+
+_suggester: Optional[SymptomSuggester] = None
+_suggester_stamp: Optional[Tuple] = None
+_suggester_lock = threading.Lock()
+
+
+def _stamp(paths: List[str]) -> Tuple:
+    out = []
+    for p in paths:
+        try:
+            st = os.stat(p)
+            out.append((st.st_size, st.st_mtime_ns))
+        except OSError:
+            out.append(None)
+    return tuple(out)
+
+
+def get_suggester() -> SymptomSuggester:
+    """Index dùng chung, build lại khi danh sách triệu chứng của model hoặc file từ khóa thay đổi."""
+    global _suggester, _suggester_stamp
+    stamp = _stamp([SYMPTOMS_PATH, KEYWORDS_PATH])
+    if _suggester is None or stamp != _suggester_stamp:
+        with _suggester_lock:
+            if _suggester is None or stamp != _suggester_stamp:
+                _suggester = SymptomSuggester(load_vocabulary())
+                _suggester_stamp = stamp
+    return _suggester
+
+
+def suggest_symptoms(query: str, limit: int = 10) -> List[Dict[str, Any]]:
+    return get_suggester().suggest(query, limit=limit)
@@ -1,4 +1,4 @@
-from clinical_api import search_clinical_table, get_healthfinder_topics
+from backend.clinical_api import search_clinical_table, get_healthfinder_topics
 
 if __name__ == "__main__":
     symptom = "fever"
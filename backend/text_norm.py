@@ -0,0 +1,80 @@
+import os
+import unicodedata
+from functools import lru_cache
+from typing import Iterable, List
+
+# Số chuỗi nhớ kết quả cho fold()/normalize_text() (token người dùng lặp lại rất nhiều)
+TEXT_NORM_CACHE = int(os.getenv("TEXT_NORM_CACHE", "65536"))
+
+# Ký tự phân cách khi chuẩn hóa hàng loạt (nối cả danh sách thành 1 chuỗi, translate 1 lần)
+_SEP = "\x00"
+
+
+def _build_fold_table() -> dict:
+    """
+    Bảng str.translate bỏ dấu tiếng Việt: mọi chữ Latin có dấu dựng sẵn -> chữ gốc,
+    dấu tổ hợp rời (input dạng NFD) -> xóa, đ/Đ -> d/D. Tính 1 lần lúc import.
+    """
+    table = {}
+    for block in ((0x00C0, 0x0250), (0x1E00, 0x1F00)):
+        for cp in range(*block):
+            ch = chr(cp)
+            base = unicodedata.normalize("NFD", ch)[0]
+            if base != ch and base.isascii():
+                table[cp] = base
+    for cp in range(0x0300, 0x0370):
+        table[cp] = None
+    table.update({ord("đ"): "d", ord("Đ"): "D"})
+    return str.maketrans(table)
+
+
+_FOLD_TABLE = _build_fold_table()
+
+
+def _nfc(s: str) -> str:
+    # Đa số input đã ở dạng NFC: kiểm tra nhanh trước khi chuẩn hóa
+    return s if unicodedata.is_normalized("NFC", s) else unicodedata.normalize("NFC", s)
+
+
+@lru_cache(maxsize=TEXT_NORM_CACHE)
+def normalize_text(s: str) -> str:
+    """Giữ dấu: NFC, lower, rút gọn khoảng trắng. "đau mắt" và "đau mặt" vẫn khác nhau."""
+    if not s:
+        return ""
+    return " ".join(_nfc(s).lower().split())
+
+
+@lru_cache(maxsize=TEXT_NORM_CACHE)
+def fold(s: str) -> str:
+    """Không dấu: lower, bỏ dấu, đ -> d, rút gọn khoảng trắng ("Đau  Đầu" -> "dau dau")."""
+    if not s:
+        return ""
+    return " ".join(s.lower().translate(_FOLD_TABLE).split())
+
+
+def _bulk(items: Iterable[str], prepare) -> List[str]:
+    items = [s if isinstance(s, str) else "" for s in items]
+    joined = _SEP.join(items)
+    if joined.count(_SEP) != max(0, len(items) - 1):
+        # Chuỗi có sẵn ký tự phân cách: chuẩn hóa từng chuỗi
+        return [" ".join(prepare(s).split()) for s in items]
+    return [" ".join(part.split()) for part in prepare(joined).split(_SEP)] if items else []
+
+
+def normalize_many(items: Iterable[str]) -> List[str]:
+    """normalize_text cho cả danh sách (vd. từ điển triệu chứng) trong 1 lượt NFC/lower, không qua cache."""
+    return _bulk(items, lambda s: _nfc(s).lower())
+
+
+def fold_many(items: Iterable[str]) -> List[str]:
+    """fold cho cả danh sách trong 1 lượt lower/translate, không qua cache."""
+    return _bulk(items, lambda s: s.lower().translate(_FOLD_TABLE))
+
+
+def cache_stats() -> dict:
+    return {name: fn.cache_info()._asdict() for name, fn in (("fold", fold), ("normalize_text", normalize_text))}
+
+
+def clear_cache() -> None:
+    fold.cache_clear()
+    normalize_text.cache_clear()
@@ -0,0 +1,36 @@
+"""
+POST /predict/text dùng chung cho backend/main.py (FastAPI) và api.py (Flask): 1 hợp đồng response
+dù request vào app nào (dưới backend.asgi route FastAPI được ưu tiên, api.py chạy riêng thì dùng bản Flask).
+
+- 200: {"text", "prediction"} (prediction = analyze_symptoms_text, bỏ all_probabilities)
+- 400: body không phải {"text": chuỗi khác rỗng}
+- 422: không nhận diện được triệu chứng nào ({"extracted_symptoms": []})
+- 503: quá tải (kèm header Retry-After), 500: lỗi dự đoán
+Lỗi luôn có dạng {"error": True, "message": ..., ...}.
+"""
+from typing import Any, Dict, Tuple
+
+from backend.admission import PREDICT_ADMISSION, Overloaded
+
+
+def _error(message: str, **extra: Any) -> Dict[str, Any]:
+    return {"error": True, "message": message, **extra}
+
+
+def predict_text(data: Any) -> Tuple[int, Dict[str, Any], Dict[str, str]]:
+    """Body JSON đã parse (None nếu không parse được) -> (status, body, headers). Hàm chặn: gọi trong threadpool."""
+    from backend.predict_disease_dl import analyze_symptoms_text
+    text = data.get("text") if isinstance(data, dict) else None
+    if not isinstance(text, str) or not text.strip():
+        return 400, _error("Thiếu dữ liệu 'text' dạng chuỗi"), {}
+    try:
+        with PREDICT_ADMISSION.admit():
+            result = analyze_symptoms_text(text, explain=bool(data.get("explain")))
+    except Overloaded as e:
+        return 503, _error(str(e), retry_after=e.retry_after), {"Retry-After": str(e.retry_after)}
+    except Exception as e:
+        return 500, _error(f"Lỗi dự đoán: {e}"), {}
+    if result.get("error"):
+        return 422, _error(result["message"], text=text, extracted_symptoms=result.get("extracted_symptoms", [])), {}
+    result.pop("all_probabilities", None)
+    return 200, {"text": text, "prediction": result}, {}
@@ -0,0 +1,282 @@
+import hashlib
+import itertools
+import json
+import os
+import threading
+import time
+from collections import Counter
+from typing import Any, Callable, Dict, Iterable, List, Optional, Sequence, Tuple
+
+import numpy as np
+
+from backend.mapping_io import MAPPING_PATH, load_mapping
+from backend.metrics import REGISTRY
+
+# Bảng top-k tính sẵn (numpy structured array, mở bằng mmap) + file meta JSON cùng tên
+TOPK_TABLE_PATH = os.getenv("TOPK_TABLE_PATH") or "backend/models/topk_table.npy"
+TOPK_TABLE_K = int(os.getenv("TOPK_TABLE_K", "10"))
+# Giới hạn số cặp/bộ ba đồng xuất hiện trong mapping (lấy theo tần suất giảm dần)
+TOPK_MAX_PAIRS = int(os.getenv("TOPK_MAX_PAIRS", "50000"))
+TOPK_MAX_TRIPLES = int(os.getenv("TOPK_MAX_TRIPLES", "30000"))
+TOPK_BATCH = int(os.getenv("TOPK_BATCH", "4096"))
+# Hệ số tải tối đa của bảng băm địa chỉ mở
+LOAD_FACTOR = 0.5
+
+LOOKUPS = REGISTRY.counter("jaremis_topk_table_lookups_total", "Tra bảng top-k tính sẵn", ("outcome",))
+
+
+def set_hash(indices: Iterable[int]) -> int:
+    """Khóa 64-bit của tập chỉ số triệu chứng đã sắp xếp (0 dành cho ô trống)."""
+    data = np.asarray(sorted(indices), dtype="<u4").tobytes()
+    h = int.from_bytes(hashlib.blake2b(data, digest_size=8).digest(), "little")
+    return h or 1
+
+
+def _dtype(k: int) -> np.dtype:
+    return np.dtype([("key", "<u8"), ("idx", "<i4", (k,)), ("prob", "<f4", (k,))])
+
+
+def candidate_sets(mapping: List[Dict[str, Any]], symptom_index: Dict[str, int],
+                   normalize: Optional[Callable[[List[str]], List[str]]] = None,
+                   max_pairs: int = TOPK_MAX_PAIRS, max_triples: int = TOPK_MAX_TRIPLES
+                   ) -> Tuple[List[Tuple[int, ...]], Dict[str, int]]:
+    """
+    Các tổ hợp được tính sẵn (chỉ số cột model, đã sắp xếp, không trùng):
+    mọi triệu chứng đơn, cặp/bộ ba đồng xuất hiện nhiều nhất trong mapping, và đúng tập của từng dòng mapping.
+    normalize: chuẩn hóa giống lúc phục vụ để khóa trùng với request thật (mặc định: khớp nguyên văn).
+    """
+    rows = []
+    pairs: Counter = Counter()
+    triples: Counter = Counter()
+    for item in mapping:
+        raw = [s for s in item["symptoms"] if isinstance(s, str)]
+        names = normalize(raw) if normalize else raw
+        cols = tuple(sorted({symptom_index[s] for s in names if s in symptom_index}))
+        if not cols:
+            continue
+        rows.append(cols)
+        pairs.update(itertools.combinations(cols, 2))
+        triples.update(itertools.combinations(cols, 3))
+
+    seen = set()
+    out: List[Tuple[int, ...]] = []
+    counts: Dict[str, int] = {}
+
+    def add(group: str, sets: Iterable[Tuple[int, ...]]) -> None:
+        n = 0
+        for s in sets:
+            if s not in seen:
+                seen.add(s)
+                out.append(s)
+                n += 1
+        counts[group] = n
+
+    add("singles", ((i,) for i in sorted(symptom_index.values())))
+    add("pairs", (p for p, _ in pairs.most_common(max_pairs)))
+    add("triples", (t for t, _ in triples.most_common(max_triples)))
+    add("mapping_sets", rows)
+    return out, counts
+
+
+class TopKTable:
+    """
+    Bảng băm địa chỉ mở (dò tuyến tính) trên 1 mảng numpy memory-mapped:
+    key = set_hash(tập chỉ số triệu chứng) -> top-k (chỉ số bệnh, xác suất).
+    Tra cứu chỉ đọc vài ô trang đã map, không suy luận, dùng chung giữa các worker qua page cache.
+    """
+
+    def __init__(self, data: np.ndarray, meta: Dict[str, Any]):
+        self.data = data
+        self.meta = meta
+        self.k = int(meta["k"])
+        self.model_version = meta.get("model_version", "")
+        self._mask = len(data) - 1
+        self._keys = data["key"]
+
+    def __len__(self) -> int:
+        return int(self.meta.get("entries", 0))
+
+    def lookup(self, indices: Sequence[int]) -> Optional[Tuple[np.ndarray, np.ndarray]]:
+        """(chỉ số bệnh top-k, xác suất) hoặc None nếu tổ hợp không có trong bảng."""
+        key = set_hash(indices)
+        slot = key & self._mask
+        while True:
+            found = int(self._keys[slot])
+            if found == key:
+                row = self.data[slot]
+                return row["idx"], row["prob"]
+            if found == 0:
+                return None
+            slot = (slot + 1) & self._mask
+
+    @classmethod
+    def build(cls, sets: List[Tuple[int, ...]], idx: np.ndarray, prob: np.ndarray,
+              meta: Dict[str, Any]) -> "TopKTable":
+        k = idx.shape[1]
+        capacity = 1
+        while capacity * LOAD_FACTOR < max(1, len(sets)):
+            capacity <<= 1
+        data = np.zeros(capacity, dtype=_dtype(k))
+        mask = capacity - 1
+        keys = data["key"]
+        for row, s in enumerate(sets):
+            key = set_hash(s)
+            slot = key & mask
+            while keys[slot] != 0 and keys[slot] != key:
+                slot = (slot + 1) & mask
+            data[slot] = (key, idx[row], prob[row])
+        meta = dict(meta, k=k, entries=len(sets), capacity=capacity, bytes=int(data.nbytes))
+        return cls(data, meta)
+
+    def save(self, path: str = TOPK_TABLE_PATH) -> None:
+        """Ghi nguyên tử (file tạm + os.replace): process đang mmap bản cũ vẫn đọc được tới khi mở lại."""
+        os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+        tmp = path + ".tmp"
+        with open(tmp, "wb") as f:
+            np.save(f, self.data)
+        meta_tmp = _meta_path(path) + ".tmp"
+        with open(meta_tmp, "w", encoding="utf-8") as f:
+            json.dump(self.meta, f, ensure_ascii=False, indent=2)
+        os.replace(tmp, path)
+        os.replace(meta_tmp, _meta_path(path))
+
+    @classmethod
+    def load(cls, path: str = TOPK_TABLE_PATH) -> "TopKTable":
+        with open(_meta_path(path), encoding="utf-8") as f:
+            meta = json.load(f)
+        return cls(np.load(path, mmap_mode="r"), meta)
+
+
+def _meta_path(path: str) -> str:
+    return os.path.splitext(path)[0] + ".json"
+
+
+def build_topk_table(engine: Optional[str] = None, mapping_path: str = MAPPING_PATH, path: str = TOPK_TABLE_PATH,
+                     k: int = TOPK_TABLE_K, batch_size: int = TOPK_BATCH) -> Dict[str, Any]:
+    """
+    Bước offline (chạy sau train_model): nạp model từ file hiện tại, chấm mọi tổ hợp theo lô lớn,
+    ghi bảng + meta (model_version trùng cách predict_disease_dl tính). Trả về meta/thống kê.
+    """
+    from backend import predict_disease_dl as p
+    engine = engine or p.INFERENCE_ENGINE
+    start = time.perf_counter()
+    with open(p.SYMPTOMS_PATH, encoding="utf-8") as f:
+        symptoms = json.load(f)
+    with open(p.DISEASES_PATH, encoding="utf-8") as f:
+        n_diseases = len(json.load(f))
+    version = p.file_version(engine)
+    if p.model is not None and p.model_version == version:
+        # Model đang phục vụ đã nạp đúng các file này (vd. /train/model nạp lại trước khi dựng bảng)
+        model = p.model
+    else:
+        model, _ = p.load_inference_engine(engine)
+
+    symptom_index = {s: i for i, s in enumerate(symptoms)}
+    # Danh sách triệu chứng đang phục vụ trùng file -> dùng đúng bộ chuẩn hóa của predict_disease
+    normalize = p._normalize_input_symptoms if p.all_symptoms == symptoms else None
+    sets, counts = candidate_sets(load_mapping(mapping_path), symptom_index, normalize)
+    k = max(1, min(k, n_diseases))
+    idx = np.empty((len(sets), k), dtype=np.int32)
+    prob = np.empty((len(sets), k), dtype=np.float32)
+    for lo in range(0, len(sets), batch_size):
+        chunk = sets[lo:lo + batch_size]
+        X = np.zeros((len(chunk), len(symptoms)), dtype=np.float32)
+        for row, cols in enumerate(chunk):
+            X[row, list(cols)] = 1.0
+        probs = np.asarray(model.predict(X, verbose=0, batch_size=len(chunk)))
+        top = np.argpartition(-probs, k - 1, axis=1)[:, :k]
+        order = np.argsort(-np.take_along_axis(probs, top, axis=1), axis=1)
+        top = np.take_along_axis(top, order, axis=1)
+        idx[lo:lo + len(chunk)] = top
+        prob[lo:lo + len(chunk)] = np.take_along_axis(probs, top, axis=1)
+
+    table = TopKTable.build(sets, idx, prob, {
+        "model_version": version,
+        "engine": engine,
+        "combinations": counts,
+        "build_seconds": round(time.perf_counter() - start, 3),
+    })
+    table.save(path)
+    return table.meta
+
+
+# ===== Bảng dùng chung cho predict_disease =====
+_table: Optional[TopKTable] = None
+_table_stamp: Optional[Tuple[int, int]] = None
+_table_lock = threading.Lock()
+_building: set = set()
+hits = 0
+misses = 0
+
+
+def get_table(model_version: str, path: str = TOPK_TABLE_PATH, auto_build: bool = False) -> Optional[TopKTable]:
+    """
+    Bảng khớp model_version đang phục vụ, mở lại khi file đổi. Lệch phiên bản -> None
+    (auto_build: dựng lại ở luồng nền, mỗi phiên bản 1 lần, request vẫn suy luận bình thường).
+    """
+    global _table, _table_stamp
+    try:
+        st = os.stat(path)
+        stamp = (st.st_size, st.st_mtime_ns)
+    except OSError:
+        stamp = None
+    if stamp != _table_stamp:
+        with _table_lock:
+            if stamp != _table_stamp:
+                try:
+                    _table = TopKTable.load(path) if stamp else None
+                except (OSError, ValueError, KeyError) as e:
+                    print(f"Warning: không đọc được bảng top-k {path} ({e})")
+                    _table = None
+                _table_stamp = stamp
+    table = _table
+    if table is not None and table.model_version == model_version:
+        return table
+    if auto_build and model_version:
+        _build_in_background(model_version, path)
+    return None
+
+
+def _build_in_background(model_version: str, path: str) -> None:
+    with _table_lock:
+        if model_version in _building:
+            return
+        _building.add(model_version)
+
+    def run() -> None:
+        from backend import predict_disease_dl as p
+        try:
+            # Bảng trên đĩa đã khớp file model hiện tại (model đang phục vụ chỉ chưa nạp lại): dựng lại vô ích
+            table = _table
+            if table is not None and table.model_version == p.file_version():
+                return
+            meta = build_topk_table(path=path)
+            print(f"Đã dựng bảng top-k {meta['entries']} tổ hợp cho {meta['model_version']}")
+        except Exception as e:
+            print(f"Warning: dựng bảng top-k lỗi ({e})")
+
+    threading.Thread(target=run, name="jaremis-topk-build", daemon=True).start()
+
+
+def record_lookup(hit: bool) -> None:
+    global hits, misses
+    if hit:
+        hits += 1
+    else:
+        misses += 1
+    LOOKUPS.inc("hit" if hit else "miss")
+
+
+def table_stats() -> Dict[str, Any]:
+    """Độ phủ: meta lúc dựng (số tổ hợp theo nhóm, kích thước) + tỉ lệ request trả lời bằng bảng."""
+    total = hits + misses
+    table = _table
+    stats: Dict[str, Any] = {"hits": hits, "misses": misses, "hit_ratio": (hits / total) if total else 0.0}
+    if table is not None:
+        stats.update({k: table.meta.get(k) for k in ("model_version", "entries", "capacity", "bytes", "combinations")})
+    return stats
+
+
+if __name__ == "__main__":
+    # Dựng lại bảng cho model hiện tại: python -m backend.topk_table
+    print(json.dumps(build_topk_table(), ensure_ascii=False, indent=2))
@@ -1,74 +1,246 @@
 import json
 import numpy as np
-from typing import Dict, Any
+from typing import Any, Dict, List, Optional, Tuple
 
 try:
+    import tensorflow as tf
     from tensorflow import keras
     from tensorflow.keras import layers
 except ImportError:
     print("Warning: TensorFlow not installed. Please install with: pip install tensorflow")
+    tf = None
     keras = None
     layers = None
 import os
+import sys
+import time
 
-def train_model() -> Dict[str, Any]:
+from backend.metrics import stage_timer
+from backend.mapping_io import MAPPING_PATH, load_mapping
+from backend.text_norm import normalize_many, normalize_text
+
+PIPELINE = "train_model"
+
+MODEL_DIR = 'backend/models'
+
+# Kiến trúc mặc định (xem backend/hparam_search.py để thử cấu hình khác)
+DEFAULT_HIDDEN = (128, 64)
+
+def train_model(mapping_path: str = MAPPING_PATH, model_dir: str = MODEL_DIR,
+                epochs: int = 100, batch_size: int = 8, verbose: Any = "auto",
+                hidden: Tuple[int, ...] = DEFAULT_HIDDEN, dropout: float = 0.0,
+                learning_rate: Optional[float] = None) -> Dict[str, Any]:
     """Hàm huấn luyện model AI"""
+    with stage_timer(PIPELINE, "total"):
+        return _train_model(mapping_path, model_dir, epochs, batch_size, verbose, hidden, dropout, learning_rate)
+
+def encode_dataset(mapping: List[Dict[str, Any]], dtype=np.float32) -> Tuple[np.ndarray, np.ndarray, List[str], List[str]]:
+    """Mã hóa mapping -> (X one-hot (n, số triệu chứng), y chỉ số bệnh, danh sách triệu chứng, danh sách bệnh)."""
+    # Gộp biến thể trùng khi chuẩn hóa giống lúc phục vụ (NFC, lower, khoảng trắng; giữ dấu):
+    # "Sốt " và "sốt" là 1 cột, tên cột = cách viết gặp đầu tiên theo thứ tự sắp xếp (bỏ khoảng trắng thừa)
+    raw = sorted({symptom for item in mapping for symptom in item["symptoms"]})
+    first: Dict[str, str] = {}
+    canon = {s: first.setdefault(key, " ".join(s.split())) if key else "" for s, key in zip(raw, normalize_many(raw))}
+    # Lấy tất cả triệu chứng và bệnh duy nhất
+    all_symptoms = sorted(set(first.values()))
+    all_diseases = sorted({item["disease"] for item in mapping})
+    sym_index = {s: i for i, s in enumerate(all_symptoms)}
+    dis_index = {d: i for i, d in enumerate(all_diseases)}
+
+    X = np.zeros((len(mapping), len(all_symptoms)), dtype=dtype)
+    y = np.empty(len(mapping), dtype=np.int32)
+    for row, item in enumerate(mapping):
+        X[row, [sym_index[canon[s]] for s in item["symptoms"] if canon[s]]] = 1
+        y[row] = dis_index[item["disease"]]
+    return X, y, all_symptoms, all_diseases
+
+def build_model(n_symptoms: int, n_diseases: int, hidden: Tuple[int, ...] = DEFAULT_HIDDEN,
+                dropout: float = 0.0, learning_rate: Optional[float] = None):
+    """MLP relu: Dense(hidden...) [+ Dropout] -> softmax, optimizer adam."""
+    model = keras.Sequential([layers.Input(shape=(n_symptoms,))])
+    for width in hidden:
+        model.add(layers.Dense(width, activation='relu'))
+        if dropout > 0:
+            model.add(layers.Dropout(dropout))
+    model.add(layers.Dense(n_diseases, activation='softmax'))
+    optimizer = keras.optimizers.Adam(learning_rate=learning_rate) if learning_rate else 'adam'
+    model.compile(optimizer=optimizer, loss='sparse_categorical_crossentropy', metrics=['accuracy'])
+    return model
+
+def _train_model(mapping_path: str, model_dir: str, epochs: int, batch_size: int, verbose: Any,
+                 hidden: Tuple[int, ...], dropout: float, learning_rate: Optional[float]) -> Dict[str, Any]:
     if keras is None or layers is None:
         raise ImportError("TensorFlow is required but not installed")
     
     # Đọc dữ liệu mapping triệu chứng-bệnh (dạng list các dict)
-    with open('backend/data/disease_symptom_mapping.json', encoding='utf-8') as f:
-        mapping = json.load(f)
-
-    # Lấy tất cả triệu chứng và bệnh duy nhất
-    all_symptoms = sorted({symptom for item in mapping for symptom in item["symptoms"]})
-    all_diseases = sorted({item["disease"] for item in mapping})
+    with stage_timer(PIPELINE, "load_data"):
+        mapping = load_mapping(mapping_path)
 
     # Tạo dữ liệu train
-    X = []
-    y = []
-    for item in mapping:
-        x_vec = [int(symptom in item["symptoms"]) for symptom in all_symptoms]
-        X.append(x_vec)
-        y.append(all_diseases.index(item["disease"]))
-
-    X = np.array(X)
-    y = np.array(y)
+    with stage_timer(PIPELINE, "encode"):
+        X, y, all_symptoms, all_diseases = encode_dataset(mapping)
 
     # Xây dựng model
-    model = keras.Sequential([
-        layers.Input(shape=(len(all_symptoms),)),
-        layers.Dense(128, activation='relu'),
-        layers.Dense(64, activation='relu'),
-        layers.Dense(len(all_diseases), activation='softmax')
-    ])
-    model.compile(optimizer='adam', loss='sparse_categorical_crossentropy', metrics=['accuracy'])
+    model = build_model(len(all_symptoms), len(all_diseases), hidden, dropout, learning_rate)
 
     # Train
-    model.fit(X, y, epochs=100, batch_size=8, validation_split=0.2)
+    with stage_timer(PIPELINE, "fit"):
+        model.fit(X, y, epochs=epochs, batch_size=batch_size, validation_split=0.2, verbose=verbose)
 
     # Đảm bảo thư mục models tồn tại
-    os.makedirs('backend/models', exist_ok=True)
+    os.makedirs(model_dir, exist_ok=True)
 
-    # Lưu model
-    model.save('backend/models/disease_model_dl.h5')
+    with stage_timer(PIPELINE, "save"):
+        # Lưu model
+        model.save(os.path.join(model_dir, 'disease_model_dl.h5'))
 
-    # Lưu danh sách triệu chứng và bệnh để dùng khi dự đoán
-    with open('backend/models/symptoms_list.json', 'w', encoding='utf-8') as f:
-        json.dump(all_symptoms, f, ensure_ascii=False)
-    with open('backend/models/diseases_list.json', 'w', encoding='utf-8') as f:
-        json.dump(all_diseases, f, ensure_ascii=False)
-    
-    return {
+        # Lưu danh sách triệu chứng và bệnh để dùng khi dự đoán
+        with open(os.path.join(model_dir, 'symptoms_list.json'), 'w', encoding='utf-8') as f:
+            json.dump(all_symptoms, f, ensure_ascii=False)
+        with open(os.path.join(model_dir, 'diseases_list.json'), 'w', encoding='utf-8') as f:
+            json.dump(all_diseases, f, ensure_ascii=False)
+
+    result = {
         "total_symptoms": len(all_symptoms),
         "total_diseases": len(all_diseases),
         "training_samples": len(X)
     }
+    # Đã có bản int8/TFLite trong thư mục -> xuất lại từ model vừa train (file cũ sai shape/nhãn)
+    has_tflite = os.path.exists(os.path.join(model_dir, 'disease_model_int8.tflite'))
+    if has_tflite or os.path.exists(os.path.join(model_dir, 'disease_model_int8.npz')):
+        with stage_timer(PIPELINE, "export_int8"):
+            report = export_quantized(model_dir, mapping_path, tflite=has_tflite)
+        result["int8_parity"] = report["int8_numpy"]["parity"]
+    return result
+
+def quantize_dense_layers(model) -> Dict[str, np.ndarray]:
+    """
+    Lượng tử hóa sau huấn luyện (weight-only int8, đối xứng, theo từng cột output):
+    W[:, j] ~= Wq[:, j] * scale[j], Wq trong [-127, 127]. Bias giữ float32.
+    """
+    arrays: Dict[str, np.ndarray] = {}
+    activations = []
+    dense = [l for l in model.layers if l.get_weights()]
+    for i, layer in enumerate(dense):
+        w, b = layer.get_weights()
+        scale = np.abs(w).max(axis=0) / 127.0
+        scale[scale == 0] = 1.0
+        arrays[f"w{i}"] = np.clip(np.round(w / scale), -127, 127).astype(np.int8)
+        arrays[f"s{i}"] = scale.astype(np.float32)
+        arrays[f"b{i}"] = b.astype(np.float32)
+        activations.append(layer.get_config().get("activation", "linear"))
+    arrays["activations"] = np.array(activations)
+    return arrays
+
+def _latency_ms(model, rows: np.ndarray, n: int = 200) -> Dict[str, float]:
+    """Độ trễ 1 request (batch 1) như đường phục vụ thật: p50/p95 (ms)."""
+    samples = []
+    for i in range(min(n, len(rows))):
+        x = rows[i:i + 1]
+        start = time.perf_counter()
+        model.predict(x, verbose=0)
+        samples.append((time.perf_counter() - start) * 1000.0)
+    samples.sort()
+    return {"p50_ms": samples[len(samples) // 2], "p95_ms": samples[int(len(samples) * 0.95) - 1]}
+
+def _parity(ref: np.ndarray, other: np.ndarray) -> Dict[str, float]:
+    ref_top3 = np.argsort(ref, axis=1)[:, -3:]
+    oth_top3 = np.argsort(other, axis=1)[:, -3:]
+    ref_top1 = ref.argmax(axis=1)
+    return {
+        # top-1 trùng nhau
+        "top1_agreement": float(np.mean(ref_top1 == other.argmax(axis=1))),
+        # top-1 của model float nằm trong top-3 của model lượng tử
+        "top1_in_top3": float(np.mean([r in o for r, o in zip(ref_top1, oth_top3)])),
+        # tỉ lệ phần tử chung giữa 2 tập top-3
+        "top3_overlap": float(np.mean([len(set(a) & set(b)) / 3.0 for a, b in zip(ref_top3, oth_top3)])),
+        "max_abs_prob_diff": float(np.abs(ref - other).max()),
+    }
+
+def export_quantized(model_dir: str = MODEL_DIR, mapping_path: str = MAPPING_PATH, tflite: bool = True) -> Dict[str, Any]:
+    """
+    Xuất model int8 từ model float (.h5) đã train:
+      - disease_model_int8.npz  (NumPy int8, INFERENCE_ENGINE=int8)
+      - disease_model_int8.tflite (TFLite int8 full-integer, chỉ để đo độ lệch, chưa dùng để phục vụ)
+    và báo cáo độ khớp top-1/top-3 với model float trên dữ liệu mapping, độ trễ, dung lượng.
+    """
+    if keras is None:
+        raise ImportError("TensorFlow is required but not installed")
+    from backend.predict_disease_dl import Int8DenseModel, TFLiteModel, source_fingerprint
+
+    float_path = os.path.join(model_dir, 'disease_model_dl.h5')
+    source = source_fingerprint(float_path, os.path.join(model_dir, 'symptoms_list.json'),
+                                os.path.join(model_dir, 'diseases_list.json'))
+    float_model = keras.models.load_model(float_path)
+    with open(os.path.join(model_dir, 'symptoms_list.json'), encoding='utf-8') as f:
+        all_symptoms = json.load(f)
+    sym_index = {normalize_text(s): i for i, s in enumerate(all_symptoms)}
+
+    # Dữ liệu đánh giá = các tập triệu chứng trong mapping, mã hóa theo cột của model
+    mapping = load_mapping(mapping_path)
+    X = np.zeros((len(mapping), len(all_symptoms)), dtype=np.float32)
+    for row, item in enumerate(mapping):
+        cols = (sym_index.get(normalize_text(s)) for s in item["symptoms"])
+        X[row, [c for c in cols if c is not None]] = 1.0
+
+    npz_path = os.path.join(model_dir, 'disease_model_int8.npz')
+    np.savez(npz_path, **quantize_dense_layers(float_model),
+             **{f"source_{k}": np.array(v) for k, v in source.items()})
+    int8_model = Int8DenseModel(npz_path)
+
+    ref = np.asarray(float_model.predict(X, verbose=0, batch_size=1024))
+    float_bytes = int(sum(w.nbytes for w in float_model.get_weights()))
+    report: Dict[str, Any] = {
+        "samples": len(X),
+        "source": source,
+        "float": {
+            "file_bytes": os.path.getsize(float_path),
+            "weight_bytes": float_bytes,
+            "latency": _latency_ms(float_model, X),
+        },
+        "int8_numpy": {
+            "path": npz_path,
+            "file_bytes": os.path.getsize(npz_path),
+            "weight_bytes": int8_model.nbytes,
+            "weight_bytes_saved": 1.0 - int8_model.nbytes / float_bytes,
+            "parity": _parity(ref, int8_model.predict(X)),
+            "latency": _latency_ms(int8_model, X),
+        },
+    }
+
+    if tflite:
+        converter = tf.lite.TFLiteConverter.from_keras_model(float_model)
+        converter.optimizations = [tf.lite.Optimize.DEFAULT]
+        converter.representative_dataset = lambda: ([X[i:i + 1]] for i in range(min(len(X), 500)))
+        converter.target_spec.supported_ops = [tf.lite.OpsSet.TFLITE_BUILTINS_INT8]
+        tflite_path = os.path.join(model_dir, 'disease_model_int8.tflite')
+        with open(tflite_path, 'wb') as f:
+            f.write(converter.convert())
+        tfl_model = TFLiteModel(tflite_path)
+        report["tflite_int8"] = {
+            "path": tflite_path,
+            "file_bytes": os.path.getsize(tflite_path),
+            "file_bytes_saved": 1.0 - os.path.getsize(tflite_path) / report["float"]["file_bytes"],
+            "parity": _parity(ref, tfl_model.predict(X)),
+            "latency": _latency_ms(tfl_model, X),
+        }
+
+    with open(os.path.join(model_dir, 'quantization_report.json'), 'w', encoding='utf-8') as f:
+        json.dump(report, f, ensure_ascii=False, indent=2)
+    return report
 
 # Chạy huấn luyện nếu file được chạy trực tiếp
+# python -m backend.train_disease_model_dl [--export-int8]
 if __name__ == "__main__":
     try:
-        result = train_model()
-        print("Huấn luyện hoàn thành:", result)
+        if "--export-int8" in sys.argv:
+            report = export_quantized()
+            print("Xuất model int8 hoàn thành:", json.dumps(report, ensure_ascii=False, indent=2))
+        else:
+            result = train_model()
+            print("Huấn luyện hoàn thành:", result)
+            if "--no-precompute" not in sys.argv:
+                from backend.topk_table import build_topk_table
+                print("Bảng top-k tính sẵn:", json.dumps(build_topk_table(), ensure_ascii=False, indent=2))
     except Exception as e:
-        print(f"Lỗi huấn luyện: {e}")
\ No newline at end of file
+        print(f"Lỗi huấn luyện: {e}")
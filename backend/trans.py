@@ -1,17 +1,33 @@
-from typing import Dict, Any
-from googletrans import Translator, LANGUAGES
+import os
+from concurrent.futures import ThreadPoolExecutor
+from typing import Dict, Any, Optional
 from flask import Flask, request, jsonify
 
+from backend import deadline
+
+try:
+    from googletrans import Translator, LANGUAGES
+except ImportError:
+    Translator, LANGUAGES = None, {}
+
 app = Flask(__name__)  # Tạo Flask app
-_translator = Translator()
+_translator = Translator() if Translator is not None else None
+# googletrans không nhận timeout theo lời gọi: chạy trong pool, chờ tối đa timeout / thời gian còn lại của request
+TRANSLATE_TIMEOUT = float(os.getenv("TRANSLATE_TIMEOUT", "5"))
+_TRANSLATE_POOL = ThreadPoolExecutor(max_workers=int(os.getenv("TRANSLATE_WORKERS", "4")), thread_name_prefix="translate")
 
-def translate_text(text: str, src: str = "auto", dest: str = "en") -> Dict[str, Any]:
+def translate_text(text: str, src: str = "auto", dest: str = "en", timeout: Optional[float] = None) -> Dict[str, Any]:
     text = (text or "").strip()
     if not text:
         return {"error": True, "message": "Empty text"}
+    if _translator is None:
+        return {"error": True, "message": "googletrans chưa được cài đặt"}
     try:
-        res = _translator.translate(text, src=src, dest=dest)
+        limit = deadline.timeout_for(TRANSLATE_TIMEOUT if timeout is None else timeout)
+        res = _TRANSLATE_POOL.submit(_translator.translate, text, src=src, dest=dest).result(timeout=limit)
         return {"ok": True, "src": res.src, "dest": res.dest, "text": text, "translated": res.text}
+    except TimeoutError:
+        return {"error": True, "message": "Dịch quá hạn"}
     except Exception as e:
         return {"error": True, "message": str(e)}
 
@@ -2,6 +2,11 @@ from gtts import gTTS
 import os
 import uuid
 
+from backend import deadline
+
+# Timeout (giây) gọi Google TTS; request có deadline thì lấy phần thời gian còn lại nếu nhỏ hơn
+TTS_TIMEOUT = float(os.getenv("TTS_TIMEOUT", "10"))
+
 def text_to_speech(text, lang="vi"):
     """
     Chuyển văn bản thành giọng nói và lưu thành file MP3 tại responses/audio/jaremis_reply.mp3
@@ -19,7 +24,7 @@ def speak(text, lang="vi"):
     Chuyển văn bản thành giọng nói và lưu thành file MP3 với tên duy nhất.
     """
     filename = f"backend/responses/audio/jaremis_reply_{uuid.uuid4().hex}.mp3"
-    tts = gTTS(text=text, lang=lang)
+    tts = gTTS(text=text, lang=lang, timeout=deadline.timeout_for(TTS_TIMEOUT))
     tts.save(filename)
     return filename
 
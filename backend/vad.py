@@ -0,0 +1,148 @@
+"""
+Phát hiện tiếng nói theo năng lượng (VAD) cho audio PCM 16-bit mono, dùng được theo luồng.
+
+- Audio chia khung VAD_FRAME_MS, mức âm (dBFS) tính 1 lượt numpy trên cả chunk
+- Khung >= ngưỡng liên tục VAD_MIN_SPEECH_MS -> bắt đầu đoạn nói (kèm VAD_PAD_MS trước đó)
+- Im lặng VAD_HANGOVER_MS -> đóng đoạn (pydub AudioSegment, đã cắt im lặng thừa) để gửi STT ngay
+- Im lặng VAD_END_MS sau đoạn cuối -> hết lượt nói ("utterance_end"): transcript đã ổn định
+"""
+import os
+from collections import deque
+from typing import Any, Deque, List, Optional, Tuple
+
+import numpy as np
+from pydub import AudioSegment
+
+VAD_FRAME_MS = int(os.getenv("VAD_FRAME_MS", "20"))
+VAD_THRESHOLD_DBFS = float(os.getenv("VAD_THRESHOLD_DBFS", "-40"))
+VAD_MIN_SPEECH_MS = int(os.getenv("VAD_MIN_SPEECH_MS", "100"))
+VAD_HANGOVER_MS = int(os.getenv("VAD_HANGOVER_MS", "300"))
+VAD_END_MS = int(os.getenv("VAD_END_MS", "700"))
+VAD_PAD_MS = int(os.getenv("VAD_PAD_MS", "150"))
+# Đoạn nói dài hơn bị cắt cứng (STT nhận từng phần, không chờ người dùng ngừng)
+VAD_MAX_SEGMENT_MS = int(os.getenv("VAD_MAX_SEGMENT_MS", "10000"))
+
+SAMPLE_WIDTH = 2
+_FULL_SCALE = float(1 << (8 * SAMPLE_WIDTH - 1))
+
+# Sự kiện: ("speech_start", ms) | ("segment", AudioSegment, start_ms, end_ms) | ("utterance_end", ms)
+Event = Tuple[Any, ...]
+
+
+def frame_dbfs(pcm: bytes, frame_bytes: int) -> np.ndarray:
+    """dBFS từng khung (bỏ phần lẻ cuối); khung câm -> -inf như AudioSegment.dBFS."""
+    n = len(pcm) // frame_bytes
+    if n == 0:
+        return np.empty(0, dtype=np.float64)
+    samples = np.frombuffer(pcm, dtype="<i2", count=n * frame_bytes // SAMPLE_WIDTH).reshape(n, -1)
+    rms = np.sqrt(np.mean(np.square(samples, dtype=np.float64), axis=1))
+    with np.errstate(divide="ignore"):
+        return 20.0 * np.log10(rms / _FULL_SCALE)
+
+
+class EnergyVAD:
+    """
+    Máy trạng thái theo khung. feed() nhận chunk bất kỳ độ dài (phần lẻ giữ lại cho lần sau),
+    trả về danh sách sự kiện. Không thread-safe: mỗi phiên 1 instance, gọi tuần tự.
+    """
+
+    def __init__(self, sample_rate: int = 16000, threshold_dbfs: float = VAD_THRESHOLD_DBFS,
+                 frame_ms: int = VAD_FRAME_MS, min_speech_ms: int = VAD_MIN_SPEECH_MS,
+                 hangover_ms: int = VAD_HANGOVER_MS, end_ms: int = VAD_END_MS, pad_ms: int = VAD_PAD_MS,
+                 max_segment_ms: int = VAD_MAX_SEGMENT_MS):
+        if sample_rate <= 0 or sample_rate * frame_ms % 1000:
+            raise ValueError(f"sample_rate {sample_rate} không chia hết thành khung {frame_ms} ms")
+        self.sample_rate = sample_rate
+        self.threshold_dbfs = threshold_dbfs
+        self.frame_ms = frame_ms
+        self.frame_bytes = sample_rate * frame_ms // 1000 * SAMPLE_WIDTH
+        self._min_speech = max(1, min_speech_ms // frame_ms)
+        self._hangover = max(1, hangover_ms // frame_ms)
+        self._end = max(self._hangover, end_ms // frame_ms)
+        self._pad = pad_ms // frame_ms
+        self._max_segment = max(1, max_segment_ms // frame_ms)
+        self.reset()
+
+    def reset(self) -> None:
+        self._pending = b""
+        self._frames = 0                    # số khung đã xử lý (đồng hồ của luồng audio)
+        self._preroll: Deque[bytes] = deque(maxlen=self._pad + self._min_speech)
+        self._loud_run = 0
+        self._segment: Optional[List[bytes]] = None
+        self._segment_start = 0
+        self._silent_run = 0
+        self._since_speech: Optional[int] = None  # khung im lặng sau đoạn cuối; None = không có gì chờ kết thúc
+
+    @property
+    def in_speech(self) -> bool:
+        return self._segment is not None
+
+    def _ms(self, frames: int) -> int:
+        return frames * self.frame_ms
+
+    def _audio(self, frames: List[bytes]) -> AudioSegment:
+        return AudioSegment(data=b"".join(frames), sample_width=SAMPLE_WIDTH, frame_rate=self.sample_rate, channels=1)
+
+    def _close_segment(self, trailing_silence: int) -> Event:
+        frames = self._segment
+        # Giữ lại VAD_PAD_MS im lặng cuối, bỏ phần còn lại
+        keep = len(frames) - max(0, trailing_silence - self._pad)
+        start = self._segment_start
+        self._segment = None
+        self._silent_run = 0
+        self._since_speech = trailing_silence
+        return ("segment", self._audio(frames[:keep]), self._ms(start), self._ms(start + keep))
+
+    def feed(self, pcm: bytes) -> List[Event]:
+        data = self._pending + pcm
+        usable = len(data) - len(data) % self.frame_bytes
+        self._pending = data[usable:]
+        events: List[Event] = []
+        levels = frame_dbfs(data[:usable], self.frame_bytes)
+        for i, level in enumerate(levels):
+            frame = data[i * self.frame_bytes:(i + 1) * self.frame_bytes]
+            loud = level >= self.threshold_dbfs
+            self._frames += 1
+            if self._segment is None:
+                self._preroll.append(frame)
+                self._loud_run = self._loud_run + 1 if loud else 0
+                if self._loud_run >= self._min_speech:
+                    self._segment = list(self._preroll)
+                    self._segment_start = self._frames - len(self._segment)
+                    self._preroll.clear()
+                    self._loud_run = 0
+                    self._silent_run = 0
+                    if self._since_speech is None:
+                        events.append(("speech_start", self._ms(self._segment_start)))
+                    self._since_speech = None
+                elif self._since_speech is not None:
+                    self._since_speech += 1
+                    if self._since_speech >= self._end:
+                        self._since_speech = None
+                        events.append(("utterance_end", self._ms(self._frames)))
+                continue
+            self._segment.append(frame)
+            self._silent_run = 0 if loud else self._silent_run + 1
+            if self._silent_run >= self._hangover:
+                events.append(self._close_segment(self._silent_run))
+            elif len(self._segment) >= self._max_segment:
+                events.append(self._close_segment(0))
+        return events
+
+    def flush(self) -> List[Event]:
+        """Hết luồng audio: đóng đoạn đang mở và kết thúc lượt nói (nếu có tiếng nói)."""
+        events: List[Event] = []
+        if self._segment is not None:
+            events.append(self._close_segment(self._silent_run))
+        if self._since_speech is not None:
+            events.append(("utterance_end", self._ms(self._frames)))
+        self.reset()
+        return events
+
+
+def split_speech(audio: AudioSegment, sample_rate: int = 16000, **kwargs) -> List[AudioSegment]:
+    """Cả file audio -> các đoạn có tiếng nói (mono, 16-bit, sample_rate), im lặng đã bị cắt."""
+    audio = audio.set_channels(1).set_sample_width(SAMPLE_WIDTH).set_frame_rate(sample_rate)
+    vad = EnergyVAD(sample_rate, **kwargs)
+    events = vad.feed(audio.raw_data) + vad.flush()
+    return [ev[1] for ev in events if ev[0] == "segment"]
@@ -0,0 +1,209 @@
+"""
+Phiên giọng nói qua WebSocket (/ws/voice): nhận audio theo từng chunk lúc đang ghi âm.
+
+Giao thức (JSON text + binary):
+- client -> {"type": "start", "sample_rate": 16000, "mode": "local"|"full", "explain": false} (tùy chọn, gửi lại = phiên mới)
+- client -> binary: PCM 16-bit little-endian mono, độ dài bất kỳ
+- client -> {"type": "stop"}: ngừng nói ngay (bấm-để-nói), không chờ im lặng
+- server -> ready | speech_start | partial {segment, text} | transcript {utterance, text}
+           | diagnosis {utterance, text, result, latency_ms} | error
+
+VAD (backend.vad) và STT (backend.speech_to_text) chạy trong pool riêng: mỗi đoạn nói được nhận dạng
+ngay khi đóng, song song với lúc người dùng nói tiếp. Hết lượt nói -> ghép transcript, chẩn đoán luôn;
+người dùng nói tiếp trước khi có kết quả -> hủy lần chẩn đoán đó, ghép vào lượt mới.
+"""
+import asyncio
+import json
+import os
+import time
+from concurrent.futures import ThreadPoolExecutor
+from typing import Any, Awaitable, Callable, Dict, List, Optional
+
+from backend.admission import PREDICT_ADMISSION, Overloaded
+from backend.metrics import REGISTRY, stage_timer
+from backend.speech_to_text import get_stt_backend
+from backend.vad import EnergyVAD, Event
+
+PIPELINE = "voice_session"
+
+# "local": model nội bộ (analyze_symptoms_text, nhanh); "full": diagnose_and_suggest_async (có API ngoài)
+VOICE_DIAGNOSIS = os.getenv("VOICE_DIAGNOSIS", "local")
+VOICE_SAMPLE_RATE = int(os.getenv("VOICE_SAMPLE_RATE", "16000"))
+VOICE_MAX_CHUNK_BYTES = int(os.getenv("VOICE_MAX_CHUNK_BYTES", str(256 * 1024)))
+
+# VAD + STT của mọi phiên dùng chung pool (STT thường là lời gọi mạng chặn)
+_VOICE_POOL = ThreadPoolExecutor(max_workers=int(os.getenv("VOICE_WORKERS", "4")), thread_name_prefix="voice")
+
+VOICE_EVENTS = REGISTRY.counter("jaremis_voice_events_total", "Sự kiện phiên giọng nói", ("event",))
+
+Send = Callable[[Dict[str, Any]], Awaitable[None]]
+
+
+def _timed(stage: str, fn, *args):
+    with stage_timer(PIPELINE, stage):
+        return fn(*args)
+
+
+def _diagnose_local(text: str, explain: bool) -> Dict[str, Any]:
+    from backend.predict_disease_dl import analyze_symptoms_text
+    try:
+        with PREDICT_ADMISSION.admit():
+            return analyze_symptoms_text(text, explain=explain)
+    except Overloaded as e:
+        return {"error": True, "message": str(e), "retry_after": e.retry_after}
+
+
+class VoiceSession:
+    """1 kết nối: VAD theo luồng, STT từng đoạn, chẩn đoán mỗi khi hết lượt nói."""
+
+    def __init__(self, send: Send, sample_rate: int = VOICE_SAMPLE_RATE, mode: str = VOICE_DIAGNOSIS,
+                 explain: bool = False, stt=None):
+        if mode not in ("local", "full"):
+            raise ValueError("mode phải là 'local' hoặc 'full'")
+        self.vad = EnergyVAD(sample_rate)
+        self.stt = stt or get_stt_backend()
+        self.mode = mode
+        self.explain = explain
+        self._send = send
+        self._loop = asyncio.get_running_loop()
+        self._segment_index = 0
+        self._utterance = 0
+        self._parts: List[asyncio.Task] = []      # STT các đoạn của lượt đang nói
+        self._pending_parts: List[asyncio.Task] = []  # STT của lượt đang chẩn đoán (để ghép nếu nói tiếp)
+        self._diagnosis: Optional[asyncio.Task] = None
+
+    async def feed(self, pcm: bytes) -> None:
+        events = await self._loop.run_in_executor(_VOICE_POOL, _timed, "vad", self.vad.feed, pcm)
+        await self._handle(events)
+
+    async def finish(self) -> None:
+        """Client báo ngừng nói: đóng đoạn đang mở, chẩn đoán ngay và chờ kết quả."""
+        await self._handle(self.vad.flush())
+        if self._diagnosis is not None:
+            await asyncio.gather(self._diagnosis, return_exceptions=True)
+
+    async def close(self) -> None:
+        for task in [self._diagnosis, *self._parts, *self._pending_parts]:
+            if task is not None:
+                task.cancel()
+
+    async def _handle(self, events: List[Event]) -> None:
+        for ev in events:
+            VOICE_EVENTS.inc(ev[0])
+            if ev[0] == "speech_start":
+                self._resume_or_start()
+                await self._send({"type": "speech_start", "utterance": self._utterance, "at_ms": ev[1]})
+            elif ev[0] == "segment":
+                self._parts.append(asyncio.create_task(self._transcribe(*ev[1:])))
+            elif ev[0] == "utterance_end":
+                self._pending_parts, self._parts = self._parts, []
+                self._diagnosis = asyncio.create_task(
+                    self._diagnose(self._utterance, self._pending_parts, time.perf_counter()))
+
+    def _resume_or_start(self) -> None:
+        if self._diagnosis is not None and not self._diagnosis.done():
+            # Nói tiếp trước khi có kết quả: transcript chưa ổn định, bỏ lần chẩn đoán cũ
+            self._diagnosis.cancel()
+            self._parts = self._pending_parts + self._parts
+            VOICE_EVENTS.inc("diagnosis_superseded")
+        else:
+            self._utterance += 1
+        self._pending_parts = []
+        self._diagnosis = None
+
+    async def _transcribe(self, audio, start_ms: int, end_ms: int) -> str:
+        index = self._segment_index
+        self._segment_index += 1
+        try:
+            text = await self._loop.run_in_executor(_VOICE_POOL, _timed, "stt", self.stt.transcribe, audio, index)
+        except Exception as e:
+            # 1 đoạn lỗi không làm hỏng cả lượt: báo client, ghép transcript từ các đoạn còn lại
+            VOICE_EVENTS.inc("stt_error")
+            await self._send({"type": "error", "utterance": self._utterance, "segment": index,
+                              "message": f"Lỗi nhận dạng giọng nói: {e}"})
+            return ""
+        text = (text or "").strip()
+        await self._send({"type": "partial", "utterance": self._utterance, "segment": index, "text": text,
+                          "start_ms": start_ms, "end_ms": end_ms})
+        return text
+
+    async def _diagnose(self, utterance: int, parts: List[asyncio.Task], ended: float) -> None:
+        # shield: hủy lần chẩn đoán không được hủy STT, các đoạn còn dùng cho lượt ghép
+        texts = await asyncio.gather(*(asyncio.shield(p) for p in parts))
+        text = " ".join(t for t in texts if t)
+        await self._send({"type": "transcript", "utterance": utterance, "text": text})
+        if not text:
+            return
+        try:
+            with stage_timer(PIPELINE, "diagnosis"):
+                if self.mode == "full":
+                    from backend.diagnosis import diagnose_and_suggest_async
+                    result = await diagnose_and_suggest_async(text)
+                else:
+                    result = await asyncio.to_thread(_diagnose_local, text, self.explain)
+        except Exception as e:
+            # Task chạy nền: không báo lỗi thì client chờ mãi kết quả của lượt này
+            VOICE_EVENTS.inc("diagnosis_error")
+            await self._send({"type": "error", "utterance": utterance, "text": text,
+                              "message": f"Lỗi chẩn đoán: {e}"})
+            return
+        await self._send({"type": "diagnosis", "utterance": utterance, "text": text, "result": result,
+                          "latency_ms": round((time.perf_counter() - ended) * 1000, 1)})
+
+
+async def serve_websocket(websocket) -> None:
+    """Vòng lặp giao thức cho starlette/FastAPI WebSocket."""
+    await websocket.accept()
+    lock = asyncio.Lock()
+
+    async def send(msg: Dict[str, Any]) -> None:
+        # Nhiều task (partial, diagnosis) cùng gửi; socket đã đóng thì bỏ qua
+        async with lock:
+            try:
+                await websocket.send_text(json.dumps(msg, ensure_ascii=False))
+            except Exception:
+                pass
+
+    session: Optional[VoiceSession] = None
+    try:
+        while True:
+            msg = await websocket.receive()
+            if msg["type"] == "websocket.disconnect":
+                break
+            data, text = msg.get("bytes"), msg.get("text")
+            if data is not None:
+                if len(data) > VOICE_MAX_CHUNK_BYTES:
+                    await send({"type": "error", "message": f"Chunk audio lớn quá {VOICE_MAX_CHUNK_BYTES} byte"})
+                    await websocket.close(code=1009)
+                    break
+                if session is None:
+                    session = VoiceSession(send)
+                await session.feed(data)
+                continue
+            try:
+                control = json.loads(text or "")
+            except ValueError:
+                await send({"type": "error", "message": "Tin nhắn điều khiển phải là JSON"})
+                continue
+            kind = control.get("type") if isinstance(control, dict) else None
+            if kind == "start":
+                if session is not None:
+                    await session.close()
+                try:
+                    session = VoiceSession(send, sample_rate=int(control.get("sample_rate", VOICE_SAMPLE_RATE)),
+                                           mode=control.get("mode", VOICE_DIAGNOSIS),
+                                           explain=bool(control.get("explain", False)))
+                except (TypeError, ValueError) as e:
+                    session = None
+                    await send({"type": "error", "message": str(e)})
+                    continue
+                await send({"type": "ready", "sample_rate": session.vad.sample_rate, "mode": session.mode,
+                            "stt": getattr(session.stt, "name", type(session.stt).__name__)})
+            elif kind == "stop":
+                if session is not None:
+                    await session.finish()
+            else:
+                await send({"type": "error", "message": f"Loại tin nhắn không hỗ trợ: {kind}"})
+    finally:
+        if session is not None:
+            await session.close()
@@ -1,10 +1,7 @@
 import os
-from typing import Any, Dict, List
+from typing import Any, Dict, List, Optional
 
-try:
-    import requests
-except ImportError:
-    requests = None
+from backend import deadline, http_client
 
 try:
     from dotenv import load_dotenv
@@ -12,13 +9,14 @@ except ImportError:
     load_dotenv = None
 
 
-def get_popular_diseases() -> List[Dict[str, Any]]:
+def get_popular_diseases() -> Optional[List[Dict[str, Any]]]:
     """
     Gọi WHO API (hoặc endpoint bạn cấu hình) để lấy danh sách bệnh phổ biến.
     backend/.env:
       WHO_API_URL=...
       WHO_API_KEY=... (nếu cần)
     Hỗ trợ cả JSON list, dict có 'value' (OData) hoặc dict đơn.
+    Bị bỏ qua (hết deadline) hoặc WHO lỗi -> None, để phân biệt với danh sách rỗng thật (không được cache).
     """
     if load_dotenv:
         load_dotenv(dotenv_path='backend/.env')
@@ -26,17 +24,20 @@ def get_popular_diseases() -> List[Dict[str, Any]]:
     api_key = os.getenv("WHO_API_KEY")
     api_url = os.getenv("WHO_API_URL")
 
-    if not api_url or requests is None:
+    if not api_url:
         return []
+    # Enrichment tùy chọn: request sắp hết deadline thì bỏ qua
+    if not deadline.allow("popular_diseases"):
+        return None
 
     headers = {}
     if api_key:
         headers["Authorization"] = f"Bearer {api_key}"
 
     try:
-        resp = requests.get(api_url, headers=headers, timeout=10)
-        if not resp.ok:
-            return []
+        resp = http_client.get(api_url, headers=headers, timeout=deadline.optional_timeout(10))
+        if resp.status_code >= 400:
+            return None
         data = resp.json()
         # Chuẩn hóa format trả về: ưu tiên list
         if isinstance(data, dict) and isinstance(data.get("value"), list):
@@ -45,4 +46,4 @@ def get_popular_diseases() -> List[Dict[str, Any]]:
             return data
         return [data]
     except Exception:
-        return []
\ No newline at end of file
+        return None
\ No newline at end of file
@@ -0,0 +1,8 @@
+"""
+Bộ benchmark cho các đường nóng (predict, chuẩn hóa, trích xuất, huấn luyện, HTTP).
+
+Chạy từ thư mục gốc dự án:
+    python -m benchmarks run --out bench/base.json
+    python -m benchmarks run --only predict,normalize --out bench/new.json
+    python -m benchmarks compare bench/base.json bench/new.json --threshold 0.10
+"""
@@ -0,0 +1,96 @@
+import argparse
+import json
+import os
+import sys
+
+from benchmarks import harness
+# Import để đăng ký benchmark vào harness.REGISTRY
+from benchmarks import bench_predict, bench_normalize, bench_analyzer, bench_train, bench_http, bench_suggest, bench_consolidation, bench_voice  # noqa: F401
+
+
+def _select(only: str):
+    names = list(harness.REGISTRY)
+    if not only:
+        return names
+    wanted = [w.strip() for w in only.split(",") if w.strip()]
+    return [n for n in names
+            if any(n == w or n.startswith(w + ".") or harness.REGISTRY[n].group == w for w in wanted)]
+
+
+def cmd_run(args) -> int:
+    ctx = {
+        "repeat": args.repeat,
+        "min_time": args.min_time,
+        "http_url": args.http_url,
+        "http_requests": args.http_requests,
+        "http_concurrency": args.http_concurrency,
+        "train_scales": tuple(int(x) for x in args.train_scales.split(",") if x),
+        "train_epochs": args.train_epochs,
+    }
+    names = _select(args.only)
+    if not names:
+        print("Không có benchmark nào khớp --only", file=sys.stderr)
+        return 2
+    try:
+        report = harness.run(names, ctx)
+    finally:
+        for path in ctx.get("_cleanup", []):
+            try:
+                os.remove(path)
+            except OSError:
+                pass
+    if args.out:
+        harness.save(report, args.out)
+        print(f"Đã lưu kết quả: {args.out}")
+    return 0
+
+
+def cmd_compare(args) -> int:
+    with open(args.base, encoding="utf-8") as f:
+        base = json.load(f)
+    with open(args.new, encoding="utf-8") as f:
+        new = json.load(f)
+    diff = harness.compare(base, new, threshold=args.threshold)
+    for r in diff["rows"]:
+        mark = {"regression": "!!", "improvement": "++", "ok": "  "}[r["status"]]
+        print(f"{mark} {r['name']:<45} {r['base_s'] * 1e3:10.3f} ms -> {r['new_s'] * 1e3:10.3f} ms  x{r['ratio']:.2f}")
+    if args.out:
+        harness.save(diff, args.out)
+    if diff["regressions"]:
+        print(f"Regression (> {args.threshold:.0%}): {', '.join(diff['regressions'])}")
+        return 1
+    return 0
+
+
+def main(argv=None) -> int:
+    parser = argparse.ArgumentParser(prog="python -m benchmarks")
+    sub = parser.add_subparsers(dest="cmd", required=True)
+
+    r = sub.add_parser("run", help="Chạy benchmark và ghi kết quả JSON")
+    r.add_argument("--only", default="", help="Lọc theo tên/nhóm, vd: predict,normalize,suggest,consolidation,http.predict.load")
+    r.add_argument("--out", default="", help="File JSON kết quả")
+    r.add_argument("--repeat", type=int, default=None)
+    r.add_argument("--min-time", type=float, default=None, help="Thời gian tối thiểu mỗi lần đo (giây)")
+    r.add_argument("--http-url", default="", help="vd: http://127.0.0.1:5000/predict (bỏ trống = bỏ qua)")
+    r.add_argument("--http-requests", type=int, default=500)
+    r.add_argument("--http-concurrency", type=int, default=8)
+    r.add_argument("--train-scales", default="1", help="Hệ số nhân dữ liệu train, vd: 1,4,16")
+    r.add_argument("--train-epochs", type=int, default=1)
+    r.set_defaults(func=cmd_run)
+
+    c = sub.add_parser("compare", help="So sánh 2 file kết quả, exit 1 nếu có regression")
+    c.add_argument("base")
+    c.add_argument("new")
+    c.add_argument("--threshold", type=float, default=0.10)
+    c.add_argument("--out", default="")
+    c.set_defaults(func=cmd_compare)
+
+    sub.add_parser("list", help="Liệt kê benchmark").set_defaults(
+        func=lambda a: print("\n".join(f"{n}  [{b.group}]" for n, b in harness.REGISTRY.items())) or 0)
+
+    args = parser.parse_args(argv)
+    return args.func(args)
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,20 @@
+from benchmarks.harness import benchmark
+
+SHORT_TEXT = "Tôi bị ho và sốt từ hôm qua, hơi đau họng."
+LONG_TEXT = " ".join([
+    "Bệnh nhân nam 45 tuổi, ba ngày nay sốt cao về chiều, ho khan, đau họng, mệt mỏi nhiều.",
+    "Kèm đau đầu, chóng mặt khi đứng dậy, buồn nôn nhưng không nôn mửa, đi ngoài phân lỏng 2 lần.",
+    "Hai ngày gần đây khó thở khi gắng sức, đau ngực âm ỉ bên trái, đau cơ toàn thân và đau khớp gối.",
+    "Tiền sử tăng huyết áp, không dị ứng thuốc. Gia đình có người bị cúm tuần trước.",
+] * 8)
+
+
+def _setup(text: str):
+    def setup(ctx):
+        from backend.analyzer import extract_symptoms
+        return (lambda: extract_symptoms(text)), 1
+    return setup
+
+
+benchmark("analyzer.extract_symptoms.short", "extract")(_setup(SHORT_TEXT))
+benchmark("analyzer.extract_symptoms.long", "extract")(_setup(LONG_TEXT))
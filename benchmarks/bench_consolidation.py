@@ -0,0 +1,91 @@
+import json
+import os
+import subprocess
+import sys
+from typing import Any, Dict, List
+
+from benchmarks.bench_predict import _loaded, _symptom_sets
+from benchmarks.harness import benchmark, summarize
+
+# Cách triển khai cũ: mỗi app 1 process riêng
+SEPARATE_APPS = ["api", "backend.main", "backend.gemini", "backend.trans"]
+CONSOLIDATED_APP = "backend.asgi"
+
+# Chạy trong process con: import app, dự đoán 1 lần nếu app có dùng model (nạp model),
+# in RSS (MB) + thời gian khởi động
+_CHILD = r"""
+import json, sys, time, resource
+t0 = time.perf_counter()
+for name in sys.argv[1:]:
+    __import__(name)
+if "backend.predict_disease_dl" in sys.modules:
+    sys.modules["backend.predict_disease_dl"].predict_disease(["sốt", "ho"])
+startup = time.perf_counter() - t0
+rss = 0.0
+try:
+    with open("/proc/self/status") as f:
+        for line in f:
+            if line.startswith("VmRSS:"):
+                rss = int(line.split()[1]) / 1024.0
+except OSError:
+    rss = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024.0
+print(json.dumps({"rss_mb": rss, "startup_s": startup}))
+"""
+
+
+def _child_env() -> Dict[str, str]:
+    env = dict(os.environ)
+    env.setdefault("TF_CPP_MIN_LOG_LEVEL", "3")
+    env.setdefault("LLM_BACKEND", "fake")  # gemini.py không cần GOOGLE_API_KEY khi đo
+    return env
+
+
+def _spawn(modules: List[str]) -> Dict[str, Any]:
+    out = subprocess.run([sys.executable, "-c", _CHILD, *modules], capture_output=True, text=True,
+                         env=_child_env(), timeout=600, check=True)
+    return json.loads(out.stdout.strip().splitlines()[-1])
+
+
+@benchmark("consolidation.memory", "consolidation", repeat=1, min_time=0)
+def consolidation_memory(ctx):
+    """RSS tổng của 4 process riêng so với 1 process backend.asgi (model nạp 1 lần)."""
+    separate = {name: _spawn([name]) for name in SEPARATE_APPS}
+    merged = _spawn([CONSOLIDATED_APP])
+    rss_separate = sum(r["rss_mb"] for r in separate.values())
+    stats = summarize([merged["startup_s"]])
+    stats.update({
+        "rss_separate_mb": round(rss_separate, 1),
+        "rss_separate_by_app_mb": {k: round(v["rss_mb"], 1) for k, v in separate.items()},
+        "rss_consolidated_mb": round(merged["rss_mb"], 1),
+        "rss_saved_mb": round(rss_separate - merged["rss_mb"], 1),
+        "startup_separate_s": {k: round(v["startup_s"], 3) for k, v in separate.items()},
+    })
+    return stats
+
+
+def _latency(path: str, via_asgi: bool):
+    def setup(ctx):
+        p = _loaded(ctx)
+        payloads = [{"symptoms": s} for s in _symptom_sets(200)]
+        if via_asgi:
+            from starlette.testclient import TestClient
+            from backend.asgi import app
+            client = TestClient(app)
+        else:
+            from api import app
+            client = app.test_client()
+        state = {"i": 0}
+
+        def op():
+            p._PREDICT_CACHE.clear()
+            resp = client.post(path, json=payloads[state["i"] % len(payloads)])
+            assert resp.status_code == 200, resp.status_code
+            state["i"] += 1
+        return op, 1
+    return setup
+
+
+# Flask gọi trực tiếp vs cùng route đi qua cầu ASGI -> WSGI, và route FastAPI gốc
+benchmark("consolidation.latency.flask_direct", "consolidation")(_latency("/predict", via_asgi=False))
+benchmark("consolidation.latency.asgi_flask", "consolidation")(_latency("/predict", via_asgi=True))
+benchmark("consolidation.latency.asgi_fastapi", "consolidation")(_latency("/predict/disease", via_asgi=True))
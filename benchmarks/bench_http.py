@@ -0,0 +1,91 @@
+import json
+import threading
+import time
+import urllib.request
+from concurrent.futures import ThreadPoolExecutor
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+from benchmarks.bench_predict import _symptom_sets
+from benchmarks.harness import benchmark, summarize
+
+
+@benchmark("http.predict.load", "http")
+def http_predict_load(ctx):
+    """Tải end-to-end lên /predict của 1 server đang chạy (--http-url)."""
+    url = ctx.get("http_url")
+    if not url:
+        return None
+    total = int(ctx.get("http_requests", 500))
+    concurrency = int(ctx.get("http_concurrency", 8))
+    payloads = [json.dumps({"symptoms": s}).encode("utf-8") for s in _symptom_sets(total)]
+    errors = 0
+
+    def one(body: bytes) -> float:
+        nonlocal errors
+        req = urllib.request.Request(url, data=body, headers={"Content-Type": "application/json"})
+        start = time.perf_counter()
+        try:
+            with urllib.request.urlopen(req, timeout=30) as resp:
+                resp.read()
+        except Exception:
+            errors += 1
+        return time.perf_counter() - start
+
+    one(payloads[0])  # warmup
+    start = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=concurrency) as pool:
+        latencies = list(pool.map(one, payloads))
+    wall = time.perf_counter() - start
+
+    stats = summarize(latencies)
+    stats.update({
+        "items": total,
+        "items_per_s": total / wall if wall > 0 else 0.0,
+        "concurrency": concurrency,
+        "errors": errors,
+        "url": url,
+    })
+    return stats
+
+
+class _StubHandler(BaseHTTPRequestHandler):
+    """Server JSON cục bộ giả lập API ngoài (HTTP/1.1 keep-alive)."""
+
+    protocol_version = "HTTP/1.1"
+    # Header và body ghi 2 lần: không tắt Nagle thì mỗi request keep-alive chờ delayed ACK ~40 ms
+    disable_nagle_algorithm = True
+
+    def do_GET(self):
+        body = b'{"value": []}'
+        self.send_response(200)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, *args):
+        pass
+
+
+def _stub_url(ctx) -> str:
+    if "_stub_url" not in ctx:
+        server = ThreadingHTTPServer(("127.0.0.1", 0), _StubHandler)
+        threading.Thread(target=server.serve_forever, daemon=True).start()
+        ctx["_stub_url"] = f"http://127.0.0.1:{server.server_address[1]}/who"
+    return ctx["_stub_url"]
+
+
+@benchmark("http_client.get.pooled", "http")
+def http_client_pooled(ctx):
+    """50 GET qua backend.http_client (pool keep-alive theo host) tới stub server cục bộ."""
+    from backend import http_client
+    url = _stub_url(ctx)
+    return (lambda: [http_client.get(url).json() for _ in range(50)]), 50
+
+
+@benchmark("http_client.requests_baseline", "http")
+def requests_baseline(ctx):
+    """Cách cũ: requests.get trần, mỗi lời gọi 1 kết nối TCP mới."""
+    import requests
+    url = _stub_url(ctx)
+    return (lambda: [requests.get(url, timeout=10).json() for _ in range(50)]), 50
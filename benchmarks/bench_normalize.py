@@ -0,0 +1,107 @@
+import json
+import os
+import random
+import tempfile
+
+from benchmarks.harness import benchmark
+
+
+def _loaded(ctx):
+    from backend import predict_disease_dl as p
+    if not p.all_symptoms:
+        p.load_model()
+    ctx["model_version"] = p.model_version
+    return p
+
+
+def _typo(s: str, rng: random.Random) -> str:
+    """Hoán đổi 2 ký tự kề nhau -> token chỉ khớp được qua fuzzy match."""
+    if len(s) < 4:
+        return s + s[-1]
+    i = rng.randrange(1, len(s) - 2)
+    return s[:i] + s[i + 1] + s[i] + s[i + 2:]
+
+
+def _tokens(p, kind: str, n: int = 16):
+    rng = random.Random(1)
+    base = rng.sample(p.all_symptoms, n)
+    if kind == "exact":
+        return base, None
+    if kind == "synonym":
+        # Sinh file synonyms tạm: canonical -> ["<canonical> nhẹ"]
+        syn = {s: [f"{s} nhẹ"] for s in p.all_symptoms}
+        return [f"{s} nhẹ" for s in base], syn
+    return [_typo(s, rng) for s in base], None
+
+
+def _setup(kind: str):
+    def setup(ctx):
+        p = _loaded(ctx)
+        tokens, synonyms = _tokens(p, kind)
+        if synonyms is not None:
+            fd, path = tempfile.mkstemp(suffix=".json")
+            with os.fdopen(fd, "w", encoding="utf-8") as f:
+                json.dump(synonyms, f, ensure_ascii=False)
+            ctx.setdefault("_cleanup", []).append(path)
+        else:
+            path = os.path.join(tempfile.gettempdir(), "jaremis_no_synonyms.json")
+
+        def op():
+            old = p.SYNONYMS_PATH
+            p.SYNONYMS_PATH = path
+            try:
+                p._normalize_input_symptoms(tokens)
+            finally:
+                p.SYNONYMS_PATH = old
+        return op, len(tokens)
+    return setup
+
+
+for _kind in ("exact", "synonym", "fuzzy"):
+    benchmark(f"normalize_input_symptoms.{_kind}", "normalize")(_setup(_kind))
+
+
+def _vocabulary():
+    path = os.path.join("backend", "models", "symptoms_list.json")
+    with open(path, encoding="utf-8") as f:
+        return json.load(f)
+
+
+@benchmark("text_norm.fold.cached", "normalize")
+def fold_cached(ctx):
+    from backend.text_norm import fold
+    vocab = _vocabulary()[:256]
+    for s in vocab:
+        fold(s)
+    return (lambda: [fold(s) for s in vocab]), len(vocab)
+
+
+@benchmark("text_norm.fold.uncached", "normalize")
+def fold_uncached(ctx):
+    from backend.text_norm import fold
+    vocab = _vocabulary()[:256]
+    raw = fold.__wrapped__
+    return (lambda: [raw(s) for s in vocab]), len(vocab)
+
+
+@benchmark("text_norm.fold_many.vocabulary", "normalize")
+def fold_many_vocabulary(ctx):
+    """Chuẩn hóa cả từ điển 1 lượt (dựng lại bảng tra khi đổi model/synonyms)."""
+    from backend.text_norm import fold_many
+    vocab = _vocabulary()
+    return (lambda: fold_many(vocab)), len(vocab)
+
+
+@benchmark("text_norm.unicodedata_baseline.vocabulary", "normalize")
+def unicodedata_vocabulary(ctx):
+    """Cách cũ (NFD + lọc theo category + regex) để so với text_norm.fold_many."""
+    import re
+    import unicodedata
+    vocab = _vocabulary()
+    space = re.compile(r"\s+")
+
+    def norm(s):
+        s = unicodedata.normalize("NFD", s.strip().lower())
+        s = "".join(ch for ch in s if unicodedata.category(ch) != "Mn")
+        return space.sub(" ", s).strip()
+    return (lambda: [norm(s) for s in vocab]), len(vocab)
@@ -0,0 +1,144 @@
+import json
+import random
+from typing import Any, Dict, List
+
+from benchmarks.harness import benchmark
+
+MAPPING_PATH = "backend/data/disease_symptom_mapping.json"
+
+
+def _symptom_sets(n: int, seed: int = 0) -> List[List[str]]:
+    """Lấy n tập triệu chứng thực tế từ mapping (lặp vòng nếu thiếu)."""
+    with open(MAPPING_PATH, encoding="utf-8") as f:
+        mapping = json.load(f)
+    rng = random.Random(seed)
+    rows = [list(e["symptoms"]) for e in mapping if isinstance(e, dict) and e.get("symptoms")]
+    rng.shuffle(rows)
+    return [rows[i % len(rows)] for i in range(n)]
+
+
+def _loaded(ctx: Dict[str, Any]):
+    from backend import predict_disease_dl as p
+    if p.model is None:
+        p.load_model()
+    ctx["model_version"] = p.model_version
+    return p
+
+
+@benchmark("predict_disease.single.cold", "predict")
+def predict_single_cold(ctx):
+    """1 request đầy đủ (normalize + inference + severity + advice), bỏ qua cache kết quả."""
+    p = _loaded(ctx)
+    sets = _symptom_sets(256)
+    state = {"i": 0}
+
+    def op():
+        p._PREDICT_CACHE.clear()
+        p.predict_disease(sets[state["i"] % len(sets)])
+        state["i"] += 1
+    return op, 1
+
+
+@benchmark("predict_disease.single.cached", "predict")
+def predict_single_cached(ctx):
+    p = _loaded(ctx)
+    syms = _symptom_sets(1)[0]
+    p.predict_disease(syms)
+    return (lambda: p.predict_disease(syms)), 1
+
+
+@benchmark("topk_table.lookup", "predict")
+def topk_table_lookup(ctx):
+    """Tra bảng top-k tính sẵn (không suy luận); bỏ qua nếu bảng chưa dựng cho model hiện tại."""
+    p = _loaded(ctx)
+    from backend.topk_table import get_table
+    table = get_table(p.model_version)
+    if table is None:
+        return None
+    keys = [[p._symptom_index[s] for s in p._normalize_input_symptoms(syms)] for syms in _symptom_sets(256)]
+    state = {"i": 0}
+
+    def op():
+        table.lookup(keys[state["i"] % len(keys)])
+        state["i"] += 1
+    return op, 1
+
+
+def _batch(n: int):
+    def setup(ctx):
+        p = _loaded(ctx)
+        sets = [p._normalize_input_symptoms(s) for s in _symptom_sets(n)]
+        return (lambda: p.predict_proba_batch(sets, normalized=True)), n
+    return setup
+
+
+for _n in (1, 32, 512):
+    benchmark(f"predict_proba_batch.b{_n}", "predict")(_batch(_n))
+
+
+def _explain(method: str):
+    def setup(ctx):
+        p = _loaded(ctx)
+        sets = [p._normalize_input_symptoms(s) for s in _symptom_sets(256)]
+        state = {"i": 0}
+
+        def op():
+            p.explain_prediction(sets[state["i"] % len(sets)], method=method)
+            state["i"] += 1
+        return op, 1
+    return setup
+
+
+@benchmark("severity.candidates", "predict")
+def severity_candidates(ctx):
+    """Mức độ cho top-3 ứng viên của 1 request (đặc trưng tính sẵn, 1 lượt NumPy)."""
+    p = _loaded(ctx)
+    sets = [p._normalize_input_symptoms(s) for s in _symptom_sets(256)]
+    cands = [(i, p.all_diseases[i], 0.3) for i in range(3)]
+    state = {"i": 0}
+
+    def op():
+        p._candidate_severity(cands, sets[state["i"] % len(sets)])
+        state["i"] += 1
+    return op, 3
+
+
+@benchmark("severity.batch.b512", "predict")
+def severity_batch_512(ctx):
+    """Mức độ top-3 cho cả lô 512 tập triệu chứng từ ma trận xác suất có sẵn."""
+    p = _loaded(ctx)
+    sets = [p._normalize_input_symptoms(s) for s in _symptom_sets(512)]
+    X = p.encode_symptom_sets(sets)
+    probs = p.predict_proba_batch(sets, normalized=True)
+    return (lambda: p.severity_batch(probs, X, top_k=3)), len(sets)
+
+
+@benchmark("predict_texts_batch.b256", "predict")
+def predict_texts_batch_256(ctx):
+    """Chẩn đoán hàng loạt 256 câu mô tả (trích triệu chứng + 1 lần suy luận theo lô), như /predict/text/bulk."""
+    p = _loaded(ctx)
+    texts = ["Bệnh nhân " + ", ".join(s) + " từ hôm qua" for s in _symptom_sets(256)]
+    return (lambda: p.predict_texts_batch(texts)), len(texts)
+
+
+# So với predict_proba_batch.b1: giải thích nên tốn ~ 1 lần suy luận
+for _m in ("occlusion", "gradient"):
+    benchmark(f"explain_prediction.{_m}", "predict")(_explain(_m))
+
+
+def _retrieval(method: str):
+    def setup(ctx):
+        from backend.retrieval import get_index
+        index = get_index()
+        sets = _symptom_sets(256)
+        state = {"i": 0}
+
+        def op():
+            index.search(sets[state["i"] % len(sets)], top_k=5, method=method)
+            state["i"] += 1
+        return op, 1
+    return setup
+
+
+for _m in ("bm25", "jaccard"):
+    benchmark(f"retrieval.search.{_m}", "predict")(_retrieval(_m))
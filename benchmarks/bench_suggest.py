@@ -0,0 +1,29 @@
+import random
+
+from benchmarks.harness import benchmark
+
+
+def _keystrokes(typo: bool, n_words: int = 200):
+    def setup(ctx):
+        from backend.symptom_suggest import get_suggester
+        s = get_suggester()
+        rng = random.Random(2)
+        words = rng.sample([e[0] for e in s.entries], min(n_words, len(s.entries)))
+        queries = []
+        for w in words:
+            if typo and len(w) > 4:
+                i = rng.randrange(1, len(w) - 1)
+                queries.append(w[:i] + "x" + w[i + 1:])
+            elif not typo:
+                queries.extend(w[:k] for k in range(1, len(w) + 1))
+        state = {"i": 0}
+
+        def op():
+            s.suggest(queries[state["i"] % len(queries)], 10)
+            state["i"] += 1
+        return op, 1
+    return setup
+
+
+benchmark("symptom_suggest.keystroke", "suggest")(_keystrokes(False))
+benchmark("symptom_suggest.typo", "suggest")(_keystrokes(True))
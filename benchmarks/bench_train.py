@@ -0,0 +1,42 @@
+import json
+import os
+import shutil
+import tempfile
+import time
+
+from benchmarks.harness import benchmark, summarize
+
+MAPPING_PATH = "backend/data/disease_symptom_mapping.json"
+
+
+def _setup(scale: int):
+    def setup(ctx):
+        if scale not in ctx.get("train_scales", (1,)):
+            return None
+        from backend.mapping_io import load_mapping
+        from backend.train_disease_model_dl import train_model
+        mapping = load_mapping(MAPPING_PATH)
+        # Nhân bản dữ liệu gốc `scale` lần (giữ nguyên tập triệu chứng/bệnh)
+        workdir = tempfile.mkdtemp(prefix="jaremis_bench_train_")
+        data_path = os.path.join(workdir, "mapping.json")
+        with open(data_path, "w", encoding="utf-8") as f:
+            json.dump(mapping * scale, f, ensure_ascii=False)
+
+        epochs = int(ctx.get("train_epochs", 1))
+        samples = []
+        try:
+            for _ in range(int(ctx.get("train_repeat", 2))):
+                start = time.perf_counter()
+                train_model(mapping_path=data_path, model_dir=os.path.join(workdir, "models"),
+                            epochs=epochs, verbose=0)
+                samples.append(time.perf_counter() - start)
+        finally:
+            shutil.rmtree(workdir, ignore_errors=True)
+        stats = summarize(samples, items=len(mapping) * scale * epochs)
+        stats["epochs"] = epochs
+        return stats
+    return setup
+
+
+for _scale in (1, 4, 16):
+    benchmark(f"train_model.x{_scale}", "train")(_setup(_scale))
@@ -0,0 +1,35 @@
+import numpy as np
+
+from benchmarks.harness import benchmark
+
+SAMPLE_RATE = 16000
+
+
+def _speech_like(seconds: int) -> bytes:
+    """Xen kẽ tiếng (sóng sin 0.4-1.2s) và im lặng có nhiễu nền (0.2-1s), PCM 16-bit mono."""
+    rng = np.random.RandomState(0)
+    parts, total = [], 0
+    while total < seconds * SAMPLE_RATE:
+        n = int(rng.uniform(0.4, 1.2) * SAMPLE_RATE)
+        t = np.arange(n) / SAMPLE_RATE
+        parts.append(0.3 * 32767 * np.sin(2 * np.pi * rng.uniform(120, 300) * t))
+        m = int(rng.uniform(0.2, 1.0) * SAMPLE_RATE)
+        parts.append(rng.randn(m) * 30)
+        total += n + m
+    return np.concatenate(parts)[:seconds * SAMPLE_RATE].astype("<i2").tobytes()
+
+
+@benchmark("vad.feed.60s_chunk100ms", "voice")
+def vad_feed(ctx):
+    """60 giây audio gửi theo chunk 100 ms như client WebSocket (items = số chunk)."""
+    from backend.vad import EnergyVAD
+    pcm = _speech_like(60)
+    step = SAMPLE_RATE // 10 * 2
+    chunks = [pcm[i:i + step] for i in range(0, len(pcm), step)]
+
+    def op():
+        vad = EnergyVAD(SAMPLE_RATE)
+        for c in chunks:
+            vad.feed(c)
+        vad.flush()
+    return op, len(chunks)
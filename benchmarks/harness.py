@@ -0,0 +1,159 @@
+import json
+import os
+import platform
+import statistics
+import subprocess
+import sys
+import time
+from dataclasses import dataclass
+from typing import Any, Callable, Dict, List, Optional
+
+# name -> Benchmark, theo thứ tự đăng ký
+REGISTRY: Dict[str, "Benchmark"] = {}
+
+
+@dataclass
+class Benchmark:
+    name: str
+    group: str
+    # setup(ctx) -> (op, items): op() là thao tác được đo, items = số phần tử xử lý mỗi lần gọi op
+    setup: Callable[[Dict[str, Any]], Any]
+    repeat: int = 7
+    min_time: float = 0.2
+
+
+def benchmark(name: str, group: str, repeat: int = 7, min_time: float = 0.2):
+    """Decorator đăng ký 1 benchmark vào REGISTRY."""
+    def deco(fn):
+        REGISTRY[name] = Benchmark(name=name, group=group, setup=fn, repeat=repeat, min_time=min_time)
+        return fn
+    return deco
+
+
+def _calibrate(op: Callable[[], Any], min_time: float) -> int:
+    """Tìm số vòng lặp để mỗi lần đo kéo dài >= min_time (tránh nhiễu timer)."""
+    number = 1
+    while True:
+        start = time.perf_counter()
+        for _ in range(number):
+            op()
+        elapsed = time.perf_counter() - start
+        if elapsed >= min_time or number >= 1 << 20:
+            return number
+        number = max(number * 2, int(number * min_time / max(elapsed, 1e-9)))
+
+
+def measure(op: Callable[[], Any], items: int = 1, repeat: int = 7, min_time: float = 0.2,
+            warmup: int = 1) -> Dict[str, Any]:
+    for _ in range(warmup):
+        op()
+    number = _calibrate(op, min_time) if min_time > 0 else 1
+    samples: List[float] = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        for _ in range(number):
+            op()
+        samples.append((time.perf_counter() - start) / number)
+    return summarize(samples, items=items, number=number)
+
+
+def percentile(sorted_values: List[float], q: float) -> float:
+    if not sorted_values:
+        return 0.0
+    k = (len(sorted_values) - 1) * q
+    lo = int(k)
+    hi = min(lo + 1, len(sorted_values) - 1)
+    return sorted_values[lo] + (sorted_values[hi] - sorted_values[lo]) * (k - lo)
+
+
+def summarize(samples: List[float], items: int = 1, number: int = 1) -> Dict[str, Any]:
+    """Thống kê thời gian mỗi lần gọi (giây) + throughput (phần tử/giây)."""
+    s = sorted(samples)
+    median = statistics.median(s)
+    return {
+        "median_s": median,
+        "mean_s": statistics.fmean(s),
+        "stdev_s": statistics.stdev(s) if len(s) > 1 else 0.0,
+        "min_s": s[0],
+        "max_s": s[-1],
+        "p95_s": percentile(s, 0.95),
+        "p99_s": percentile(s, 0.99),
+        "items": items,
+        "items_per_s": (items / median) if median > 0 else 0.0,
+        "repeat": len(s),
+        "number": number,
+    }
+
+
+def _git_rev() -> Optional[str]:
+    try:
+        return subprocess.check_output(["git", "rev-parse", "--short", "HEAD"],
+                                       stderr=subprocess.DEVNULL, text=True).strip()
+    except Exception:
+        return None
+
+
+def run(names: List[str], ctx: Dict[str, Any], log=print) -> Dict[str, Any]:
+    results: Dict[str, Any] = {}
+    for name in names:
+        bench = REGISTRY[name]
+        try:
+            prepared = bench.setup(ctx)
+        except Exception as e:
+            log(f"[skip] {name}: {e}")
+            results[name] = {"group": bench.group, "skipped": str(e)}
+            continue
+        if prepared is None:
+            log(f"[skip] {name}")
+            continue
+        if isinstance(prepared, dict):
+            # Benchmark tự đo (vd. HTTP load) -> trả sẵn thống kê
+            stats = prepared
+        else:
+            op, items = prepared
+            stats = measure(op, items=items, repeat=ctx.get("repeat") or bench.repeat,
+                            min_time=bench.min_time if ctx.get("min_time") is None else ctx["min_time"])
+        stats["group"] = bench.group
+        results[name] = stats
+        log(f"{name:<45} median={stats['median_s'] * 1e3:10.3f} ms  "
+            f"p95={stats['p95_s'] * 1e3:10.3f} ms  {stats['items_per_s']:12.1f} items/s")
+    return {
+        "meta": {
+            "timestamp": time.strftime("%Y-%m-%dT%H:%M:%S"),
+            "git_rev": _git_rev(),
+            "python": sys.version.split()[0],
+            "platform": platform.platform(),
+            "cpu_count": os.cpu_count(),
+            "model_version": ctx.get("model_version"),
+        },
+        "results": results,
+    }
+
+
+def save(report: Dict[str, Any], path: str) -> None:
+    os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+    with open(path, "w", encoding="utf-8") as f:
+        json.dump(report, f, ensure_ascii=False, indent=2)
+
+
+def compare(base: Dict[str, Any], new: Dict[str, Any], threshold: float = 0.10) -> Dict[str, Any]:
+    """
+    So sánh median giữa 2 lần chạy.
+    ratio = new/base; > 1 + threshold -> regression, < 1 - threshold -> improvement.
+    """
+    rows = []
+    b_res, n_res = base.get("results", {}), new.get("results", {})
+    for name in sorted(set(b_res) & set(n_res)):
+        b, n = b_res[name], n_res[name]
+        if "median_s" not in b or "median_s" not in n or b["median_s"] <= 0:
+            continue
+        ratio = n["median_s"] / b["median_s"]
+        status = "regression" if ratio > 1 + threshold else ("improvement" if ratio < 1 - threshold else "ok")
+        rows.append({"name": name, "base_s": b["median_s"], "new_s": n["median_s"], "ratio": ratio, "status": status})
+    return {
+        "threshold": threshold,
+        "rows": rows,
+        "regressions": [r["name"] for r in rows if r["status"] == "regression"],
+        "only_in_base": sorted(set(b_res) - set(n_res)),
+        "only_in_new": sorted(set(n_res) - set(b_res)),
+    }
@@ -0,0 +1,11 @@
+import os
+import sys
+from pathlib import Path
+
+# Chạy từ gốc repo: import được "backend.*"; LLM giả lập, không gọi Gemini/ghi audit log
+ROOT = Path(__file__).resolve().parents[1]
+if str(ROOT) not in sys.path:
+    sys.path.insert(0, str(ROOT))
+os.environ.setdefault("LLM_BACKEND", "fake")
+os.environ.setdefault("AUDIT_LOG", "off")
+os.environ.setdefault("TF_CPP_MIN_LOG_LEVEL", "3")
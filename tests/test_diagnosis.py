@@ -0,0 +1,18 @@
+import asyncio
+
+from backend import deadline, diagnosis
+from backend.admission import degraded, is_degraded
+
+
+def test_sync_wrapper_inside_event_loop_keeps_request_context(monkeypatch):
+    async def fake_diagnose(text, timeouts=None):
+        return {"deadline": deadline.current(), "degraded": is_degraded()}
+    monkeypatch.setattr(diagnosis, "_diagnose_once", fake_diagnose)
+
+    async def handler():
+        with deadline.request_deadline(5.0) as dl, degraded():
+            return dl, diagnosis.diagnose_and_suggest("sốt")
+
+    dl, result = asyncio.run(handler())
+    assert dl is not None
+    assert result == {"deadline": dl, "degraded": True}
@@ -0,0 +1,136 @@
+import json
+
+import pytest
+
+from backend import gemini
+
+
+@pytest.fixture(autouse=True)
+def fresh_model():
+    gemini._TRIAGE_CACHE.clear()
+    gemini._model = None
+    yield
+    gemini._TRIAGE_CACHE.clear()
+    gemini._model = None
+
+
+@pytest.fixture
+def client():
+    gemini.app.config["TESTING"] = True
+    return gemini.app.test_client()
+
+
+def _events(body: str):
+    events = []
+    for block in body.strip().split("\n\n"):
+        lines = dict(line.split(": ", 1) for line in block.splitlines())
+        events.append((lines["event"], json.loads(lines["data"])))
+    return events
+
+
+def test_fake_backend_selected():
+    assert gemini.LLM_BACKEND == "fake"
+    assert isinstance(gemini.get_model(), gemini.FakeGenerativeModel)
+
+
+def test_repeated_triage_hits_cache(client):
+    first = client.post("/api/triage", json={"symptoms": "Sốt, ho", "humor": 0.3})
+    # Khác khoảng trắng/hoa thường, humor cùng bucket -> cùng key
+    second = client.post("/api/triage", json={"symptoms": "  sốt,   HO ", "humor": 0.2})
+    assert first.status_code == second.status_code == 200
+    assert first.get_json() == second.get_json()
+    assert len(first.get_json()["questions"]) == 8
+    assert gemini.get_model().calls == 1
+    stats = client.get("/api/triage/cache").get_json()
+    assert stats["hits"] == 1 and stats["size"] == 1
+
+
+def test_triage_requires_symptoms(client):
+    resp = client.post("/api/triage", json={"symptoms": "  "})
+    assert resp.status_code == 400
+    assert resp.get_json()["error"] is True
+
+
+def test_stream_emits_sections_then_done(client):
+    resp = client.post("/api/triage/stream", json={"symptoms": "Đau đầu"})
+    assert resp.status_code == 200
+    assert resp.mimetype == "text/event-stream"
+    events = _events(resp.get_data(as_text=True))
+    sections = [data for event, data in events if event == "section"]
+    expected = json.loads(gemini.FakeGenerativeModel()._payload(""))
+    assert [s["name"] for s in sections] == list(expected)
+    assert {s["name"]: s["value"] for s in sections} == expected
+    assert events[-1] == ("done", {"cached": False})
+
+
+def test_stream_after_triage_is_served_from_cache(client):
+    full = client.post("/api/triage", json={"symptoms": "Đau đầu"}).get_json()
+    events = _events(client.post("/api/triage/stream", json={"symptoms": "đau đầu"}).get_data(as_text=True))
+    assert {d["name"]: d["value"] for e, d in events if e == "section"} == full
+    assert events[-1] == ("done", {"cached": True})
+    assert gemini.get_model().calls == 1
+
+
+class _ScriptedModel:
+    def __init__(self, chunks):
+        self.chunks = chunks
+
+    def generate_content(self, prompt, generation_config=None, stream=False):
+        return (gemini._FakeResponse(c) for c in self.chunks)
+
+
+def test_stream_keeps_reading_after_malformed_section(client):
+    # Section thứ 2 có dấu phẩy thừa: parse tăng dần dừng, phần còn lại vẫn được đọc và parse toàn bộ
+    text = '{"disclaimer": "x", "questions": [1, 2,], "next_steps": ["Nghỉ ngơi"], "light_joke": "j"}'
+    gemini._model = _ScriptedModel([text[i:i + 5] for i in range(0, len(text), 5)])
+    events = _events(client.post("/api/triage/stream", json={"symptoms": "ho"}).get_data(as_text=True))
+    assert events == [
+        ("section", {"name": "disclaimer", "value": "x"}),
+        ("section", {"name": "questions", "value": [1, 2]}),
+        ("section", {"name": "next_steps", "value": ["Nghỉ ngơi"]}),
+        ("section", {"name": "light_joke", "value": "j"}),
+        ("done", {"cached": False}),
+    ]
+    assert len(gemini._TRIAGE_CACHE) == 1
+
+
+def test_stream_reports_error_for_unparseable_output(client):
+    gemini._model = _ScriptedModel(['{"a": 1, "b": ', "[oops"])
+    events = _events(client.post("/api/triage/stream", json={"symptoms": "ho"}).get_data(as_text=True))
+    assert events[0] == ("section", {"name": "a", "value": 1})
+    assert events[-1][0] == "error" and events[-1][1]["raw"] == '{"a": 1, "b": [oops'
+    assert len(gemini._TRIAGE_CACHE) == 0
+
+
+def _feed_all(parser, chunks):
+    out = []
+    for chunk in chunks:
+        out.extend(parser.feed(chunk))
+    return out
+
+
+@pytest.mark.parametrize("size", [1, 2, 3, 7, 48])
+def test_section_parser_split_chunks(size):
+    doc = {
+        "a": "chuỗi có \"ngoặc\", dấu phẩy và {ngoặc nhọn}",
+        "b": [1, {"c": [2, 3]}, "x,y"],
+        "d": {"e": None, "f": True},
+        "g": 1.5,
+    }
+    text = json.dumps(doc, ensure_ascii=False)
+    chunks = [text[i:i + size] for i in range(0, len(text), size)]
+    assert _feed_all(gemini.JsonSectionParser(), chunks) == list(doc.items())
+
+
+def test_section_parser_yields_only_complete_sections():
+    parser = gemini.JsonSectionParser()
+    assert list(parser.feed('{"a": [1, 2')) == []
+    assert list(parser.feed('], "b": "x')) == [("a", [1, 2])]
+    assert list(parser.feed('yz"')) == []
+    assert list(parser.feed("}")) == [("b", "xyz")]
+
+
+def test_section_parser_partial_stream_keeps_finished_sections():
+    # Stream bị cắt giữa chừng: các mục đã đóng vẫn được trả về, mục dở dang thì không
+    parser = gemini.JsonSectionParser()
+    assert _feed_all(parser, ['{"done": {"k": 1}, "cut', '": [1, 2']) == [("done", {"k": 1})]
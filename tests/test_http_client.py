@@ -0,0 +1,172 @@
+import json
+import socket
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+import pytest
+
+from backend import deadline, http_client
+
+
+class _Handler(BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"
+    # Không có: mỗi request keep-alive chờ ~40ms (Nagle + delayed ACK)
+    disable_nagle_algorithm = True
+
+    def _reply(self):
+        length = int(self.headers.get("Content-Length") or 0)
+        if length:
+            self.rfile.read(length)
+        server = self.server
+        with server.lock:
+            server.hits.append((self.command, self.path))
+            script = server.scripts.get(self.path) or []
+            status, headers, delay = script.pop(0) if script else (200, {}, 0)
+        if delay:
+            time.sleep(delay)
+        body = json.dumps({"path": self.path, "hit": len(server.hits)}).encode()
+        self.send_response(status)
+        for k, v in headers.items():
+            self.send_header(k, v)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    do_GET = do_POST = _reply
+
+    def log_message(self, *args):
+        pass
+
+
+@pytest.fixture
+def stub():
+    server = ThreadingHTTPServer(("127.0.0.1", 0), _Handler)
+    server.daemon_threads = True
+    server.lock = threading.Lock()
+    server.hits = []
+    server.scripts = {}
+    server.host = f"127.0.0.1:{server.server_address[1]}"
+    server.url = f"http://{server.host}"
+    thread = threading.Thread(target=server.serve_forever, kwargs={"poll_interval": 0.05}, daemon=True)
+    thread.start()
+    yield server
+    http_client.close()
+    server.shutdown()
+    server.server_close()
+
+
+@pytest.fixture(autouse=True)
+def fast_backoff(monkeypatch):
+    # Backoff ngẫu nhiên = 0: thời gian chờ trong test chỉ đến từ Retry-After
+    monkeypatch.setattr(http_client, "HTTP_BACKOFF_BASE", 0.0)
+    monkeypatch.setattr(http_client, "HTTP_RETRIES", 2)
+
+
+def _closed_port() -> int:
+    s = socket.socket()
+    s.bind(("127.0.0.1", 0))
+    port = s.getsockname()[1]
+    s.close()
+    return port
+
+
+def test_get_retries_after_503_with_retry_after(stub):
+    stub.scripts["/flaky"] = [(503, {"Retry-After": "1"}, 0)]
+    start = time.monotonic()
+    resp = http_client.get(stub.url + "/flaky", timeout=5)
+    assert resp.status_code == 200
+    assert time.monotonic() - start >= 0.9
+    assert stub.hits == [("GET", "/flaky")] * 2
+    assert http_client.HTTP_RETRIES_TOTAL.value(stub.host, "503") == 1
+
+
+def test_retry_after_above_max_returns_response(stub):
+    stub.scripts["/busy"] = [(503, {"Retry-After": "120"}, 0)]
+    resp = http_client.get(stub.url + "/busy", timeout=5)
+    assert resp.status_code == 503
+    assert len(stub.hits) == 1
+
+
+def test_get_gives_up_after_retries(stub):
+    stub.scripts["/down"] = [(502, {}, 0)] * 5
+    resp = http_client.get(stub.url + "/down", retries=1)
+    assert resp.status_code == 502
+    assert len(stub.hits) == 2
+
+
+def test_post_not_retried_by_default(stub):
+    stub.scripts["/write"] = [(503, {}, 0)]
+    resp = http_client.post(stub.url + "/write", json={"a": 1})
+    assert resp.status_code == 503
+    assert stub.hits == [("POST", "/write")]
+    assert http_client.HTTP_RETRIES_TOTAL.value(stub.host, "503") == 0
+
+
+def test_post_retried_with_retry_unsafe(stub):
+    stub.scripts["/write"] = [(503, {}, 0)]
+    resp = http_client.post(stub.url + "/write", json={"a": 1}, retry_unsafe=True)
+    assert resp.status_code == 200
+    assert stub.hits == [("POST", "/write")] * 2
+
+
+def test_connect_errors_are_retried_even_for_post():
+    port = _closed_port()
+    host = f"127.0.0.1:{port}"
+    with pytest.raises(Exception) as exc:
+        http_client.post(f"http://{host}/x", json={}, retries=2)
+    assert http_client._error_reason(exc.value) == "connect"
+    assert http_client.HTTP_REQUESTS.value(host, "POST", "connect") == 3
+    assert http_client.HTTP_RETRIES_TOTAL.value(host, "connect") == 2
+    http_client.close()
+
+
+def test_expired_deadline_raises_before_sending(stub):
+    with deadline.request_deadline(0.01):
+        time.sleep(0.05)
+        with pytest.raises(deadline.DeadlineExceeded):
+            http_client.get(stub.url + "/late", timeout=5)
+    assert stub.hits == []
+
+
+def test_deadline_caps_read_timeout(stub):
+    stub.scripts["/slow"] = [(200, {}, 3)]
+    start = time.monotonic()
+    with deadline.request_deadline(0.3):
+        with pytest.raises(Exception) as exc:
+            http_client.get(stub.url + "/slow", timeout=10)
+    assert time.monotonic() - start < 1.5
+    assert http_client._error_reason(exc.value) == "timeout"
+    # Không còn thời gian chờ gửi lại trong deadline
+    assert len(stub.hits) == 1
+
+
+def test_per_host_metrics(stub):
+    stub.scripts["/m"] = [(404, {}, 0)]
+    http_client.get(stub.url + "/m")
+    http_client.get(stub.url + "/m")
+    http_client.post(stub.url + "/m")
+    assert http_client.HTTP_REQUESTS.value(stub.host, "GET", "404") == 1
+    assert http_client.HTTP_REQUESTS.value(stub.host, "GET", "200") == 1
+    assert http_client.HTTP_REQUESTS.value(stub.host, "POST", "200") == 1
+    assert http_client.HTTP_SECONDS.count(stub.host) == 3
+    assert stub.host in {h.split("://")[1] for h in http_client.pool_stats()["hosts"]}
+
+
+def test_async_client_retries_and_closes(stub):
+    import asyncio
+
+    stub.scripts["/a"] = [(503, {}, 0)]
+
+    async def run():
+        try:
+            return (await http_client.aget(stub.url + "/a")).status_code, http_client.pool_stats()["async_hosts"]
+        finally:
+            await http_client.aclose()
+
+    status, hosts = asyncio.run(run())
+    assert status == 200
+    assert hosts == [stub.url]
+    assert len(stub.hits) == 2
+    assert http_client.pool_stats()["async_hosts"] == []
@@ -0,0 +1,95 @@
+import json
+import threading
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import parse_qs, urlsplit
+
+import pytest
+
+from backend import clinical_api, http_client, icd10_index
+
+# Trích dữ liệu NIH Clinical Tables: [tổng, [mã], null, [[mã, tên], ...]]
+NIH = {
+    "sore throat": [[1, ["J02.9"], None, [["J02.9", "Acute pharyngitis, unspecified"]]]],
+    "joint pain": [[2, ["M25.50", "M25.561"], None,
+                    [["M25.50", "Pain in unspecified joint"], ["M25.561", "Pain in right knee"]]]],
+    "fever cough": [[0, [], None, []]],
+}
+
+
+class _NIHHandler(BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"
+    disable_nagle_algorithm = True
+
+    def do_GET(self):
+        terms = parse_qs(urlsplit(self.path).query).get("terms", [""])[0].lower()
+        self.server.queries.append(terms)
+        body = json.dumps(NIH.get(terms, [[0, [], None, []]])[0]).encode()
+        self.send_response(200)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, *args):
+        pass
+
+
+@pytest.fixture
+def nih(monkeypatch):
+    server = ThreadingHTTPServer(("127.0.0.1", 0), _NIHHandler)
+    server.daemon_threads = True
+    server.queries = []
+    threading.Thread(target=server.serve_forever, kwargs={"poll_interval": 0.05}, daemon=True).start()
+    monkeypatch.setattr(icd10_index, "CLINICAL_TABLES_API", f"http://127.0.0.1:{server.server_address[1]}/search")
+    monkeypatch.setattr(icd10_index, "REMOTE_FALLBACK", True)
+    monkeypatch.setattr(icd10_index, "REMOTE_REFRESH", False)
+    icd10_index._REMOTE_CACHE.clear()
+    yield server
+    icd10_index._REMOTE_CACHE.clear()
+    http_client.close()
+    server.shutdown()
+    server.server_close()
+
+
+@pytest.mark.parametrize("query,code", [("cough", "R05.9"), ("Fever", "R50.9"), ("R07", "R07.0")])
+def test_common_queries_resolve_locally(nih, query, code):
+    result = icd10_index.search_icd10(query)
+    assert result["source"] == "local"
+    assert code in [it["code"] for it in result["items"]]
+    assert nih.queries == []
+
+
+def test_local_miss_falls_back_to_nih(nih):
+    result = icd10_index.search_icd10("Sore throat")
+    assert result["source"] == "nih"
+    assert result["items"] == [{"code": "J02.9", "name": "Acute pharyngitis, unspecified"}]
+    assert clinical_api.search_clinical_table("Joint pain") == ["M25.50", "M25.561"]
+
+
+def test_remote_results_are_cached_including_empty(nih):
+    for _ in range(2):
+        assert icd10_index.search_icd10("Sore throat")["total"] == 1
+        assert icd10_index.search_icd10("fever  cough")["items"] == []
+    assert nih.queries == ["sore throat", "fever cough"]
+
+
+def test_remote_failure_is_raised_not_empty(monkeypatch):
+    monkeypatch.setattr(icd10_index, "CLINICAL_TABLES_API", "http://127.0.0.1:1/search")
+    monkeypatch.setattr(icd10_index, "REMOTE_FALLBACK", True)
+    monkeypatch.setattr(http_client, "HTTP_RETRIES", 0)
+    icd10_index._REMOTE_CACHE.clear()
+    with pytest.raises(Exception):
+        icd10_index.search_icd10("Sore throat")
+    assert icd10_index._REMOTE_CACHE.get("sore throat") is None
+    http_client.close()
+
+
+def test_remote_refresh_persists_codes(nih, monkeypatch, tmp_path):
+    path = tmp_path / "codes.txt"
+    path.write_text("R509    Fever, unspecified\n", encoding="utf-8")
+    monkeypatch.setattr(icd10_index, "ICD10_CODES_PATH", str(path))
+    monkeypatch.setattr(icd10_index, "REMOTE_REFRESH", True)
+    assert icd10_index.search_icd10("sore throat")["items"][0]["code"] == "J02.9"
+    assert "J029" in path.read_text(encoding="utf-8")
+    # Lần sau tra cục bộ ra luôn
+    assert icd10_index.search_icd10("pharyngitis")["source"] == "local"
@@ -0,0 +1,45 @@
+import logging
+
+import pytest
+
+from backend import predict_disease_dl as p
+
+
+@pytest.fixture
+def broken_engine(monkeypatch):
+    for name in ("model", "model_version", "all_symptoms", "all_diseases", "_symptom_index", "_disease_index",
+                 "_disease_critical", "_red_flag_mask", "_load_failure"):
+        monkeypatch.setattr(p, name, getattr(p, name))
+    monkeypatch.setattr(p, "model", None)
+    monkeypatch.setattr(p, "_load_failure", None)
+    calls = []
+
+    def load_inference_engine(engine=p.INFERENCE_ENGINE):
+        calls.append(engine)
+        raise ImportError("TensorFlow is required but not installed")
+    monkeypatch.setattr(p, "load_inference_engine", load_inference_engine)
+    return calls
+
+
+def test_fallback_does_not_reload_failed_model(broken_engine, caplog):
+    with caplog.at_level(logging.WARNING, logger=p.__name__):
+        first = p.predict_disease(["sốt", "ho"])
+        second = p.predict_disease(["đau đầu"])
+    assert first["engine"] == second["engine"] == "retrieval"
+    assert len(broken_engine) == 1
+    assert len([r for r in caplog.records if r.name == p.__name__]) == 1
+
+
+def test_explicit_reload_and_new_model_file_retry(broken_engine, monkeypatch):
+    with pytest.raises(ImportError):
+        p._load_model_lazily()
+    with pytest.raises(ImportError):
+        p._load_model_lazily()
+    assert len(broken_engine) == 1
+    with pytest.raises(ImportError):
+        p.load_model()
+    assert len(broken_engine) == 2
+    monkeypatch.setattr(p, "file_version", lambda engine=p.INFERENCE_ENGINE: "keras-retrained")
+    with pytest.raises(ImportError):
+        p._load_model_lazily()
+    assert len(broken_engine) == 3
@@ -0,0 +1,61 @@
+import pytest
+from starlette.testclient import TestClient
+
+import api
+import backend.asgi
+from backend import predict_disease_dl
+from backend.admission import Overloaded
+
+
+def _fake_analyze(text, explain=False):
+    if "sốt" not in text:
+        return {"error": True, "message": "Không nhận diện được triệu chứng nào", "extracted_symptoms": []}
+    return {"predicted_disease": "Cúm", "confidence": 0.9, "extracted_symptoms": ["sốt"],
+            "all_probabilities": {"Cúm": 0.9}}
+
+
+@pytest.fixture
+def client(monkeypatch):
+    monkeypatch.setattr(predict_disease_dl, "analyze_symptoms_text", _fake_analyze)
+    with TestClient(backend.asgi.app) as c:
+        yield c
+
+
+CASES = [
+    ({"text": "tôi bị sốt"}, 200),
+    ({"text": "hôm nay trời đẹp"}, 422),
+    ({"text": ""}, 400),
+    ({}, 400),
+]
+
+
+@pytest.mark.parametrize("payload,status", CASES)
+def test_asgi_and_flask_share_contract(client, payload, status):
+    r = client.post("/predict/text", json=payload)
+    assert r.status_code == status
+    flask_r = api.app.test_client().post("/predict/text", json=payload)
+    assert flask_r.status_code == status
+    assert flask_r.get_json() == r.json()
+
+
+def test_success_body(client):
+    body = client.post("/predict/text", json={"text": "tôi bị sốt"}).json()
+    assert body == {"text": "tôi bị sốt", "prediction": {
+        "predicted_disease": "Cúm", "confidence": 0.9, "extracted_symptoms": ["sốt"]}}
+
+
+def test_error_bodies(client):
+    body = client.post("/predict/text", json={"text": "hôm nay trời đẹp"}).json()
+    assert body == {"error": True, "message": "Không nhận diện được triệu chứng nào",
+                    "text": "hôm nay trời đẹp", "extracted_symptoms": []}
+    r = client.post("/predict/text", content=b"not json", headers={"Content-Type": "application/json"})
+    assert r.status_code == 400 and r.json()["error"] is True
+
+
+def test_overloaded_sets_retry_after(client, monkeypatch):
+    def overloaded(text, explain=False):
+        raise Overloaded("hàng đợi đầy", retry_after=2)
+    monkeypatch.setattr(predict_disease_dl, "analyze_symptoms_text", overloaded)
+    r = client.post("/predict/text", json={"text": "sốt"})
+    assert r.status_code == 503 and r.headers["Retry-After"] == "2"
+    assert r.json() == {"error": True, "message": str(Overloaded("hàng đợi đầy", 2)), "retry_after": 2}
@@ -0,0 +1,51 @@
+from backend.symptom_suggest import SymptomSuggester, load_vocabulary
+
+
+def _texts(results):
+    return [(r["text"], r["canonical"]) for r in results]
+
+
+def _suggester():
+    return SymptomSuggester([
+        ("cứng cơ", "cứng cơ", "model"),
+        ("cứng cổ", "cứng cổ", "model"),
+        ("cứng cơ buổi sáng", "cứng cơ buổi sáng", "model"),
+        ("đau đầu", "đau đầu", "model"),
+        ("Cứng  Cổ", "cứng cổ", "keyword"),  # trùng "cứng cổ" sau normalize_text -> bỏ
+    ])
+
+
+def test_entries_differing_only_by_diacritics_are_kept():
+    s = _suggester()
+    assert len(s) == 4
+    assert {("cứng cổ", "cứng cổ"), ("cứng cơ", "cứng cơ")} <= set(_texts(s.suggest("cung co")))
+
+
+def test_accented_query_ranks_exact_accent_first():
+    s = _suggester()
+    assert _texts(s.suggest("cứng cổ"))[0] == ("cứng cổ", "cứng cổ")
+    assert _texts(s.suggest("cứng cơ"))[0] == ("cứng cơ", "cứng cơ")
+    # Khớp đúng dấu ở đầu 1 từ bên trong cũng được ưu tiên
+    assert _texts(s.suggest("cơ buổi"))[0] == ("cứng cơ buổi sáng", "cứng cơ buổi sáng")
+
+
+def test_unaccented_query_still_matches():
+    s = _suggester()
+    assert _texts(s.suggest("dau d")) == [("đau đầu", "đau đầu")]
+
+
+def test_keyword_canonical_prefers_exact_accent(tmp_path):
+    symptoms = tmp_path / "symptoms.json"
+    keywords = tmp_path / "keywords.json"
+    symptoms.write_text('["cứng cơ", "cứng cổ"]', encoding="utf-8")
+    keywords.write_text('{"Cứng cổ": [], "cung co": []}', encoding="utf-8")
+    entries = load_vocabulary(str(symptoms), str(keywords))
+    assert ("Cứng cổ", "cứng cổ", "keyword") in entries
+    # Không dấu: cột đầu tiên có cùng key không dấu
+    assert ("cung co", "cứng cơ", "keyword") in entries
+
+
+def test_model_vocabulary_exposes_colliding_columns():
+    s = SymptomSuggester(load_vocabulary())
+    for query in ("cứng cổ", "ho mạn tính", "ho mãn tính", "da sẫm màu", "da sạm màu"):
+        assert s.suggest(query, limit=1)[0]["canonical"] == query